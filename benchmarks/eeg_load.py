@@ -0,0 +1,135 @@
+"""Benchmark per-session EEG load time and peak memory.
+
+Compares the original loader (fetchall plus one list comprehension per
+column over one-row-per-sample storage) with read_eeg_array on legacy rows,
+chunk storage and memory-mapped sidecar files.
+
+    python benchmarks/eeg_load.py --sessions 5 --duration 300
+"""
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.init_db import create_database
+from scripts.data.connection import connect
+from scripts.data.eeg_store import read_eeg_array, write_eeg, write_sidecar
+from scripts.data.timestamps import to_epoch_us
+
+
+def load_fetchall(conn, session_id):
+    """The loader as it was before read_eeg_array, kept as the baseline"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT timestamp, channel1, channel2
+        FROM eeg_data
+        WHERE session_id = ?
+        ORDER BY timestamp
+    ''', (session_id,))
+    data = cursor.fetchall()
+    timestamps = np.array([row[0] for row in data])
+    channel1 = np.array([row[1] for row in data])
+    channel2 = np.array([row[2] for row in data])
+    return timestamps, channel1, channel2
+
+
+def load_array(conn, session_id):
+    timestamps, samples = read_eeg_array(conn, session_id)
+    # Touch every sample so memory-mapped sessions are actually read
+    return timestamps, float(samples.sum())
+
+
+def build_database(db_path, n_sessions, duration, sampling_rate):
+    """Store the same synthetic sessions as legacy rows, chunks and sidecar files"""
+    create_database(db_path)
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    eeg_dir = Path(db_path).parent / 'eeg'
+    n_samples = duration * sampling_rate
+    start_time = datetime(2024, 1, 1, 9, 0)
+    layout = {'legacy rows': [], 'chunks': [], 'sidecar': []}
+
+    for _ in range(n_sessions):
+        channel1 = np.random.normal(0, 1, n_samples)
+        channel2 = np.random.normal(0, 1, n_samples)
+        for storage, session_ids in layout.items():
+            cursor.execute('INSERT INTO sessions (user_id, timestamp) VALUES (1, ?)', (to_epoch_us(start_time),))
+            session_id = cursor.lastrowid
+            session_ids.append(session_id)
+            if storage == 'legacy rows':
+                cursor.executemany('''
+                    INSERT INTO eeg_data (session_id, timestamp, channel1, channel2)
+                    VALUES (?, ?, ?, ?)
+                ''', (
+                    (session_id, to_epoch_us(start_time) + round(i * 1e6 / sampling_rate), float(ch1), float(ch2))
+                    for i, (ch1, ch2) in enumerate(zip(channel1, channel2))
+                ))
+            elif storage == 'chunks':
+                write_eeg(cursor, session_id, channel1, channel2, start_time, sampling_rate)
+            else:
+                write_sidecar(cursor, session_id, channel1, channel2, start_time, sampling_rate, eeg_dir)
+
+    conn.commit()
+    conn.close()
+    return layout
+
+
+def measure(loader, db_path, session_ids):
+    """Return mean load time in ms and peak traced memory in MB per session"""
+    times, peaks = [], []
+    for session_id in session_ids:
+        conn = connect(db_path)
+        tracemalloc.start()
+        start = time.perf_counter()
+        loader(conn, session_id)
+        times.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        conn.close()
+
+    # tracemalloc slows allocation-heavy code, so time a second, untraced pass
+    untraced = []
+    for session_id in session_ids:
+        conn = connect(db_path)
+        start = time.perf_counter()
+        loader(conn, session_id)
+        untraced.append(time.perf_counter() - start)
+        conn.close()
+
+    return np.mean(untraced) * 1000, np.mean(peaks) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=5)
+    parser.add_argument('--duration', type=int, default=300, help='session length in seconds')
+    parser.add_argument('--sampling-rate', type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = str(Path(tmp_dir) / 'neurotrack.db')
+        layout = build_database(db_path, args.sessions, args.duration, args.sampling_rate)
+
+        cases = [
+            ('fetchall (before)', load_fetchall, 'legacy rows'),
+            ('read_eeg_array', load_array, 'legacy rows'),
+            ('read_eeg_array', load_array, 'chunks'),
+            ('read_eeg_array', load_array, 'sidecar'),
+        ]
+        print(f"{args.sessions} sessions x {args.duration * args.sampling_rate} samples x 2 channels")
+        print(f"{'loader':<20}{'storage':<14}{'ms/session':>12}{'peak MB':>10}")
+        for name, loader, storage in cases:
+            ms, peak_mb = measure(loader, db_path, layout[storage])
+            print(f"{name:<20}{storage:<14}{ms:>12.1f}{peak_mb:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
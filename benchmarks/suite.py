@@ -0,0 +1,265 @@
+"""Benchmark ingest, EEG loading, spectral analysis, insights and dashboard queries.
+
+Builds a synthetic database of the requested size, times each operation
+on a sample of its sessions or users, and writes throughput and peak
+traced memory per operation to JSON, so scaling curves can be compared
+between releases.
+
+    python benchmarks/suite.py --scale small
+    python benchmarks/suite.py --users 100 --sessions 200 --duration 60 --output results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.init_db import create_database
+from scripts.log_session import SessionLogger
+from scripts.analysis.eeg import analyze_eeg_data, load_eeg_data
+from scripts.analysis.features import get_session_features
+from scripts.analyze_patterns import CognitivePatternAnalyzer
+from scripts.data import dashboard, database
+from scripts.data.connection import close_connections, connect
+from scripts.data.rollups import activity_hourly_stats, hourly_stats
+from scripts.seed_data import generate_sample_eeg_data, seed_database
+
+# users, sessions per user, session length in seconds, share of sessions with EEG
+SCALES = {
+    'small': dict(users=3, sessions=30, duration=300, eeg_fraction=1.0),
+    'medium': dict(users=50, sessions=100, duration=60, eeg_fraction=0.2),
+    'large': dict(users=300, sessions=300, duration=30, eeg_fraction=0.05),
+    'xlarge': dict(users=1000, sessions=500, duration=30, eeg_fraction=0.01),
+}
+
+
+def generate_dataset(db_path, users, sessions, duration, sampling_rate=256, eeg_fraction=1.0, seed=0):
+    """
+    Create a database of users with sessions, context, journal, diet and EEG
+
+    Uses the seed_data generator, so the same seed gives the same dataset.
+
+    Returns:
+        dict: Dataset description, including the IDs of sessions with EEG
+    """
+    create_database(db_path)
+    summary = seed_database(db_path, users, sessions, duration, sampling_rate, seed, eeg_fraction=eeg_fraction)
+    return {
+        'users': users, 'sessions_per_user': sessions, 'duration': duration,
+        'sampling_rate': sampling_rate, 'eeg_fraction': eeg_fraction, 'seed': seed,
+        'sessions': summary['sessions'], 'eeg_sessions': summary['eeg_sessions'],
+    }
+
+
+def describe_dataset(db_path):
+    """Describe an existing database, for runs that reuse one"""
+    conn = connect(db_path)
+    try:
+        users, sessions = conn.execute('SELECT (SELECT COUNT(*) FROM users), (SELECT COUNT(*) FROM sessions)').fetchone()
+        eeg_ids = [row[0] for row in conn.execute('SELECT session_id FROM eeg_recordings ORDER BY session_id')]
+    finally:
+        conn.close()
+    return {'users': users, 'sessions': sessions, 'eeg_sessions': eeg_ids}
+
+
+def measure(name, calls, unit, items_per_call=1):
+    """
+    Time a list of zero-argument calls, then trace a second pass for peak memory
+
+    tracemalloc slows allocation-heavy code, so the time comes from the
+    untraced pass and the memory from the traced one.
+
+    Returns:
+        dict: Result record for the report
+    """
+    start = time.perf_counter()
+    for call in calls:
+        call()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    peak = 0
+    for call in calls:
+        tracemalloc.reset_peak()
+        call()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    items = len(calls) * items_per_call
+    return {
+        'name': name,
+        'calls': len(calls),
+        'items': items,
+        'unit': unit,
+        'seconds': seconds,
+        'ms_per_call': seconds / len(calls) * 1000 if calls else None,
+        'items_per_second': items / seconds if seconds else None,
+        'peak_mb': peak / 1e6,
+    }
+
+
+def dashboard_calls(db_path, user_ids):
+    """The queries app.py runs for a page view, per sampled user"""
+    ranges = {}
+    for user_id in user_ids:
+        first, last = dashboard.load_session_date_range(user_id, db_path)
+        ranges[user_id] = (first.date(), last.date())
+    recent = {
+        user_id: dashboard.load_recent_sessions(user_id, ranges[user_id], db_path)['id'].tolist()
+        for user_id in user_ids
+    }
+    queries = {
+        'get_data_version': lambda user_id: dashboard.get_data_version(db_path),
+        'load_users': lambda user_id: dashboard.load_users(db_path),
+        'load_session_date_range': lambda user_id: dashboard.load_session_date_range(user_id, db_path),
+        'load_recent_sessions': lambda user_id: dashboard.load_recent_sessions(user_id, ranges[user_id], db_path),
+        'load_analysis_data': lambda user_id: dashboard.load_analysis_data(user_id, ranges[user_id], db_path),
+        'load_recommendation_data': lambda user_id: dashboard.load_recommendation_data(
+            user_id, ranges[user_id], db_path),
+        'load_hour_rollups': lambda user_id: (hourly_stats(user_id, db_path), activity_hourly_stats(user_id, db_path)),
+        'load_cached_eeg_metrics': lambda user_id: get_session_features(recent[user_id], db_path, compute=False),
+    }
+    return {
+        name: [lambda query=query, user_id=user_id: query(user_id) for user_id in user_ids]
+        for name, query in queries.items()
+    }
+
+
+def run_suite(db_path, dataset, samples=20, seed=0):
+    """
+    Time every operation against db_path
+
+    Args:
+        db_path (str): Database built by generate_dataset
+        dataset (dict): Its description
+        samples (int): Sessions or users per operation
+        seed (int): Seed for picking the samples
+
+    Returns:
+        list: Result records
+    """
+    rng = np.random.default_rng(seed)
+    user_ids = sorted(rng.choice(np.arange(1, dataset['users'] + 1), min(samples, dataset['users']),
+                                 replace=False).tolist())
+    eeg_ids = dataset['eeg_sessions']
+    eeg_ids = sorted(rng.choice(eeg_ids, min(samples, len(eeg_ids)), replace=False).tolist()) if eeg_ids else []
+    results = []
+
+    if eeg_ids:
+        conn = connect(db_path)
+        n_samples = conn.execute('SELECT n_samples FROM eeg_recordings WHERE session_id = ?',
+                                 (eeg_ids[0],)).fetchone()[0]
+        conn.close()
+        results.append(measure('load_eeg_data', [lambda sid=sid: load_eeg_data(sid, db_path) for sid in eeg_ids],
+                               'samples', n_samples))
+        results.append(measure('analyze_eeg_data', [lambda sid=sid: analyze_eeg_data(sid, db_path=db_path)
+                                                    for sid in eeg_ids], 'samples', n_samples))
+
+    results.append(measure('database.load_session_data', [lambda: database.load_session_data(db_path)],
+                           'sessions', dataset['sessions']))
+    analyzer = CognitivePatternAnalyzer(db_path)
+    results.append(measure('generate_insights', [lambda uid=uid: analyzer.generate_insights(uid)
+                                                 for uid in user_ids], 'users'))
+    for name, calls in dashboard_calls(db_path, user_ids).items():
+        results.append(measure(f'app.{name}', calls, 'queries'))
+
+    # Ingest last, so the sessions it adds do not change what the reads see
+    duration = dataset.get('duration', 60)
+    sampling_rate = dataset.get('sampling_rate', 256)
+    n_ingest = max(1, samples // 2)
+    times = pd.date_range(datetime.now(), periods=duration * sampling_rate,
+                          freq=pd.Timedelta(seconds=1) / sampling_rate).to_pydatetime().tolist()
+    _, channel1, channel2 = generate_sample_eeg_data(duration, sampling_rate, rng)
+    eeg_data = list(zip(times, channel1.tolist(), channel2.tolist()))
+    context = {'mood_score': 4, 'focus_score': 4, 'mental_clarity': 3, 'activity_type': 'deep_work',
+               'time_of_day': '10:00'}
+    logger = SessionLogger(db_path)
+    results.append(measure(
+        'log_session',
+        [lambda: logger.log_session(1, eeg_data, context, {'productivity_score': 4}, sampling_rate=sampling_rate)]
+        * n_ingest,
+        'samples', len(eeg_data)
+    ))
+
+    close_connections()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small', help='preset dataset size')
+    parser.add_argument('--users', type=int, help='override the number of users')
+    parser.add_argument('--sessions', type=int, help='override the sessions per user')
+    parser.add_argument('--duration', type=int, help='override the session length in seconds')
+    parser.add_argument('--eeg-fraction', type=float, help='override the share of sessions with EEG')
+    parser.add_argument('--sampling-rate', type=int, default=256)
+    parser.add_argument('--samples', type=int, default=20, help='sessions or users timed per operation')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', help='reuse this database if it exists, otherwise generate it there')
+    parser.add_argument('--output', help='JSON report path (default: benchmarks/results/<scale>-<time>.json)')
+    args = parser.parse_args()
+
+    params = dict(SCALES[args.scale])
+    for name in ('users', 'sessions', 'duration', 'eeg_fraction'):
+        if getattr(args, name) is not None:
+            params[name] = getattr(args, name)
+    label = args.scale if params == SCALES[args.scale] else 'custom'
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.db or str(Path(tmp_dir) / 'neurotrack.db')
+        start = time.perf_counter()
+        if args.db and os.path.exists(args.db):
+            dataset = describe_dataset(db_path)
+        else:
+            dataset = generate_dataset(db_path, sampling_rate=args.sampling_rate, seed=args.seed, **params)
+        generate_seconds = time.perf_counter() - start
+        results = run_suite(db_path, dataset, args.samples, args.seed)
+        db_mb = os.path.getsize(db_path) / 1e6
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'dataset': {
+            **{key: value for key, value in dataset.items() if key != 'eeg_sessions'},
+            'eeg_sessions': len(dataset['eeg_sessions']), 'scale': label,
+            'db_mb': db_mb, 'generate_seconds': generate_seconds,
+        },
+        'results': results,
+    }
+    output = Path(args.output or Path(__file__).parent / 'results' / f"{label}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    print(f"{dataset['users']} users, {dataset['sessions']} sessions, {len(dataset['eeg_sessions'])} with EEG "
+          f"(generated in {generate_seconds:.1f}s, {db_mb:.0f} MB)")
+    print(f"{'operation':<32}{'calls':>6}{'ms/call':>11}{'items/s':>14}{'peak MB':>10}")
+    for result in results:
+        print(f"{result['name']:<32}{result['calls']:>6}{result['ms_per_call']:>11.1f}"
+              f"{result['items_per_second']:>14,.0f}{result['peak_mb']:>10.1f}  {result['unit']}")
+    print(f"Report written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,650 @@
+import argparse
+import asyncio
+import json
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.data.eeg_store import CHANNELS, DEFAULT_SAMPLE_RATE, SAMPLE_DTYPE
+from scripts.data.instrumentation import count, span
+from scripts.log_session import SessionLogger
+
+# Local acquisition server recording several EEG devices at once. Each
+# device connection is a stream and becomes one streamed session:
+#
+# - TCP (FRAMES_PORT): a JSON hello line, then binary frames of FRAME_HEADER
+#   (magic, sample count, sequence number) followed by the float32 samples
+#   of channel1 and then channel2, little-endian.
+# - UDP (DATAGRAM_PORT): the same hello and frames, one per datagram, with a
+#   {"end": true} datagram or IDLE_SECONDS of silence ending the stream.
+# - Lines (LINES_PORT): 'channel1,channel2' (or 'timestamp,channel1,channel2')
+#   text lines, as a serial-to-TCP bridge such as ser2net or socat forwards
+#   them from a DIY board; the hello line is optional.
+#
+# The hello is {"user_id": 1, "sampling_rate": 256, "device": "...",
+# "context": {...}}, answered with {"session_id": ...}. Parsed blocks go
+# into one bounded queue drained by a single writer thread, which appends
+# them to each stream's SessionWriter, so the event loop never waits on
+# SQLite. A full queue stops reading from TCP connections, pushing back on
+# the devices; UDP frames arriving while it is full are dropped. Frames lost
+# to sequence gaps or drops are replaced by repeating the last sample (up
+# to MAX_GAP_SECONDS), which keeps later samples at the right time. The
+# filled-in ranges are stored as the session's gaps (see eeg_store.write_gaps),
+# which the signal quality checks report as bad intervals, so analysis can
+# leave them out.
+FRAMES_PORT = 5760
+DATAGRAM_PORT = 5761
+LINES_PORT = 5762
+FRAME_MAGIC = b'NT'
+FRAME_HEADER = struct.Struct('<2sHI')  # magic, samples per channel, sequence number
+FRAME_DTYPE = np.dtype('<f4')
+QUEUE_BLOCKS = 1024
+WRITE_BATCH_BLOCKS = 256
+BATCH_CHUNKS = 1
+MAX_GAP_SECONDS = 10
+IDLE_SECONDS = 30
+STATS_SECONDS = 5.0
+
+
+def encode_frame(sequence, channel1, channel2):
+    """
+    Encode a block of samples as a binary frame, as a device would send it
+
+    Args:
+        sequence (int): Frame sequence number, counting up from any start
+        channel1 (array-like): Samples of the first channel
+        channel2 (array-like): Samples of the second channel
+
+    Returns:
+        bytes: The frame
+    """
+    samples = np.asarray([channel1, channel2], dtype=FRAME_DTYPE)
+    return FRAME_HEADER.pack(FRAME_MAGIC, samples.shape[1], sequence) + samples.tobytes()
+
+
+def decode_frame(data):
+    """
+    Decode a binary frame
+
+    Args:
+        data (bytes): A whole frame
+
+    Returns:
+        tuple: (sequence, (channels, samples) float32 array)
+    """
+    magic, n_samples, sequence = FRAME_HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Not a NeuroTrack frame")
+    payload = memoryview(data)[FRAME_HEADER.size:]
+    if len(payload) != n_samples * len(CHANNELS) * FRAME_DTYPE.itemsize:
+        raise ValueError(f"Frame of {n_samples} samples has {len(payload)} payload bytes")
+    return sequence, np.frombuffer(payload, dtype=FRAME_DTYPE).reshape(len(CHANNELS), n_samples)
+
+
+def parse_lines(lines):
+    """
+    Parse 'channel1,channel2' or 'timestamp,channel1,channel2' text lines
+
+    Args:
+        lines (list): Lines as bytes, without line endings
+
+    Returns:
+        tuple: ((channels, samples) float32 array, number of malformed lines skipped)
+    """
+    lines = [line for line in (line.strip() for line in lines) if line]
+    if not lines:
+        return np.empty((len(CHANNELS), 0), dtype=SAMPLE_DTYPE), 0
+    try:
+        values = np.array([line.rsplit(b',', 2)[-2:] for line in lines], dtype=SAMPLE_DTYPE)
+        return values.T, 0
+    except ValueError:
+        pass
+
+    # Some line is malformed, e.g. half a line after the board reset: parse one at a time
+    rows = []
+    for line in lines:
+        try:
+            row = np.array(line.rsplit(b',', 2)[-2:], dtype=SAMPLE_DTYPE)
+        except ValueError:
+            continue
+        if row.shape == (len(CHANNELS),):
+            rows.append(row)
+    values = np.array(rows, dtype=SAMPLE_DTYPE).reshape(-1, len(CHANNELS))
+    return values.T, len(lines) - len(rows)
+
+
+class Stream:
+    """One device connection, its settings and its ingest counters"""
+
+    def __init__(self, stream_id, transport, peer, user_id, sampling_rate, device=None, context=None):
+        self.stream_id = stream_id
+        self.transport = transport
+        self.peer = peer
+        self.user_id = int(user_id)
+        self.sampling_rate = float(sampling_rate)
+        if self.sampling_rate <= 0:
+            raise ValueError("sampling_rate must be positive")
+        self.device = device or f'{transport}:{peer}'
+        self.context = context
+        self.opened_at = datetime.now()
+        self.session_id = None
+        self.error = None
+        self.closed = False
+        self.last_seen = time.monotonic()
+
+        self.frames = 0
+        self.samples = 0
+        self.dropped_frames = 0
+        self.padded_samples = 0
+        self.next_sequence = None
+        self._frame_samples = 0
+        self._gap = 0  # samples lost since the last block that was queued
+        self._last = None  # last sample queued, repeated over gaps
+
+    @classmethod
+    def from_hello(cls, stream_id, transport, peer, hello, defaults):
+        """Create a stream from a hello message, filling in the server's defaults"""
+        settings = {**defaults, **hello}
+        if settings.get('user_id') is None:
+            raise ValueError("hello must give a user_id")
+        return cls(stream_id, transport, peer, settings['user_id'],
+                   settings.get('sampling_rate', DEFAULT_SAMPLE_RATE), settings.get('device'),
+                   settings.get('context'))
+
+    def sequence(self, sequence):
+        """
+        Check a frame's sequence number against the ones seen so far
+
+        Returns:
+            bool: False for a late or repeated frame, which should be ignored
+        """
+        if self.next_sequence is not None:
+            if sequence < self.next_sequence:
+                self.dropped_frames += 1
+                return False
+            missed = sequence - self.next_sequence
+            if missed:
+                self.dropped_frames += missed
+                # Frame sizes are fixed per device, so the last one stands in for the missed ones
+                self._gap += missed * self._frame_samples
+        self.next_sequence = sequence + 1
+        return True
+
+    def block(self, samples):
+        """
+        Count a block of received samples and return it ready to queue
+
+        Samples lost before it are filled in by repeating the last sample, as
+        long as the gap is at most MAX_GAP_SECONDS; longer gaps are left out.
+
+        Returns:
+            tuple: (block, number of samples filled in)
+        """
+        self._frame_samples = samples.shape[1]
+        self.frames += 1
+        self.samples += samples.shape[1]
+        self.last_seen = time.monotonic()
+
+        gap, self._gap = self._gap, 0
+        if gap and gap <= MAX_GAP_SECONDS * self.sampling_rate:
+            last = self._last if self._last is not None else samples[:, 0]
+            samples = np.concatenate([np.repeat(last[:, None], gap, axis=1), samples], axis=1)
+        else:
+            gap = 0
+        if samples.shape[1]:
+            self._last = samples[:, -1].copy()
+        self.padded_samples += gap
+        return samples, gap
+
+    def dropped(self, block, padded):
+        """Count a block that could not be queued, so the next one fills in for it"""
+        self.dropped_frames += 1
+        self.padded_samples -= padded
+        self._gap += block.shape[1]
+
+    def stats(self):
+        return {
+            'stream': self.stream_id,
+            'device': self.device,
+            'transport': self.transport,
+            'user_id': self.user_id,
+            'session_id': self.session_id,
+            'frames': self.frames,
+            'samples': self.samples,
+            'dropped_frames': self.dropped_frames,
+            'padded_samples': self.padded_samples,
+            'closed': self.closed,
+            'error': self.error,
+        }
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.server._datagram(self.transport, data, addr)
+
+
+class AcquisitionServer:
+    """
+    Receives sample streams from several devices and records each as a session
+
+    Example:
+        server = AcquisitionServer(db_path='data/neurotrack.db')
+        await server.start()
+        ...
+        await server.stop()  # completes the sessions of connected devices
+    """
+
+    def __init__(self, db_path=None, host='127.0.0.1', frames_port=FRAMES_PORT, datagram_port=DATAGRAM_PORT,
+                 lines_port=LINES_PORT, queue_blocks=QUEUE_BLOCKS, batch_chunks=BATCH_CHUNKS,
+                 user_id=None, sampling_rate=DEFAULT_SAMPLE_RATE, idle_seconds=IDLE_SECONDS):
+        """
+        Args:
+            db_path (str): Path to the SQLite database
+            host (str): Address to listen on
+            frames_port (int): TCP port for binary frames; None to disable, 0 for any free port
+            datagram_port (int): UDP port for binary frames; None to disable, 0 for any free port
+            lines_port (int): TCP port for text lines; None to disable, 0 for any free port
+            queue_blocks (int): Blocks queued for the writer before devices are pushed back on
+            batch_chunks (int): EEG chunks buffered per stream before they are committed
+            user_id (int): User of streams whose hello does not give one
+            sampling_rate (float): Sampling rate of streams whose hello does not give one
+            idle_seconds (float): Silence after which a UDP stream is ended
+        """
+        self.db_path = db_path
+        self.host = host
+        self.ports = {'frames': frames_port, 'datagram': datagram_port, 'lines': lines_port}
+        self.queue_blocks = queue_blocks
+        self.batch_chunks = batch_chunks
+        self.defaults = {'user_id': user_id, 'sampling_rate': sampling_rate}
+        self.idle_seconds = idle_seconds
+
+        self.streams = {}
+        self.written_samples = 0
+        self.peak_queue_depth = 0
+        self.ingest_rate = 0.0
+        self._queue = None
+        self._servers = []
+        self._connections = set()
+        self._tasks = []
+        self._datagram_transport = None
+        self._datagram_streams = {}
+        self._next_stream = 0
+        self._writers = {}  # stream ID -> SessionWriter, only touched by the writer thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='neurotrack-writer')
+        self._rate_mark = (time.monotonic(), 0)
+
+    async def start(self):
+        """Open the database and start listening; returns once the ports are bound"""
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self._queue = asyncio.Queue(self.queue_blocks)
+        self._started = time.monotonic()
+        self.logger = await loop.run_in_executor(self._executor, SessionLogger, self.db_path)
+
+        if self.ports['frames'] is not None:
+            server = await asyncio.start_server(self._frames_connection, self.host, self.ports['frames'])
+            self.ports['frames'] = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+        if self.ports['lines'] is not None:
+            server = await asyncio.start_server(self._lines_connection, self.host, self.ports['lines'])
+            self.ports['lines'] = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+        if self.ports['datagram'] is not None:
+            self._datagram_transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), local_addr=(self.host, self.ports['datagram'])
+            )
+            self.ports['datagram'] = self._datagram_transport.get_extra_info('sockname')[1]
+
+        self._tasks = [asyncio.create_task(self._write_blocks()), asyncio.create_task(self._sweep_idle())]
+
+    async def stop(self):
+        """Stop listening, write everything queued and complete the sessions still open"""
+        for server in self._servers:
+            server.close()
+        if self._datagram_transport is not None:
+            self._datagram_transport.close()
+        # Connections see the end of their stream and complete their sessions themselves
+        connections = list(self._connections)
+        for writer in connections:
+            writer.transport.abort()
+        while self._connections:
+            await asyncio.sleep(0.01)
+        for stream in list(self.streams.values()):
+            await self._close(stream)
+
+        await self._queue.put(None)
+        await self._tasks[0]
+        self._tasks[1].cancel()
+        await self._loop.run_in_executor(self._executor, self._close_writers)
+        self._executor.shutdown()
+
+    async def serve(self, stats_seconds=STATS_SECONDS):
+        """Run until cancelled, printing stats every stats_seconds, then stop"""
+        await self.start()
+        print(f"Listening on {self.host}: frames on TCP {self.ports['frames']}, "
+              f"UDP {self.ports['datagram']}, lines on TCP {self.ports['lines']}")
+        try:
+            while True:
+                await asyncio.sleep(stats_seconds)
+                self.report()
+        finally:
+            await self.stop()
+            self.report()
+
+    def stats(self):
+        """
+        Ingest rate, queue depth, dropped frames and per-stream counters
+
+        Returns:
+            dict: Server-wide counters and a 'streams' list of stream counters
+        """
+        now = time.monotonic()
+        received = sum(stream.samples for stream in self.streams.values())
+        mark_time, mark_samples = self._rate_mark
+        if now - mark_time >= 1.0:
+            self.ingest_rate = (received - mark_samples) / (now - mark_time)
+            self._rate_mark = (now, received)
+        return {
+            'seconds': now - self._started,
+            'streams_open': sum(not stream.closed for stream in self.streams.values()),
+            'samples': received,
+            'samples_per_second': self.ingest_rate,
+            'written_samples': self.written_samples,
+            'dropped_frames': sum(stream.dropped_frames for stream in self.streams.values()),
+            'padded_samples': sum(stream.padded_samples for stream in self.streams.values()),
+            'queue_depth': self._queue.qsize(),
+            'queue_size': self.queue_blocks,
+            'peak_queue_depth': self.peak_queue_depth,
+            'streams': [stream.stats() for stream in self.streams.values()],
+        }
+
+    def report(self):
+        stats = self.stats()
+        print(f"{stats['streams_open']} streams open, {stats['samples_per_second']:,.0f} samples/s, "
+              f"{stats['written_samples']:,} samples written, queue {stats['queue_depth']}/{stats['queue_size']} "
+              f"(peak {stats['peak_queue_depth']}), {stats['dropped_frames']} frames dropped")
+
+    # Event loop side
+
+    def _new_stream(self, transport, peer, hello):
+        self._next_stream += 1
+        stream = Stream.from_hello(self._next_stream, transport, peer, hello, self.defaults)
+        self.streams[stream.stream_id] = stream
+        return stream
+
+    async def _open(self, stream):
+        """Queue the creation of a stream's session and wait for its ID"""
+        future = self._loop.create_future()
+        await self._queue.put(('open', stream, future))
+        return await future
+
+    async def _submit(self, stream, samples):
+        """Queue a block, waiting while the queue is full"""
+        block, padded = stream.block(samples)
+        if block.shape[1]:
+            await self._queue.put(('samples', stream, (block, padded)))
+            self._queued()
+
+    def _submit_nowait(self, stream, samples):
+        """Queue a block, or drop it if the queue is full"""
+        block, padded = stream.block(samples)
+        if not block.shape[1]:
+            return
+        try:
+            self._queue.put_nowait(('samples', stream, (block, padded)))
+        except asyncio.QueueFull:
+            stream.dropped(block, padded)
+            count('acquisition.dropped_frames')
+            return
+        self._queued()
+
+    def _queued(self):
+        self.peak_queue_depth = max(self.peak_queue_depth, self._queue.qsize())
+
+    async def _close(self, stream):
+        if not stream.closed:
+            stream.closed = True
+            await self._queue.put(('close', stream, stream.context))
+
+    async def _hello(self, reader, writer, transport, required=True):
+        """
+        Read the hello line of a TCP stream and create its stream
+
+        Returns:
+            tuple: (stream, data read past the hello), or (None, error message)
+        """
+        peer = writer.get_extra_info('peername')
+        try:
+            first = await reader.readline()
+            if not first.lstrip().startswith(b'{'):
+                if required:
+                    raise ValueError("expected a JSON hello line")
+                # No hello: the first line is already samples
+                return self._new_stream(transport, peer, {}), first
+            return self._new_stream(transport, peer, json.loads(first)), b''
+        except (ValueError, TypeError) as e:
+            return None, str(e)
+
+    async def _serve_stream(self, reader, writer, transport, receive, required=True):
+        self._connections.add(writer)
+        try:
+            stream, pending = await self._hello(reader, writer, transport, required)
+            if stream is None:
+                writer.write(json.dumps({'error': pending}).encode() + b'\n')
+                return
+            try:
+                stream.session_id = await self._open(stream)
+            except Exception as e:
+                stream.error = f'{type(e).__name__}: {e}'
+                stream.closed = True
+                writer.write(json.dumps({'error': stream.error}).encode() + b'\n')
+                return
+
+            try:
+                if required:
+                    writer.write(json.dumps({'session_id': stream.session_id}).encode() + b'\n')
+                await receive(stream, reader, pending)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass  # the device went away mid-frame; what arrived is kept
+            except Exception as e:
+                stream.error = f'{type(e).__name__}: {e}'
+            finally:
+                await self._close(stream)
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _frames_connection(self, reader, writer):
+        await self._serve_stream(reader, writer, 'tcp', self._receive_frames)
+
+    async def _receive_frames(self, stream, reader, pending):
+        while True:
+            try:
+                header = await reader.readexactly(FRAME_HEADER.size)
+            except asyncio.IncompleteReadError as e:
+                if e.partial:
+                    raise
+                return  # clean end of stream
+            n_samples = FRAME_HEADER.unpack(header)[1]
+            payload = await reader.readexactly(n_samples * len(CHANNELS) * FRAME_DTYPE.itemsize)
+            sequence, samples = decode_frame(header + payload)
+            if stream.sequence(sequence):
+                await self._submit(stream, samples)
+
+    async def _lines_connection(self, reader, writer):
+        await self._serve_stream(reader, writer, 'lines', self._receive_lines, required=False)
+
+    async def _receive_lines(self, stream, reader, pending):
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                lines, pending = [pending], b''
+            else:
+                lines = (pending + data).split(b'\n')
+                pending = lines.pop()
+            samples, malformed = parse_lines(lines)
+            stream.dropped_frames += malformed
+            if samples.shape[1]:
+                await self._submit(stream, samples)
+            if not data:
+                return
+
+    def _datagram(self, transport, data, addr):
+        stream = self._datagram_streams.get(addr)
+        try:
+            if data.lstrip().startswith(b'{'):
+                message = json.loads(data)
+                if message.get('end'):
+                    if stream is not None:
+                        del self._datagram_streams[addr]
+                        stream.context = message.get('context', stream.context)
+                        asyncio.create_task(self._close(stream))
+                    return
+                if stream is None:
+                    stream = self._datagram_streams[addr] = self._new_stream('udp', addr, message)
+                    asyncio.create_task(self._open_datagram_stream(transport, stream, addr))
+                elif stream.session_id is not None:
+                    # The device did not get the reply and said hello again
+                    transport.sendto(json.dumps({'session_id': stream.session_id}).encode(), addr)
+                return
+            if stream is None:
+                return  # frames from a device that has not said hello
+            sequence, samples = decode_frame(data)
+        except (ValueError, struct.error) as e:
+            if stream is not None:
+                stream.dropped_frames += 1
+            else:
+                transport.sendto(json.dumps({'error': str(e)}).encode(), addr)
+            return
+        if stream.sequence(sequence):
+            self._submit_nowait(stream, samples)
+
+    async def _open_datagram_stream(self, transport, stream, addr):
+        try:
+            stream.session_id = await self._open(stream)
+        except Exception as e:
+            stream.error = f'{type(e).__name__}: {e}'
+            self._datagram_streams.pop(addr, None)
+            transport.sendto(json.dumps({'error': stream.error}).encode(), addr)
+            return
+        transport.sendto(json.dumps({'session_id': stream.session_id}).encode(), addr)
+
+    async def _sweep_idle(self):
+        """End UDP streams that have been silent for idle_seconds"""
+        while True:
+            await asyncio.sleep(min(self.idle_seconds, 1.0))
+            now = time.monotonic()
+            for addr, stream in list(self._datagram_streams.items()):
+                if now - stream.last_seen >= self.idle_seconds:
+                    del self._datagram_streams[addr]
+                    await self._close(stream)
+
+    async def _write_blocks(self):
+        """Hand queued blocks to the writer thread in batches, until the None sentinel"""
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < WRITE_BATCH_BLOCKS and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            done = batch[-1] is None
+            if done:
+                batch.pop()
+            results = await self._loop.run_in_executor(self._executor, self._write_batch, batch)
+            for future, result in results:
+                if not future.done():
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+            if done:
+                return
+
+    # Writer thread side
+
+    def _write_batch(self, batch):
+        """
+        Open, append to and close sessions for a batch of queued messages
+
+        Returns:
+            list: (future, session ID or exception) for every session opened
+        """
+        results = []
+        with span('acquisition.write'):
+            for kind, stream, payload in batch:
+                try:
+                    if kind == 'open':
+                        writer = self.logger.open_session(stream.user_id, stream.sampling_rate,
+                                                          stream.opened_at, self.batch_chunks)
+                        self._writers[stream.stream_id] = writer
+                        results.append((payload, writer.session_id))
+                    elif kind == 'samples':
+                        writer = self._writers.get(stream.stream_id)
+                        if writer is not None:
+                            block, padded = payload
+                            writer.append(block[0], block[1], padded)
+                            self.written_samples += block.shape[1]
+                            count('acquisition.samples', block.shape[1])
+                    elif kind == 'close':
+                        writer = self._writers.pop(stream.stream_id, None)
+                        if writer is not None:
+                            writer.close(context_data=payload)
+                except Exception as e:
+                    stream.error = f'{type(e).__name__}: {e}'
+                    if kind == 'open':
+                        results.append((payload, e))
+                    else:
+                        # Leave the recording in progress, so committed samples can be resumed
+                        writer = self._writers.pop(stream.stream_id, None)
+                        if writer is not None:
+                            writer.__exit__(type(e), e, None)
+        return results
+
+    def _close_writers(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record EEG streamed from devices over TCP, UDP or serial bridges")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--frames-port', type=int, default=FRAMES_PORT,
+                        help=f"TCP port for binary frames (default: {FRAMES_PORT})")
+    parser.add_argument('--datagram-port', type=int, default=DATAGRAM_PORT,
+                        help=f"UDP port for binary frames (default: {DATAGRAM_PORT})")
+    parser.add_argument('--lines-port', type=int, default=LINES_PORT,
+                        help=f"TCP port for text lines from serial bridges (default: {LINES_PORT})")
+    parser.add_argument('--user-id', type=int, help="User of streams that do not say hello with one")
+    parser.add_argument('--sampling-rate', type=float, default=DEFAULT_SAMPLE_RATE,
+                        help="Sampling rate of streams that do not say hello with one "
+                             f"(default: {DEFAULT_SAMPLE_RATE})")
+    parser.add_argument('--queue-blocks', type=int, default=QUEUE_BLOCKS,
+                        help=f"Blocks queued before devices are pushed back on (default: {QUEUE_BLOCKS})")
+    parser.add_argument('--batch-chunks', type=int, default=BATCH_CHUNKS,
+                        help=f"EEG chunks buffered per stream before committing (default: {BATCH_CHUNKS})")
+    parser.add_argument('--stats-seconds', type=float, default=STATS_SECONDS,
+                        help=f"Seconds between stats lines (default: {STATS_SECONDS:g})")
+    parser.add_argument('--db', help="Path to the SQLite database (default: $NEUROTRACK_DB_PATH or data/neurotrack.db)")
+    args = parser.parse_args()
+
+    server = AcquisitionServer(
+        args.db, args.host, args.frames_port, args.datagram_port, args.lines_port, args.queue_blocks,
+        args.batch_chunks, args.user_id, args.sampling_rate
+    )
+    try:
+        asyncio.run(server.serve(args.stats_seconds))
+    except KeyboardInterrupt:
+        pass
@@ -1,72 +1,137 @@
 import numpy as np
 import pandas as pd
 from scipy import signal
-import sqlite3
 from datetime import datetime, timedelta
 import warnings
 
-def load_eeg_data(session_id):
+from scripts.data.connection import connection
+from scripts.data.eeg_store import DEFAULT_SAMPLE_RATE, read_eeg, read_eeg_array, read_recording
+from scripts.analysis.quality import good_segments, load_bad_intervals, window_quality
+from scripts.data.instrumentation import span, timed
+
+@timed('eeg.load_eeg_data')
+def load_eeg_data(session_id, db_path=None, start=None, end=None, channels=None):
     """
     Load EEG data from the database for a specific session
     
+    Sessions stored in sidecar files are returned as np.memmap views, so
+    slicing them or selecting channels does not read the whole file.
+    
     Args:
         session_id (int): ID of the session to load
+        db_path (str): Path to the SQLite database
+        start (datetime): Only load samples at or after this time
+        end (datetime): Only load samples before this time
+        channels (list): Channel names to load, e.g. ['channel1']; all if None
         
     Returns:
-        tuple: (timestamps, channel1_data, channel2_data)
-    """
-    conn = sqlite3.connect('data/neurotrack.db')
-    cursor = conn.cursor()
-    
-    try:
-        # Get EEG data for the session
-        cursor.execute('''
-            SELECT timestamp, channel1, channel2
-            FROM eeg_data
-            WHERE session_id = ?
-            ORDER BY timestamp
-        ''', (session_id,))
-        
-        data = cursor.fetchall()
-        if not data:
-            return None, None, None
-            
-        # Convert to numpy arrays
-        timestamps = np.array([row[0] for row in data])
-        channel1 = np.array([row[1] for row in data])
-        channel2 = np.array([row[2] for row in data])
-        
-        return timestamps, channel1, channel2
+        tuple: (timestamps, channel1_data, channel2_data), with None for
+        channels that were not selected
+    """
+    with connection(db_path) as conn:
+        return read_eeg(conn, session_id, start, end, channels)
+
+@timed('eeg.load_eeg_array')
+def load_eeg_array(session_id, db_path=None, start=None, end=None, channels=None):
+    """
+    Load EEG data for a specific session as one 2D array
+    
+    Args:
+        session_id (int): ID of the session to load
+        db_path (str): Path to the SQLite database
+        start (datetime): Only load samples at or after this time
+        end (datetime): Only load samples before this time
+        channels (list): Channel names to load, e.g. ['channel1']; all if None
         
-    finally:
-        conn.close()
+    Returns:
+        tuple: (timestamps, samples) where samples is a float32 array with
+        one row per selected channel, or (None, None) if there is no data
+    """
+    with connection(db_path) as conn:
+        return read_eeg_array(conn, session_id, start, end, channels)
+
+# Frequency bands in Hz used for band powers
+BANDS = {
+    'delta': (0.5, 4),
+    'theta': (4, 8),
+    'alpha': (8, 13),
+    'beta': (13, 30),
+    'gamma': (30, 50)
+}
 
-def analyze_eeg_data(session_id, sampling_rate=256):
+def welch_parameters(n_samples):
+    """Return the Welch (nperseg, noverlap) used for a recording of n_samples"""
+    nperseg = min(256, n_samples // 4)  # Window size
+    noverlap = nperseg // 2  # 50% overlap
+    
+    # Ensure noverlap is less than nperseg
+    noverlap = min(noverlap, nperseg - 1)
+    return nperseg, noverlap
+
+def welch_segments(data, fs, nperseg, noverlap, segments):
+    """
+    Welch's periodogram over selected (start, end) sample ranges of a signal
+
+    Equivalent to one Welch average over every window that fits inside a
+    segment: each segment's PSD is weighted by its number of windows.
+
+    Returns:
+        tuple: (freqs, psd), with psd None if no segment holds a window
+    """
+    freqs, total, count = None, None, 0
+    step = nperseg - noverlap
+    for start, end in segments:
+        if end - start < nperseg:
+            continue
+        n_windows = (end - start - nperseg) // step + 1
+        freqs, psd = signal.welch(data[start:end], fs=fs, nperseg=nperseg, noverlap=noverlap)
+        total = psd * n_windows if total is None else total + psd * n_windows
+        count += n_windows
+    return freqs, (total / count if count else None)
+
+@timed('eeg.analyze_eeg_data')
+def analyze_eeg_data(session_id, sampling_rate=None, db_path=None, skip_bad=False):
     """
     Analyze EEG data for a specific session
     
     Args:
         session_id (int): ID of the session to analyze
-        sampling_rate (int): Sampling rate of the EEG data in Hz
+        sampling_rate (int): Sampling rate of the EEG data in Hz; the rate
+            stored with the session if None
+        db_path (str): Path to the SQLite database
+        skip_bad (bool): Leave the session's bad intervals (flatline,
+            clipping, noise; see analysis.quality) out of each channel's PSD
         
     Returns:
-        dict: Dictionary containing analysis results
+        dict: Dictionary containing analysis results, or None if there is
+        no data, or with skip_bad, not enough clean data on a channel
     """
     # Load EEG data
-    timestamps, channel1, channel2 = load_eeg_data(session_id)
+    timestamps, samples = load_eeg_array(session_id, db_path)
     if timestamps is None:
         return None
+    channel1, channel2 = samples
+    if sampling_rate is None:
+        sampling_rate = load_sample_rate(session_id, db_path)
         
     # Calculate Welch's periodogram
-    nperseg = min(256, len(channel1) // 4)  # Window size
-    noverlap = nperseg // 2  # 50% overlap
-    
-    # Ensure noverlap is less than nperseg
-    noverlap = min(noverlap, nperseg - 1)
+    nperseg, noverlap = welch_parameters(len(channel1))
     
     # Calculate power spectral density
-    freqs1, psd1 = signal.welch(channel1, fs=sampling_rate, nperseg=nperseg, noverlap=noverlap)
-    freqs2, psd2 = signal.welch(channel2, fs=sampling_rate, nperseg=nperseg, noverlap=noverlap)
+    if skip_bad:
+        intervals = load_bad_intervals(session_id, db_path)
+        with span('welch.analyze_eeg_data'):
+            (freqs1, psd1), (freqs2, psd2) = (
+                welch_segments(data, sampling_rate, nperseg, noverlap,
+                               good_segments(intervals, channel, len(data), nperseg))
+                for channel, data in enumerate((channel1, channel2))
+            )
+        if psd1 is None or psd2 is None:
+            return None
+    else:
+        with span('welch.analyze_eeg_data'):
+            freqs1, psd1 = signal.welch(channel1, fs=sampling_rate, nperseg=nperseg, noverlap=noverlap)
+            freqs2, psd2 = signal.welch(channel2, fs=sampling_rate, nperseg=nperseg, noverlap=noverlap)
     
     # Calculate band powers
     band_powers = calculate_band_powers(freqs1, psd1, freqs2, psd2)
@@ -74,7 +139,7 @@ def analyze_eeg_data(session_id, sampling_rate=256):
     # Calculate cognitive metrics
     cognitive_metrics = calculate_cognitive_metrics(band_powers)
     
-    return {
+    results = {
         'band_powers': band_powers,
         'cognitive_metrics': cognitive_metrics,
         'raw_data': {
@@ -83,75 +148,169 @@ def analyze_eeg_data(session_id, sampling_rate=256):
             'channel2': channel2
         }
     }
+    if skip_bad:
+        results['bad_intervals'] = intervals
+    return results
 
-def calculate_band_powers(freqs1, psd1, freqs2, psd2):
-    """Calculate power in different frequency bands"""
-    # Define frequency bands
-    bands = {
-        'delta': (0.5, 4),
-        'theta': (4, 8),
-        'alpha': (8, 13),
-        'beta': (13, 30),
-        'gamma': (30, 50)
-    }
+def load_sample_rate(session_id, db_path=None):
+    """Return the stored sampling rate of a session, or the default for legacy rows"""
+    with connection(db_path) as conn:
+        return recording_shape(conn, session_id)[1]
+
+def recording_shape(conn, session_id):
+    """Return (n_samples, sampling_rate) of a session's EEG without loading the samples"""
+    recording = read_recording(conn, session_id)
+    if recording:
+        return recording['n_samples'], recording['sample_rate']
     
-    band_powers = {}
+    # Sessions still stored as legacy rows have no header
+    n_samples = conn.execute(
+        'SELECT COUNT(*) FROM eeg_data WHERE session_id = ?', (session_id,)
+    ).fetchone()[0]
+    return n_samples, DEFAULT_SAMPLE_RATE
+
+@timed('eeg.analyze_eeg_batch')
+def analyze_eeg_batch(session_ids, sampling_rate=None, db_path=None, batch_size=256,
+                      include_psd=False):
+    """
+    Analyze EEG data for many sessions at once
     
-    for band_name, (low, high) in bands.items():
-        # Find indices for the frequency band
-        idx = np.logical_and(freqs1 >= low, freqs1 <= high)
+    Sessions are grouped by length and sampling rate, and each group is
+    stacked into one (sessions, channels, samples) array so Welch runs once
+    per batch along the sample axis instead of once per session and channel.
+    
+    Args:
+        session_ids (list): IDs of the sessions to analyze
+        sampling_rate (int): Sampling rate of the EEG data in Hz; the rate
+            stored with each session if None
+        db_path (str): Path to the SQLite database
+        batch_size (int): Maximum number of sessions stacked into one array
+        include_psd (bool): Add a 'psd' column holding each session's
+            (channels, frequencies) power spectral density
         
-        # Calculate power in the band for both channels
-        power1 = np.trapz(psd1[idx], freqs1[idx])
-        power2 = np.trapz(psd2[idx], freqs2[idx])
+    Returns:
+        pd.DataFrame: One row per session with EEG data, with its length,
+        sampling rate, Welch parameters, band powers and cognitive metrics
+    """
+    with connection(db_path) as conn:
+        # Group sessions by length and sampling rate
+        groups = {}
+        for session_id in session_ids:
+            n_samples, rate = recording_shape(conn, session_id)
+            if n_samples:
+                key = (n_samples, sampling_rate or rate)
+                groups.setdefault(key, []).append(session_id)
         
-        # Store average power
-        band_powers[band_name] = (power1 + power2) / 2
+        results = []
+        for (n_samples, rate), group_ids in groups.items():
+            nperseg, noverlap = welch_parameters(n_samples)
+            for offset in range(0, len(group_ids), batch_size):
+                batch_ids = group_ids[offset:offset + batch_size]
+                stacked = np.stack([read_eeg_array(conn, session_id)[1] for session_id in batch_ids])
+                
+                # One Welch call over every channel of every session in the batch
+                with span('welch.analyze_eeg_batch'):
+                    freqs, psd = signal.welch(stacked, fs=rate, nperseg=nperseg, noverlap=noverlap, axis=-1)
+                
+                # Average band powers over channels, then derive metrics per session
+                powers = band_power_array(freqs, psd).mean(axis=1)
+                frame = pd.DataFrame(powers, columns=list(BANDS))
+                for name, values in cognitive_metrics_array(frame).items():
+                    frame[name] = values
+                frame.insert(0, 'session_id', batch_ids)
+                frame.insert(1, 'n_samples', n_samples)
+                frame.insert(2, 'sample_rate', rate)
+                frame.insert(3, 'nperseg', nperseg)
+                frame.insert(4, 'noverlap', noverlap)
+                if include_psd:
+                    frame['psd'] = list(psd)
+                results.append(frame)
+    
+    columns = ['session_id', 'n_samples', 'sample_rate', 'nperseg', 'noverlap', *BANDS,
+               'focus_score', 'relaxation_score', 'clarity_score']
+    if include_psd:
+        columns.append('psd')
+    if not results:
+        return pd.DataFrame(columns=columns)
+    
+    # Return sessions in the order they were requested
+    df = pd.concat(results, ignore_index=True)
+    order = {session_id: position for position, session_id in enumerate(session_ids)}
+    return df.sort_values('session_id', key=lambda ids: ids.map(order)).reset_index(drop=True)
+
+def band_power_array(freqs, psd):
+    """
+    Integrate power spectral densities over each frequency band
+    
+    Args:
+        freqs (np.ndarray): Frequencies of the PSD
+        psd (np.ndarray): PSDs with frequencies along the last axis
         
-    return band_powers
+    Returns:
+        np.ndarray: Band powers with one entry per band in BANDS along the last axis
+    """
+    powers = []
+    for low, high in BANDS.values():
+        idx = np.logical_and(freqs >= low, freqs <= high)
+        powers.append(np.trapz(psd[..., idx], freqs[idx], axis=-1))
+    return np.stack(powers, axis=-1)
 
-def calculate_cognitive_metrics(band_powers):
-    """Calculate cognitive metrics from band powers"""
+@timed('eeg.calculate_band_powers')
+def calculate_band_powers(freqs1, psd1, freqs2, psd2):
+    """Calculate power in different frequency bands"""
+    # Calculate power in each band for both channels
+    powers1 = band_power_array(freqs1, psd1)
+    powers2 = band_power_array(freqs2, psd2)
+    
+    # Store average power
+    return {
+        band_name: (power1 + power2) / 2
+        for band_name, power1, power2 in zip(BANDS, powers1, powers2)
+    }
+
+def cognitive_metrics_array(band_powers):
+    """
+    Calculate cognitive metrics from band powers of any shape
+    
+    Args:
+        band_powers: Mapping of band name to a band power or an array of them,
+            e.g. a dict or a DataFrame with one column per band
+        
+    Returns:
+        dict: focus_score, relaxation_score and clarity_score, each clipped to 1-5
+    """
     # Calculate ratios
     alpha_theta = band_powers['alpha'] / band_powers['theta']
     beta_alpha = band_powers['beta'] / band_powers['alpha']
+    clarity_ratio = band_powers['alpha'] / (band_powers['theta'] + band_powers['delta'])
     
-    # Calculate focus score (0-5)
-    focus_score = min(5, max(1, 3 + (beta_alpha - 1) * 2))
-    
-    # Calculate relaxation score (0-5)
-    relaxation_score = min(5, max(1, 3 + (alpha_theta - 1) * 2))
-    
-    # Calculate mental clarity score (0-5)
-    clarity_score = min(5, max(1, 3 + (band_powers['alpha'] / (band_powers['theta'] + band_powers['delta'])) * 2))
-    
     return {
-        'focus_score': round(focus_score, 1),
-        'relaxation_score': round(relaxation_score, 1),
-        'clarity_score': round(clarity_score, 1)
+        'focus_score': np.round(np.clip(3 + (beta_alpha - 1) * 2, 1, 5), 1),
+        'relaxation_score': np.round(np.clip(3 + (alpha_theta - 1) * 2, 1, 5), 1),
+        'clarity_score': np.round(np.clip(3 + clarity_ratio * 2, 1, 5), 1)
+    }
+
+def calculate_cognitive_metrics(band_powers):
+    """Calculate cognitive metrics from band powers"""
+    return {
+        name: float(score)
+        for name, score in cognitive_metrics_array(band_powers).items()
     }
 
-def check_signal_quality(data):
-    """Check EEG signal quality and return True if signal is good enough for analysis"""
-    try:
-        # Check for flatlines or constant values
-        if np.any(np.std(data, axis=0) < 1e-6):
-            print("Warning: Channel contains flatline or constant values")
-            return False
-            
-        # Check for extreme values
-        if np.any(np.abs(data) > 1000):
-            print("Warning: Channel contains extreme values")
-            return False
-            
-        # Check for excessive noise (using rolling standard deviation)
-        window = 100  # 100 samples window
-        rolling_std = pd.DataFrame(data).rolling(window=window).std()
-        if np.any(rolling_std > np.mean(rolling_std) * 5):
-            print("Warning: Channel contains excessive noise")
-            return False
-            
-        return True
-    except Exception as e:
-        print(f"Error in signal quality check: {e}")
-        return False
\ No newline at end of file
+def check_signal_quality(data, window=100):
+    """
+    Check EEG signal quality and return True if no window of any channel is bad
+    
+    See analysis.quality for the flatline, clipping and noise checks and for
+    per-window masks and bad intervals.
+    
+    Args:
+        data: Samples with one column per channel, or a single channel
+        window (int): Samples per quality window
+    """
+    samples = np.asarray(data, dtype=float)
+    samples = samples.T if samples.ndim == 2 else samples[np.newaxis]
+    if samples.shape[-1] == 0:
+        return False
+    _, masks = window_quality(samples, window)
+    return not masks['bad'].any()
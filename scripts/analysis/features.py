@@ -0,0 +1,182 @@
+import argparse
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from scripts.data.connection import connection
+from scripts.analysis.eeg import BANDS, analyze_eeg_batch, recording_shape, welch_parameters
+from scripts.data.instrumentation import count, timed
+
+# Spectral features are cached in session_features, keyed by session and a
+# hash of the analysis parameters. Triggers on the EEG tables (see init_db)
+# drop a session's cached rows whenever its samples change.
+FEATURE_COLUMNS = [*BANDS, 'focus_score', 'relaxation_score', 'clarity_score']
+LOOKUP_BATCH = 400  # keeps lookups under SQLite's bound parameter limit
+
+
+def params_hash(sampling_rate, nperseg, noverlap, bands=BANDS):
+    """Hash the parameters that determine a session's spectral features"""
+    params = {
+        'sampling_rate': float(sampling_rate),
+        'nperseg': int(nperseg),
+        'noverlap': int(noverlap),
+        'bands': {name: list(edges) for name, edges in bands.items()}
+    }
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def session_params(conn, session_id):
+    """Return the (sampling_rate, nperseg, noverlap, params_hash) a session is analyzed with"""
+    n_samples, sampling_rate = recording_shape(conn, session_id)
+    if not n_samples:
+        return None
+
+    nperseg, noverlap = welch_parameters(n_samples)
+    return sampling_rate, nperseg, noverlap, params_hash(sampling_rate, nperseg, noverlap)
+
+
+@timed('eeg.get_session_features')
+def get_session_features(session_ids, db_path=None, store_psd=False, compute=True):
+    """
+    Return band powers and cognitive metrics for sessions, reading through the cache
+
+    Cached rows are returned directly. Missing sessions are analyzed in one
+    batch and stored, unless compute is False.
+
+    Args:
+        session_ids (list): IDs of the sessions
+        db_path (str): Path to the SQLite database
+        store_psd (bool): Also store each session's PSD when computing features
+        compute (bool): Analyze sessions that are not cached yet
+
+    Returns:
+        pd.DataFrame: One row per session with EEG data, indexed by session_id
+    """
+    with connection(db_path) as conn:
+        keys = {}
+        for session_id in dict.fromkeys(session_ids):
+            params = session_params(conn, session_id)
+            if params:
+                keys[session_id] = params[3]
+
+        # Look up cached rows, a bounded number of (session_id, params_hash) pairs at a time
+        frames = [pd.DataFrame(columns=['session_id', *FEATURE_COLUMNS])]
+        items = list(keys.items())
+        for offset in range(0, len(items), LOOKUP_BATCH):
+            batch = items[offset:offset + LOOKUP_BATCH]
+            placeholders = ', '.join('(?, ?)' for _ in batch)
+            frames.append(pd.read_sql_query(f'''
+                SELECT session_id, {', '.join(FEATURE_COLUMNS)}
+                FROM session_features
+                WHERE (session_id, params_hash) IN (VALUES {placeholders})
+            ''', conn, params=[value for item in batch for value in item]))
+        cached = pd.concat(frames, ignore_index=True)
+
+        cached_ids = set(cached['session_id'])
+        missing = [session_id for session_id in keys if session_id not in cached_ids]
+        count('features.cached', len(keys) - len(missing))
+        count('features.computed', len(missing) if compute else 0)
+        if missing and compute:
+            computed = analyze_eeg_batch(missing, db_path=db_path, include_psd=store_psd)
+            store_features(conn, computed)
+            cached = pd.concat([cached, computed[['session_id', *FEATURE_COLUMNS]]], ignore_index=True)
+
+    features = cached.astype({'session_id': int}).set_index('session_id').astype(float)
+    return features.reindex([session_id for session_id in keys if session_id in features.index])
+
+
+def store_features(conn, features):
+    """Write rows returned by analyze_eeg_batch into the cache"""
+    rows = []
+    for row in features.itertuples(index=False):
+        psd = getattr(row, 'psd', None)
+        rows.append((
+            row.session_id,
+            params_hash(row.sample_rate, row.nperseg, row.noverlap),
+            row.sample_rate,
+            row.nperseg,
+            row.noverlap,
+            *(float(getattr(row, column)) for column in FEATURE_COLUMNS),
+            np.asarray(psd, dtype=np.float32).tobytes() if psd is not None else None
+        ))
+
+    with conn:
+        conn.executemany(f'''
+            INSERT OR REPLACE INTO session_features (
+                session_id, params_hash, sampling_rate, nperseg, noverlap,
+                {', '.join(FEATURE_COLUMNS)}, psd
+            ) VALUES ({', '.join('?' * (len(FEATURE_COLUMNS) + 6))})
+        ''', rows)
+
+
+def load_psd(session_id, db_path=None):
+    """
+    Return the cached (freqs, psd) of a session, or (None, None) if it was not stored
+
+    The PSD has one row per channel.
+    """
+    with connection(db_path) as conn:
+        params = session_params(conn, session_id)
+        if params is None:
+            return None, None
+        sampling_rate, nperseg, _, key = params
+        row = conn.execute('''
+            SELECT psd FROM session_features
+            WHERE session_id = ? AND params_hash = ? AND psd IS NOT NULL
+        ''', (session_id, key)).fetchone()
+
+    if row is None:
+        return None, None
+    freqs = np.fft.rfftfreq(nperseg, d=1 / sampling_rate)
+    return freqs, np.frombuffer(row[0], dtype=np.float32).reshape(-1, len(freqs))
+
+
+def backfill(db_path=None, rebuild=False, store_psd=False, batch_size=256):
+    """
+    Compute and cache features for every session with EEG data
+
+    Args:
+        db_path (str): Path to the SQLite database
+        rebuild (bool): Drop all cached features first
+        store_psd (bool): Also store each session's PSD
+        batch_size (int): Number of sessions analyzed per batch
+
+    Returns:
+        int: Number of sessions with cached features
+    """
+    with connection(db_path) as conn:
+        if rebuild:
+            with conn:
+                conn.execute('DELETE FROM session_features')
+        session_ids = [row[0] for row in conn.execute('''
+            SELECT session_id FROM eeg_recordings
+            UNION
+            SELECT DISTINCT session_id FROM eeg_data
+        ''')]
+
+    cached = 0
+    for offset in range(0, len(session_ids), batch_size):
+        batch = session_ids[offset:offset + batch_size]
+        cached += len(get_session_features(batch, db_path, store_psd=store_psd))
+        print(f"Cached features for {min(offset + batch_size, len(session_ids))}/{len(session_ids)} sessions")
+
+    return cached
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill or rebuild the session_features cache")
+    parser.add_argument('command', choices=['backfill', 'rebuild'],
+                        help="'backfill' computes missing features, 'rebuild' recomputes all of them")
+    parser.add_argument('--db', help="Path to the SQLite database (default: $NEUROTRACK_DB_PATH or data/neurotrack.db)")
+    parser.add_argument('--store-psd', action='store_true', help="Also store each session's PSD")
+    args = parser.parse_args()
+
+    n_sessions = backfill(args.db, rebuild=args.command == 'rebuild', store_psd=args.store_psd)
+    print(f"Session features cached for {n_sessions} sessions")
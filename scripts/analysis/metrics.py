@@ -52,7 +52,7 @@ def find_optimal_times(hourly_stats, n=3):
 
 def analyze_activity_patterns(df):
     """Analyze performance patterns by activity type"""
-    activity_metrics = df.groupby('activity_type').agg({
+    activity_metrics = df.groupby('activity_type', observed=True).agg({
         'focus_score': 'mean',
         'mental_clarity': 'mean',
         'mood_score': 'mean'
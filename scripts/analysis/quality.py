@@ -0,0 +1,273 @@
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from scripts.data.connection import connection
+from scripts.data.eeg_store import DEFAULT_SAMPLE_RATE, read_eeg_array, read_gaps, read_recording
+
+# Signal quality is judged per channel on consecutive windows of samples.
+# Runs of bad windows are stored per session as bad intervals, next to a
+# signal_quality row recording that the session was assessed. Triggers on
+# the EEG tables (see migrations) drop both whenever the samples change.
+# Samples filled in for frames lost while streaming (the session's gaps)
+# are bad on every channel, with the reason 'padded'.
+QUALITY_WINDOW_SECONDS = 1.0
+FLATLINE_STD = 1e-6      # windows with less variation than this are flat
+CLIP_LEVEL = 1000.0      # samples this far from zero are beyond the amplifier's range
+RAIL_FRACTION = 0.05     # windows with this share of samples at the channel's min or max are saturated
+NOISE_FACTOR = 5.0       # windows this many times noisier than the channel's median window
+
+FLAGS = ('flatline', 'clipping', 'noise')
+PADDED = 'padded'
+
+
+def window_bounds(n_samples, window):
+    """
+    Return the (start, end) sample of each quality window
+
+    Windows are consecutive; a shorter tail gets its own window ending at
+    the last sample, so every sample is covered.
+    """
+    window = max(1, min(window, n_samples))
+    starts = np.arange(0, n_samples - window + 1, window)
+    if n_samples % window:
+        starts = np.append(starts, n_samples - window)
+    return np.stack([starts, np.minimum(starts + window, n_samples)], axis=1)
+
+
+def window_quality(samples, window):
+    """
+    Flag flatline, clipping and noise per channel and window
+
+    Statistics are computed on strided views of the samples, so no window
+    is copied.
+
+    Args:
+        samples (np.ndarray): Array with one row per channel
+        window (int): Samples per window
+
+    Returns:
+        tuple: (bounds, masks) where bounds holds the (start, end) sample of
+        each window and masks maps every name in FLAGS, and 'bad' for any of
+        them, to a boolean (channels, windows) array
+    """
+    samples = np.atleast_2d(samples)
+    n_samples = samples.shape[-1]
+    bounds = window_bounds(n_samples, window)
+    window = int(bounds[0, 1] - bounds[0, 0])
+    # Windows start every `window` samples; with a short tail, the last one overlaps its neighbour
+    windows = sliding_window_view(samples, window, axis=-1)[:, bounds[:, 0]]
+
+    std = windows.std(axis=-1, dtype=np.float64)
+    peak = np.abs(windows).max(axis=-1)
+    low = samples.min(axis=-1, keepdims=True)[..., None]
+    high = samples.max(axis=-1, keepdims=True)[..., None]
+    at_rail = ((windows == low) | (windows == high)).mean(axis=-1, dtype=np.float64)
+
+    masks = {
+        'flatline': std < FLATLINE_STD,
+        'clipping': (peak >= CLIP_LEVEL) | ((at_rail >= RAIL_FRACTION) & (high > low)[..., 0]),
+        'noise': std > NOISE_FACTOR * np.median(std, axis=-1, keepdims=True),
+    }
+    masks['bad'] = np.logical_or.reduce([masks[flag] for flag in FLAGS])
+    return bounds, masks
+
+
+def bad_intervals(bounds, masks):
+    """
+    Merge runs of bad windows into intervals
+
+    Args:
+        bounds (np.ndarray): Window bounds returned by window_quality
+        masks (dict): Window masks returned by window_quality
+
+    Returns:
+        list: (channel, start_sample, end_sample, reasons) tuples, with
+        reasons a comma-separated list of the flags raised in the interval
+    """
+    intervals = []
+    for channel, bad in enumerate(masks['bad']):
+        # Edges of the runs of bad windows
+        edges = np.flatnonzero(np.diff(np.concatenate([[0], bad.astype(np.int8), [0]])))
+        for first, last in edges.reshape(-1, 2):
+            reasons = [flag for flag in FLAGS if masks[flag][channel, first:last].any()]
+            intervals.append((channel, int(bounds[first, 0]), int(bounds[last - 1, 1]), ','.join(reasons)))
+    return intervals
+
+
+def add_gaps(intervals, gaps, n_channels):
+    """
+    Merge filled-in sample ranges into bad intervals on every channel
+
+    Args:
+        intervals (list): Bad intervals as returned by bad_intervals
+        gaps (list): (start_sample, end_sample) ranges filled in while streaming
+        n_channels (int): Number of channels
+
+    Returns:
+        list: Bad intervals in channel and sample order, with PADDED among
+        the reasons of those overlapping a gap
+    """
+    if not gaps:
+        return intervals
+    merged = []
+    for channel in range(n_channels):
+        spans = sorted(
+            [(start, end, reasons.split(',')) for c, start, end, reasons in intervals if c == channel]
+            + [(start, end, [PADDED]) for start, end in gaps]
+        )
+        current = None
+        for start, end, reasons in spans:
+            if current is not None and start <= current[2]:
+                current[2] = max(current[2], end)
+                current[3].update(reasons)
+            else:
+                if current is not None:
+                    merged.append(current)
+                current = [channel, start, end, set(reasons)]
+        if current is not None:
+            merged.append(current)
+    return [(channel, start, end, ','.join(r for r in FLAGS + (PADDED,) if r in reasons))
+            for channel, start, end, reasons in merged]
+
+
+def good_segments(intervals, channel, n_samples, min_length=1):
+    """
+    Return the (start, end) sample ranges of a channel outside its bad intervals
+
+    Args:
+        intervals (list): Bad intervals as returned by bad_intervals
+        channel (int): Channel index
+        n_samples (int): Length of the recording
+        min_length (int): Leave out segments shorter than this
+
+    Returns:
+        list: (start, end) pairs in sample order
+    """
+    segments = []
+    position = 0
+    for _, start, end, _ in sorted(i for i in intervals if i[0] == channel):
+        if start > position:
+            segments.append((position, start))
+        position = max(position, end)
+    if position < n_samples:
+        segments.append((position, n_samples))
+    return [(start, end) for start, end in segments if end - start >= min_length]
+
+
+def assess_samples(samples, sampling_rate, window_seconds=QUALITY_WINDOW_SECONDS, gaps=()):
+    """
+    Assess a recording and return its window size, window count and bad intervals
+
+    Args:
+        samples (np.ndarray): Array with one row per channel
+        sampling_rate (float): Sampling rate in Hz
+        window_seconds (float): Length of a quality window
+        gaps (list): (start_sample, end_sample) ranges filled in while
+            streaming, added to the bad intervals of every channel
+
+    Returns:
+        dict: window (samples), n_windows, bad_windows and intervals
+    """
+    window = max(1, int(round(sampling_rate * window_seconds)))
+    bounds, masks = window_quality(samples, window)
+    return {
+        'window': int(bounds[0, 1] - bounds[0, 0]),
+        'n_windows': len(bounds),
+        'bad_windows': int(masks['bad'].any(axis=0).sum()),
+        'intervals': add_gaps(bad_intervals(bounds, masks), gaps, len(masks['bad']))
+    }
+
+
+def store_quality(conn, session_id, quality):
+    """Replace the stored assessment of a session with one returned by assess_samples"""
+    with conn:
+        conn.execute('DELETE FROM eeg_bad_intervals WHERE session_id = ?', (session_id,))
+        conn.execute('''
+            INSERT OR REPLACE INTO signal_quality (session_id, window_samples, n_windows, bad_windows)
+            VALUES (?, ?, ?, ?)
+        ''', (session_id, quality['window'], quality['n_windows'], quality['bad_windows']))
+        conn.executemany('''
+            INSERT INTO eeg_bad_intervals (session_id, channel, start_sample, end_sample, reasons)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(session_id, *interval) for interval in quality['intervals']])
+
+
+def load_bad_intervals(session_id, db_path=None, compute=True):
+    """
+    Return the bad intervals of a session, assessing and storing them if needed
+
+    Args:
+        session_id (int): ID of the session
+        db_path (str): Path to the SQLite database
+        compute (bool): Assess the session if it has not been assessed yet
+
+    Returns:
+        list: (channel, start_sample, end_sample, reasons) tuples, or None if
+        the session has no EEG or was not assessed and compute is False
+    """
+    with connection(db_path) as conn:
+        assessed = conn.execute('SELECT 1 FROM signal_quality WHERE session_id = ?', (session_id,)).fetchone()
+        if assessed:
+            return [tuple(row) for row in conn.execute('''
+                SELECT channel, start_sample, end_sample, reasons FROM eeg_bad_intervals
+                WHERE session_id = ? ORDER BY channel, start_sample
+            ''', (session_id,))]
+        if not compute:
+            return None
+
+        _, samples = read_eeg_array(conn, session_id)
+        if samples is None:
+            return None
+        recording = read_recording(conn, session_id)
+        quality = assess_samples(samples, recording['sample_rate'] if recording else DEFAULT_SAMPLE_RATE,
+                                 gaps=read_gaps(conn, session_id))
+        store_quality(conn, session_id, quality)
+        return quality['intervals']
+
+
+def assess_all(db_path=None, rebuild=False):
+    """
+    Assess every session with EEG data that has no stored assessment
+
+    Args:
+        db_path (str): Path to the SQLite database
+        rebuild (bool): Drop all stored assessments first
+
+    Returns:
+        tuple: (sessions assessed, sessions with at least one bad interval)
+    """
+    with connection(db_path) as conn:
+        if rebuild:
+            with conn:
+                conn.execute('DELETE FROM eeg_bad_intervals')
+                conn.execute('DELETE FROM signal_quality')
+        session_ids = [row[0] for row in conn.execute('''
+            SELECT session_id FROM eeg_recordings
+            UNION
+            SELECT DISTINCT session_id FROM eeg_data
+            EXCEPT
+            SELECT session_id FROM signal_quality
+        ''')]
+
+    flagged = 0
+    for session_id in session_ids:
+        flagged += bool(load_bad_intervals(session_id, db_path))
+    return len(session_ids), flagged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find flatline, clipping and noisy intervals in stored EEG")
+    parser.add_argument('command', choices=['assess', 'rebuild'],
+                        help="'assess' checks sessions not assessed yet, 'rebuild' reassesses all of them")
+    parser.add_argument('--db', help="Path to the SQLite database (default: $NEUROTRACK_DB_PATH or data/neurotrack.db)")
+    args = parser.parse_args()
+
+    assessed, flagged = assess_all(args.db, rebuild=args.command == 'rebuild')
+    print(f"Assessed {assessed} sessions, {flagged} with bad intervals")
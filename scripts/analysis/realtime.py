@@ -0,0 +1,129 @@
+import numpy as np
+from scipy import signal
+
+from scripts.analysis.eeg import BANDS, band_power_array, calculate_cognitive_metrics, welch_parameters
+from scripts.data.eeg_store import CHANNELS, DEFAULT_SAMPLE_RATE
+
+
+class RealtimeBandPowerAnalyzer:
+    """
+    Sliding-window band powers and cognitive metrics for a live EEG feed
+
+    The PSD is Welch's average over the most recent window, using the same
+    segment length, overlap, Hann window and band definitions as
+    analyze_eeg_data. Each segment's periodogram is computed once, when its
+    last sample arrives, and kept in a ring until it slides out of the
+    window, so an update only costs the FFTs of the segments that are new
+    since the previous one.
+
+    Example:
+        analyzer = RealtimeBandPowerAnalyzer(sampling_rate=256)
+        for channel1, channel2 in device.read_blocks():
+            result = analyzer.push([channel1, channel2])
+            if result:
+                show(result['cognitive_metrics'])
+    """
+
+    def __init__(self, sampling_rate=DEFAULT_SAMPLE_RATE, window_seconds=4, update_ms=500,
+                 n_channels=len(CHANNELS)):
+        """
+        Args:
+            sampling_rate (float): Sampling rate of the feed in Hz
+            window_seconds (float): Length of the sliding analysis window
+            update_ms (float): Interval between updates in milliseconds of
+                signal time, rounded to a whole number of Welch steps
+            n_channels (int): Number of channels in each pushed block
+        """
+        self.sampling_rate = sampling_rate
+        self.n_channels = n_channels
+        window_samples = int(round(window_seconds * sampling_rate))
+        self.nperseg, self.noverlap = welch_parameters(window_samples)
+        if self.nperseg < 2:
+            raise ValueError("Analysis window is too short for Welch's method")
+
+        # Welch only uses whole segments, so the effective window is the span they cover
+        self.step = self.nperseg - self.noverlap
+        self.n_segments = (window_samples - self.nperseg) // self.step + 1
+        self.window_samples = (self.n_segments - 1) * self.step + self.nperseg
+        self.update_samples = self.step * max(1, int(round(update_ms / 1000 * sampling_rate / self.step)))
+
+        # Same taper and density scaling as scipy.signal.welch
+        self.taper = signal.get_window('hann', self.nperseg)
+        self.scale = 1.0 / (sampling_rate * np.sum(self.taper ** 2))
+        self.freqs = np.fft.rfftfreq(self.nperseg, d=1 / sampling_rate)
+
+        # Raw samples, long enough to hold every segment of a window plus one step
+        self.buffer = np.zeros((n_channels, self.window_samples + self.step))
+        self.periodograms = np.zeros((self.n_segments, n_channels, len(self.freqs)))
+        self.n_samples = 0  # samples received so far
+        self.next_segment = 0  # index of the next segment to transform
+        self.next_update = self.window_samples
+        self.latest = None
+
+    def reset(self):
+        """Drop all buffered samples, e.g. after the device reconnects"""
+        self.n_samples = 0
+        self.next_segment = 0
+        self.next_update = self.window_samples
+        self.latest = None
+
+    def push(self, block):
+        """
+        Add a block of samples and update the metrics if an update is due
+
+        Args:
+            block (array-like): (channels, samples) array, or one array per channel
+
+        Returns:
+            dict: band_powers, cognitive_metrics and the sample count they were
+            computed at, or None if no update was due
+        """
+        block = np.asarray(block, dtype=float)
+        if block.ndim != 2 or block.shape[0] != self.n_channels:
+            raise ValueError(f"Expected a block of {self.n_channels} channels")
+
+        # Only the tail of a block larger than the buffer can reach the window
+        capacity = self.buffer.shape[1]
+        skipped = max(0, block.shape[1] - capacity)
+        start = self.n_samples + skipped
+        positions = np.arange(start, self.n_samples + block.shape[1]) % capacity
+        self.buffer[:, positions] = block[:, skipped:]
+        self.n_samples += block.shape[1]
+
+        if self.n_samples < self.next_update:
+            return None
+
+        # Transform the segments completed since the last update, skipping any
+        # that have already slid out of the window
+        last_segment = (self.n_samples - self.nperseg) // self.step
+        first_segment = max(self.next_segment, last_segment - self.n_segments + 1)
+        for segment in range(first_segment, last_segment + 1):
+            self.periodograms[segment % self.n_segments] = self._periodogram(segment * self.step)
+        self.next_segment = last_segment + 1
+
+        # Update on the next multiple of update_samples
+        self.next_update += (
+            (self.n_samples - self.next_update) // self.update_samples + 1
+        ) * self.update_samples
+
+        psd = self.periodograms.mean(axis=0)
+        powers = band_power_array(self.freqs, psd).mean(axis=0)
+        band_powers = {band: float(power) for band, power in zip(BANDS, powers)}
+        self.latest = {
+            'band_powers': band_powers,
+            'cognitive_metrics': calculate_cognitive_metrics(band_powers),
+            'n_samples': last_segment * self.step + self.nperseg
+        }
+        return self.latest
+
+    def _periodogram(self, start):
+        """One-sided density periodogram of the segment starting at sample index start"""
+        positions = np.arange(start, start + self.nperseg) % self.buffer.shape[1]
+        segment = self.buffer[:, positions]
+        segment = (segment - segment.mean(axis=-1, keepdims=True)) * self.taper
+        periodogram = np.abs(np.fft.rfft(segment, axis=-1)) ** 2 * self.scale
+        if self.nperseg % 2:
+            periodogram[:, 1:] *= 2
+        else:
+            periodogram[:, 1:-1] *= 2
+        return periodogram
@@ -1,41 +1,161 @@
-import sqlite3
 import pandas as pd
 import numpy as np
 from scipy.signal import welch
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import argparse
 import json
+import os
+from pathlib import Path
+import sys
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.data.connection import get_connection
+from scripts.data.instrumentation import timed
+from scripts.data.rollups import LATEST_CONTEXT, activity_hourly_stats, hourly_stats
+from scripts.data.schema import read_frame
+from scripts.data.timestamps import hour_of_day_sql
+
+# Hour of time_of_day, computed in SQL instead of parsing the strings in pandas
+HOUR_SQL = hour_of_day_sql('lc.time_of_day')
+
+# Sessions with their latest context row, as counted by the rollups that
+# load_hourly_metrics and load_activity_patterns read
+SESSION_JOIN = f'''
+FROM sessions s
+JOIN users u ON s.user_id = u.id
+JOIN lifestyle_context lc ON {LATEST_CONTEXT}
+'''
+
+# A fixed row order keeps tie-breaking in the rankings below the same
+# whether one user or many are loaded
+SESSION_ORDER = 's.user_id, s.timestamp, s.id'
+
+
+def _user_filter(user_id=None, user_ids=None):
+    """WHERE clause and parameters selecting one user, a list of users, or everyone"""
+    if user_id:
+        return 'WHERE s.user_id = ?', [int(user_id)]
+    if user_ids:
+        return f"WHERE s.user_id IN ({', '.join('?' * len(user_ids))})", [int(uid) for uid in user_ids]
+    return 'WHERE 1', []
+
 
 class CognitivePatternAnalyzer:
-    def __init__(self, db_path='data/neurotrack.db'):
+    def __init__(self, db_path=None):
         self.db_path = db_path
 
-    def load_data(self, user_id=None):
-        conn = sqlite3.connect(self.db_path)
-        query = '''
+    @timed('patterns.load_data')
+    def load_data(self, user_id=None, user_ids=None):
+        """Load sessions with their context for one user, a list of users, or everyone"""
+        where, params = _user_filter(user_id, user_ids)
+        query = f'''
         SELECT 
             s.id,
             s.user_id,
             u.name as user_name,
             s.timestamp,
             s.eeg_file_path,
-            lc.*
-        FROM sessions s
-        JOIN users u ON s.user_id = u.id
-        JOIN lifestyle_context lc ON s.id = lc.session_id
+            lc.*,
+            {HOUR_SQL} AS hour
+        {SESSION_JOIN}
+        {where}
+        ORDER BY {SESSION_ORDER}
         '''
-        if user_id:
-            query += f' WHERE s.user_id = {user_id}'
-        
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        # Convert time_of_day to datetime for easier analysis
-        df['hour'] = pd.to_datetime(df['time_of_day'], format='%H:%M').dt.hour
-        return df
+        return read_frame(query, get_connection(self.db_path), params=params)
+
+    @timed('patterns.load_hourly_metrics')
+    def load_hourly_metrics(self, user_id=None):
+        """
+        Average focus, clarity and mood per hour of day, read from the hourly rollup
+
+        Returns the same columns as analyze_optimal_times, plus the number
+        of sessions behind each hour.
+
+        Args:
+            user_id (int): Only include this user's sessions; all users if None
+
+        Returns:
+            pd.DataFrame: One row per hour, ordered by hour
+        """
+        hourly_metrics = hourly_stats(user_id, self.db_path)[
+            ['hour', 'focus_score', 'mental_clarity', 'mood_score', 'sessions']
+        ]
+        hourly_metrics['performance_score'] = (
+            hourly_metrics['focus_score'] * 0.4 +
+            hourly_metrics['mental_clarity'] * 0.4 +
+            hourly_metrics['mood_score'] * 0.2
+        )
+        return hourly_metrics
+
+    @timed('patterns.load_activity_patterns')
+    def load_activity_patterns(self, user_id=None):
+        """
+        Average focus and clarity per activity type and hour, read from the activity rollup
+
+        Returns the same columns as analyze_activity_patterns, plus the
+        number of sessions behind each row.
+
+        Args:
+            user_id (int): Only include this user's sessions; all users if None
+
+        Returns:
+            pd.DataFrame: One row per activity type and hour
+        """
+        return activity_hourly_stats(user_id, self.db_path)[
+            ['activity_type', 'hour', 'focus_score', 'mental_clarity', 'sessions']
+        ]
 
+    @timed('patterns.load_best_sessions')
+    def load_best_sessions(self, user_id=None, activity_type=None, limit=10):
+        """
+        Load only the highest-rated sessions
+
+        Sessions of an activity type are ranked by the mean of focus and
+        clarity, as in _get_optimal_activity_time; otherwise by focus, then
+        clarity, as in _analyze_best_conditions.
+
+        Args:
+            user_id (int): Only include this user's sessions; all users if None
+            activity_type (str): Only include sessions of this activity
+            limit (int): Number of sessions to return
+
+        Returns:
+            pd.DataFrame: Up to limit sessions, best first
+        """
+        where, params = _user_filter(user_id)
+        if activity_type:
+            where += ' AND lc.activity_type = ? AND lc.focus_score + lc.mental_clarity IS NOT NULL'
+            params.append(activity_type)
+            ranking = '(lc.focus_score + lc.mental_clarity) / 2.0 DESC'
+        else:
+            where += ' AND lc.focus_score IS NOT NULL'
+            ranking = 'lc.focus_score DESC, lc.mental_clarity DESC'
+        query = f'''
+        SELECT
+            s.id,
+            s.user_id,
+            lc.activity_type,
+            lc.focus_score,
+            lc.mental_clarity,
+            lc.sleep_hours,
+            lc.hours_since_meal,
+            lc.exercise_type,
+            lc.last_meal_type,
+            {HOUR_SQL} AS hour
+        {SESSION_JOIN}
+        {where}
+        ORDER BY {ranking}, {SESSION_ORDER}
+        LIMIT ?
+        '''
+        return read_frame(query, get_connection(self.db_path), params=params + [limit])
+
+    @timed('patterns.analyze_optimal_times')
     def analyze_optimal_times(self, df):
         """Analyze cognitive performance by time of day"""
         # Calculate average performance metrics by hour
@@ -54,15 +174,17 @@ class CognitivePatternAnalyzer:
         
         return hourly_metrics
 
+    @timed('patterns.analyze_activity_patterns')
     def analyze_activity_patterns(self, df):
         """Analyze performance patterns by activity type"""
-        activity_metrics = df.groupby(['activity_type', 'hour']).agg({
+        activity_metrics = df.groupby(['activity_type', 'hour'], observed=True).agg({
             'focus_score': 'mean',
             'mental_clarity': 'mean'
         }).reset_index()
         
         return activity_metrics
 
+    @timed('patterns.analyze_eeg_patterns')
     def analyze_eeg_patterns(self, eeg_file):
         """Analyze EEG frequency bands to assess cognitive state"""
         try:
@@ -89,23 +211,29 @@ class CognitivePatternAnalyzer:
         except:
             return None
 
+    @timed('patterns.generate_insights')
     def generate_insights(self, user_id=None):
-        """Generate comprehensive insights about optimal work patterns"""
-        df = self.load_data(user_id)
-        
+        """
+        Generate comprehensive insights about optimal work patterns
+
+        Reads the hourly rollups and only the few best sessions rather
+        than every session.
+        """
         # Analyze optimal times
-        hourly_metrics = self.analyze_optimal_times(df)
+        hourly_metrics = self.load_hourly_metrics(user_id)
         peak_hours = hourly_metrics.nlargest(3, 'performance_score')
         
         # Analyze activity patterns
-        activity_patterns = self.analyze_activity_patterns(df)
+        activity_patterns = self.load_activity_patterns(user_id)
         
         # Generate insights
         insights = {
             'peak_performance_hours': peak_hours['hour'].tolist(),
-            'optimal_deep_work_time': self._get_optimal_activity_time(df, 'deep_work'),
-            'optimal_creative_time': self._get_optimal_activity_time(df, 'creative'),
-            'best_conditions': self._analyze_best_conditions(df)
+            'optimal_deep_work_time': self._get_optimal_activity_time(
+                self.load_best_sessions(user_id, 'deep_work', 3), 'deep_work'),
+            'optimal_creative_time': self._get_optimal_activity_time(
+                self.load_best_sessions(user_id, 'creative', 3), 'creative'),
+            'best_conditions': self._analyze_best_conditions(self.load_best_sessions(user_id, limit=10))
         }
         
         return insights, hourly_metrics, activity_patterns
@@ -134,49 +262,226 @@ class CognitivePatternAnalyzer:
         
         return best_sessions.to_dict()
 
-if __name__ == "__main__":
-    analyzer = CognitivePatternAnalyzer()
+    @timed('patterns.generate_batch_insights')
+    def generate_batch_insights(self, df):
+        """
+        Generate insights for every user in df at once
+
+        Produces the same results as calling generate_insights per user, but
+        each metric is one groupby over all users instead of one query and
+        one set of aggregations per user.
+
+        Args:
+            df (pd.DataFrame): Sessions with context of any number of users, as from load_data
+
+        Returns:
+            dict: user_id -> (insights, hourly_metrics, activity_patterns)
+        """
+        # Hourly performance; nlargest keeps the first of tied rows, which a
+        # stable descending sort followed by head reproduces
+        hourly = df.groupby(['user_id', 'hour']).agg({
+            'focus_score': 'mean',
+            'mental_clarity': 'mean',
+            'mood_score': 'mean'
+        }).reset_index()
+        hourly['performance_score'] = (
+            hourly['focus_score'] * 0.4 +
+            hourly['mental_clarity'] * 0.4 +
+            hourly['mood_score'] * 0.2
+        )
+        peak_hours = _top_per_user(hourly, ['performance_score'], 3)
+
+        activity = df.groupby(['user_id', 'activity_type', 'hour'], observed=True).agg({
+            'focus_score': 'mean',
+            'mental_clarity': 'mean'
+        }).reset_index()
+
+        # Best sessions per activity
+        scored = df.assign(performance=(df['focus_score'] + df['mental_clarity']) / 2)
+        optimal = {}
+        for name in ('deep_work', 'creative'):
+            best = _top_per_user(scored[scored['activity_type'] == name], ['performance'], 3)
+            optimal[name] = best.groupby('user_id').agg(
+                hours=('hour', list), avg_focus=('focus_score', 'mean'), avg_clarity=('mental_clarity', 'mean')
+            )
+
+        # Conditions of the ten best sessions
+        best = _top_per_user(df, ['focus_score', 'mental_clarity'], 10)
+        conditions = best.groupby('user_id')[['sleep_hours', 'hours_since_meal']].mean()
+        for column in ('exercise_type', 'last_meal_type'):
+            conditions[column] = _mode_per_user(best, column)
+
+        results = {}
+        hourly_groups = dict(tuple(hourly.groupby('user_id')))
+        activity_groups = dict(tuple(activity.groupby('user_id')))
+        peak_groups = peak_hours.groupby('user_id')['hour'].agg(list)
+        for user_id in df['user_id'].unique():
+            insights = {
+                'peak_performance_hours': peak_groups.get(user_id, []),
+                'optimal_deep_work_time': _activity_time(optimal['deep_work'], user_id),
+                'optimal_creative_time': _activity_time(optimal['creative'], user_id),
+                'best_conditions': conditions.loc[user_id].to_dict()
+            }
+            results[int(user_id)] = (
+                insights,
+                hourly_groups[user_id].drop(columns='user_id').reset_index(drop=True),
+                activity_groups.get(user_id, activity.iloc[:0]).drop(columns='user_id').reset_index(drop=True)
+            )
+
+        return results
+
+
+def _top_per_user(df, columns, n):
+    """The n rows with the largest values of columns per user, ties in original order"""
+    ordered = df.sort_values(columns, ascending=False, kind='stable', na_position='last')
+    ordered = ordered.dropna(subset=columns[:1])
+    return ordered.groupby('user_id', sort=False).head(n)
+
+
+def _mode_per_user(df, column):
+    """Most frequent value of column per user, the smallest one among ties like Series.mode"""
+    counts = df.groupby(['user_id', column], observed=True).size().rename('count').reset_index()
+    counts = counts.sort_values(['user_id', 'count', column], ascending=[True, False, True])
+    return counts.drop_duplicates('user_id').set_index('user_id')[column]
+
+
+def _activity_time(optimal, user_id):
+    if user_id not in optimal.index:
+        return None
+    row = optimal.loc[user_id]
+    return {'hours': list(row['hours']), 'avg_focus': row['avg_focus'], 'avg_clarity': row['avg_clarity']}
+
+
+def build_report_figure(user_name, hourly_metrics, activity_patterns):
+    """Plot a user's daily and activity-specific performance patterns"""
+    fig = make_subplots(
+        rows=2, cols=1,
+        subplot_titles=("Daily Performance Pattern", "Activity-Specific Performance")
+    )
     
-    # Generate insights for all users
-    conn = sqlite3.connect('data/neurotrack.db')
-    users = pd.read_sql_query('SELECT id, name FROM users', conn)
-    conn.close()
+    # Daily pattern plot
+    fig.add_trace(
+        go.Scatter(x=hourly_metrics['hour'], 
+                  y=hourly_metrics['performance_score'],
+                  name="Overall Performance"),
+        row=1, col=1
+    )
     
-    for _, user in users.iterrows():
-        insights, hourly_metrics, activity_patterns = analyzer.generate_insights(user['id'])
-        
-        # Save insights to JSON
-        with open(f'data/analysis/insights_user_{user["id"]}.json', 'w') as f:
-            json.dump(insights, f, indent=4)
-        
-        # Generate visualizations
-        fig = make_subplots(
-            rows=2, cols=1,
-            subplot_titles=("Daily Performance Pattern", "Activity-Specific Performance")
-        )
-        
-        # Daily pattern plot
+    # Activity pattern plot
+    for activity in activity_patterns['activity_type'].unique():
+        activity_data = activity_patterns[activity_patterns['activity_type'] == activity]
         fig.add_trace(
-            go.Scatter(x=hourly_metrics['hour'], 
-                      y=hourly_metrics['performance_score'],
-                      name="Overall Performance"),
-            row=1, col=1
+            go.Scatter(x=activity_data['hour'],
+                      y=activity_data['focus_score'],
+                      name=f"{activity} Focus"),
+            row=2, col=1
         )
-        
-        # Activity pattern plot
-        for activity in activity_patterns['activity_type'].unique():
-            activity_data = activity_patterns[activity_patterns['activity_type'] == activity]
-            fig.add_trace(
-                go.Scatter(x=activity_data['hour'],
-                          y=activity_data['focus_score'],
-                          name=f"{activity} Focus"),
-                row=2, col=1
-            )
-        
-        fig.update_layout(
-            height=800,
-            title_text=f"Cognitive Performance Analysis - {user['name']}"
-        )
-        fig.write_html(f'data/analysis/performance_patterns_user_{user["id"]}.html')
-        
-    print("Analysis complete! Check data/analysis/ directory for results.")
+    
+    fig.update_layout(
+        height=800,
+        title_text=f"Cognitive Performance Analysis - {user_name}"
+    )
+    return fig
+
+
+def write_report(task):
+    """Write one user's insights JSON and performance HTML; runs in a worker process"""
+    user_id, user_name, insights, hourly_metrics, activity_patterns, output_dir = task
+    output_dir = Path(output_dir)
+    
+    # Save insights to JSON
+    with open(output_dir / f'insights_user_{user_id}.json', 'w') as f:
+        json.dump(insights, f, indent=4, default=_json_default)
+    
+    # Reports share one plotly.min.js written next to them instead of embedding it in every file
+    fig = build_report_figure(user_name, hourly_metrics, activity_patterns)
+    fig.write_html(output_dir / f'performance_patterns_user_{user_id}.html', include_plotlyjs='directory')
+    return user_id
+
+
+def _json_default(value):
+    """Serialize numpy scalars left in insights"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def user_fingerprints(df):
+    """Hash each user's loaded rows, so unchanged users can be skipped"""
+    row_hashes = pd.util.hash_pandas_object(df, index=False)
+    return {
+        int(user_id): f'{count}:{total}'
+        for user_id, (count, total) in row_hashes.groupby(df['user_id']).agg(['count', 'sum']).iterrows()
+    }
+
+
+def run_batch(db_path=None, output_dir='data/analysis', user_ids=None, jobs=None, force=False):
+    """
+    Generate insights and reports for many users in one pass
+
+    All users' sessions are loaded with one query and analyzed with
+    generate_batch_insights. Reports are rendered in a process pool. Users
+    whose rows have not changed since the last run, according to the state
+    file in output_dir, are skipped unless force is set.
+
+    Args:
+        db_path (str): Path to the SQLite database
+        output_dir (str): Directory for insights, reports and the state file
+        user_ids (list): Only analyze these users; all users if None
+        jobs (int): Number of worker processes; the CPU count if None
+        force (bool): Regenerate reports of unchanged users too
+
+    Returns:
+        tuple: (IDs of users whose reports were written, IDs of users skipped)
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    state_path = output_dir / 'insights_state.json'
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+
+    analyzer = CognitivePatternAnalyzer(db_path)
+    df = analyzer.load_data(user_ids=user_ids)
+    fingerprints = user_fingerprints(df)
+
+    changed = [
+        user_id for user_id, fingerprint in fingerprints.items()
+        if force or state.get(str(user_id)) != fingerprint
+        or not (output_dir / f'performance_patterns_user_{user_id}.html').exists()
+    ]
+    skipped = sorted(set(fingerprints) - set(changed))
+    if not changed:
+        return [], skipped
+
+    df = df[df['user_id'].isin(changed)]
+    names = df.groupby('user_id')['user_name'].first()
+    results = analyzer.generate_batch_insights(df)
+    tasks = [
+        (user_id, names[user_id], *results[user_id], str(output_dir))
+        for user_id in changed
+    ]
+
+    written = []
+    if jobs == 1:
+        written = [write_report(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            chunksize = max(1, len(tasks) // ((jobs or os.cpu_count() or 1) * 4))
+            written = list(pool.map(write_report, tasks, chunksize=chunksize))
+
+    state.update({str(user_id): fingerprints[user_id] for user_id in written})
+    state_path.write_text(json.dumps(state, indent=2))
+    return written, skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate cognitive pattern insights and reports per user")
+    parser.add_argument('--users', type=int, nargs='+', help="Only analyze these user IDs")
+    parser.add_argument('--jobs', type=int, help="Worker processes for rendering reports (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="Regenerate reports of users whose data has not changed")
+    parser.add_argument('--output-dir', default='data/analysis', help="Directory for insights and reports")
+    parser.add_argument('--db', help="Path to the SQLite database (default: $NEUROTRACK_DB_PATH or data/neurotrack.db)")
+    args = parser.parse_args()
+
+    written, skipped = run_batch(args.db, args.output_dir, args.users, args.jobs, args.force)
+    print(f"Wrote reports for {len(written)} users, skipped {len(skipped)} unchanged")
+    print(f"Analysis complete! Check {args.output_dir} directory for results.")
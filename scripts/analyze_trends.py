@@ -1,18 +1,24 @@
-import sqlite3
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
+import sys
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.data.connection import get_connection
+from scripts.data.schema import read_frame
+from scripts.data.timestamps import from_epoch_us
 
 class NeuroAnalyzer:
-    def __init__(self):
-        self.db_path = 'data/neurotrack.db'
+    def __init__(self, db_path=None):
+        self.db_path = db_path
         self.output_dir = Path('data/analysis')
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
     def load_sessions_data(self):
         """Load all sessions with their context data"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_connection(self.db_path)
         
         query = '''
         SELECT 
@@ -29,9 +35,7 @@ class NeuroAnalyzer:
         JOIN lifestyle_context lc ON s.id = lc.session_id
         '''
         
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        return read_frame(query, conn)
 
     def analyze_sleep_impact(self, df):
         """Analyze the relationship between sleep and mood/performance"""
@@ -59,7 +63,7 @@ class NeuroAnalyzer:
         df = self.load_sessions_data()
         
         # Convert timestamp to datetime
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df['timestamp'] = from_epoch_us(df['timestamp'])
         
         # Generate visualizations
         self.analyze_sleep_impact(df)
@@ -70,7 +74,7 @@ class NeuroAnalyzer:
             'total_sessions': len(df),
             'avg_sleep_hours': df['sleep_hours'].mean(),
             'avg_mood_score': df['mood_score'].mean(),
-            'best_meal_type': df.groupby('last_meal_type')['mood_score'].mean().idxmax()
+            'best_meal_type': df.groupby('last_meal_type', observed=True)['mood_score'].mean().idxmax()
         }
         
         # Save summary to file
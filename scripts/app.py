@@ -1,27 +1,101 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
+import time
 from pathlib import Path
 import sys
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 
 # Add the project root to Python path
 sys.path.append(str(Path(__file__).parent.parent))
 
 # Import our modules
-from scripts.analysis.eeg import analyze_eeg_data
+from scripts.analysis.features import get_session_features
+from scripts.data import dashboard, instrumentation
+from scripts.data.instrumentation import span
+from scripts.data.migrations import run_migrations
+from scripts.data.rollups import activity_hourly_stats, hourly_stats
 from scripts.log_session import SessionLogger
 
+# Start of this rerun, reported as page.rerun next to the stages it is made of
+rerun_started = time.perf_counter()
+
 # Initialize session state
 if 'current_user' not in st.session_state:
     st.session_state.current_user = None  # Initialize as None instead of defaulting to 1
+if 'analyzed_sessions' not in st.session_state:
+    st.session_state.analyzed_sessions = set()  # Sessions whose EEG the user asked to analyze
+if 'viewed_sessions' not in st.session_state:
+    st.session_state.viewed_sessions = set()  # Sessions whose raw EEG the user asked to see
+
+# Bring older databases up to the current schema once per server process
+@st.cache_resource
+def migrate_schema():
+    return run_migrations()
+
+# Every loader reads through the thread-local connection of data.connection.
+# Streamlit runs each rerun on its own thread, so reruns of different browser
+# sessions never share a connection or a transaction, and WAL lets them read
+# in parallel while SessionLogger writes.
+
+def get_data_version(name='data'):
+    """Write counter of users and sessions, or of 'features' or 'eeg', used to key cached frames"""
+    return dashboard.get_data_version(name=name)
+
+# Cached loaders. Each is keyed by its arguments, including the version of the
+# data it reads, so frames are only re-read when the user, date range or that
+# data changes. Analyzing a session's EEG only bumps the features version, so
+# it does not drop the session and analysis frames.
+@st.cache_data
+def load_users(data_version):
+    return dashboard.load_users()
+
+@st.cache_data
+def load_session_date_range(user_id, data_version):
+    """Return the first and last session time of a user, or None if they have no sessions"""
+    return dashboard.load_session_date_range(user_id)
+
+@st.cache_data
+def load_recent_sessions(user_id, date_range, data_version):
+    return dashboard.load_recent_sessions(user_id, date_range)
+
+@st.cache_data
+def load_analysis_data(user_id, date_range, data_version):
+    return dashboard.load_analysis_data(user_id, date_range)
+
+@st.cache_data
+def load_recommendation_data(user_id, date_range, data_version):
+    return dashboard.load_recommendation_data(user_id, date_range)
+
+@st.cache_data
+def load_hour_rollups(user_id, data_version):
+    """Mean scores per hour and per activity and hour over a user's whole history"""
+    return hourly_stats(user_id), activity_hourly_stats(user_id)
+
+@st.cache_data
+def load_cached_eeg_metrics(session_ids, features_version):
+    return get_session_features(list(session_ids), compute=False)
+
+@st.cache_data
+def analyze_session_eeg(session_id, features_version):
+    # Reads through session_features, so each session is analyzed at most once
+    features = get_session_features([session_id])
+    return features.loc[session_id] if session_id in features.index else None
 
-# Initialize database connection
-def get_db_connection():
-    return sqlite3.connect('data/neurotrack.db', timeout=20)  # Add timeout to handle locks
+@st.cache_data
+def load_eeg_envelope(session_id, offsets, eeg_version):
+    # At most a thousand min/max pairs per channel, whatever the zoom level
+    return dashboard.load_eeg_envelope(session_id, offsets)
+
+def invalidate_data_cache():
+    """Drop cached frames right after the dashboard writes new data"""
+    for loader in (load_users, load_session_date_range, load_recent_sessions,
+                   load_analysis_data, load_recommendation_data, load_hour_rollups, load_cached_eeg_metrics,
+                   analyze_session_eeg, load_eeg_envelope):
+        loader.clear()
 
 # Set page config
 st.set_page_config(
@@ -35,8 +109,11 @@ st.sidebar.title("🧠 NeuroTrack")
 st.sidebar.markdown("---")
 
 # User filter
-with get_db_connection() as conn:
-    users_df = pd.read_sql_query("SELECT id, name FROM users", conn)
+migrate_schema()
+data_version = get_data_version()
+features_version = get_data_version('features')
+eeg_version = get_data_version('eeg')
+users_df = load_users(data_version)
 
 # Get the current user's name from the session state
 current_user_name = None
@@ -71,58 +148,32 @@ if user_id is None:
     st.stop()
 
 # Date range filter
-with get_db_connection() as conn:
-    # First get unique timestamps
-    try:
-        sessions_df = pd.read_sql_query(
-            """
-            SELECT DISTINCT timestamp 
-            FROM sessions 
-            WHERE user_id = ? 
-            ORDER BY timestamp
-            """,
-            conn,
-            params=(user_id,)
+session_range = None
+try:
+    session_range = load_session_date_range(user_id, data_version)
+    
+    if session_range:
+        min_date = session_range[0].date()
+        max_date = session_range[1].date()
+        date_range = st.sidebar.date_input(
+            "Select Date Range",
+            value=(min_date, max_date),
+            min_value=min_date,
+            max_value=max_date
         )
-        
-        if not sessions_df.empty:
-            try:
-                # Convert timestamp to datetime safely
-                timestamps = []
-                for ts in sessions_df['timestamp']:
-                    try:
-                        # Try parsing as string with microseconds first
-                        timestamps.append(pd.to_datetime(ts, format='%Y-%m-%d %H:%M:%S.%f'))
-                    except:
-                        try:
-                            # If that fails, try parsing as Unix timestamp
-                            timestamps.append(pd.to_datetime(ts, unit='s'))
-                        except:
-                            # If both fail, try default parsing
-                            timestamps.append(pd.to_datetime(ts))
-                
-                if timestamps:
-                    sessions_df['timestamp'] = timestamps
-                    min_date = min(timestamps).date()
-                    max_date = max(timestamps).date()
-                    date_range = st.sidebar.date_input(
-                        "Select Date Range",
-                        value=(min_date, max_date),
-                        min_value=min_date,
-                        max_value=max_date
-                    )
-                else:
-                    date_range = (datetime.now().date(), datetime.now().date())
-                    st.sidebar.warning("No valid timestamps found for this user")
-            except Exception as e:
-                st.error(f"Error processing dates: {str(e)}")
-                date_range = (datetime.now().date(), datetime.now().date())
-        else:
-            date_range = (datetime.now().date(), datetime.now().date())
-            st.sidebar.warning("No sessions found for this user")
-    except Exception as e:
-        st.error(f"Error querying sessions: {str(e)}")
+    else:
         date_range = (datetime.now().date(), datetime.now().date())
+        st.sidebar.warning("No sessions found for this user")
+except Exception as e:
+    st.error(f"Error querying sessions: {str(e)}")
+    date_range = (datetime.now().date(), datetime.now().date())
+
+# The date picker returns a single date while a range is being selected
+date_range = tuple(date_range) if len(date_range) == 2 else (date_range[0], date_range[0])
+full_history = (
+    session_range is not None
+    and date_range[0] <= session_range[0].date() and date_range[1] >= session_range[1].date()
+)
 
 # Main content
 st.title(f"Dashboard - {selected_user_tuple[0]}")
@@ -133,7 +184,8 @@ tabs = st.tabs([
     "📝 Journal Entry",
     "🍽️ Diet Log",
     "📈 Analysis",
-    "💡 Recommendations"
+    "💡 Recommendations",
+    "🩺 Diagnostics"
 ])
 
 # Performance Overview Tab
@@ -141,49 +193,16 @@ with tabs[0]:
     st.header("📊 Performance Overview")
     
     # Load recent sessions
-    with get_db_connection() as conn:
-        try:
-            sessions_df = pd.read_sql_query("""
-                SELECT DISTINCT 
-                    s.id, 
-                    s.timestamp, 
-                    s.user_id,
-                    lc.sleep_quality,
-                    lc.mood_score,
-                    lc.focus_score,
-                    lc.mental_clarity,
-                    je.energy_level,
-                    je.productivity_score
-                FROM sessions s
-                LEFT JOIN lifestyle_context lc ON s.id = lc.session_id
-                LEFT JOIN journal_entries je ON s.id = je.session_id
-                WHERE s.user_id = ?
-                ORDER BY s.timestamp DESC
-                LIMIT 10
-            """, conn, params=(user_id,))
-            
-            # Convert timestamp to datetime safely
-            if not sessions_df.empty:
-                timestamps = []
-                for ts in sessions_df['timestamp']:
-                    try:
-                        # Try parsing as string with microseconds first
-                        timestamps.append(pd.to_datetime(ts, format='%Y-%m-%d %H:%M:%S.%f'))
-                    except:
-                        try:
-                            # If that fails, try parsing as Unix timestamp
-                            timestamps.append(pd.to_datetime(ts, unit='s'))
-                        except:
-                            # If both fail, try default parsing
-                            timestamps.append(pd.to_datetime(ts))
-                
-                if timestamps:
-                    sessions_df['timestamp'] = timestamps
-        except Exception as e:
-            st.error(f"Error loading sessions: {str(e)}")
-            sessions_df = pd.DataFrame()
+    try:
+        sessions_df = load_recent_sessions(user_id, date_range, data_version)
+    except Exception as e:
+        st.error(f"Error loading sessions: {str(e)}")
+        sessions_df = pd.DataFrame()
     
     if not sessions_df.empty:
+        # EEG metrics already in the feature cache; nothing is analyzed on page load
+        eeg_metrics = load_cached_eeg_metrics(tuple(sessions_df['id'].unique()), features_version)
+        
         # Display recent sessions
         st.subheader("Recent Sessions")
         for _, session in sessions_df.iterrows():
@@ -208,14 +227,53 @@ with tabs[0]:
                     if pd.notna(session['productivity_score']):
                         st.metric("Productivity", f"{session['productivity_score']}/5")
                 
-                # Show EEG analysis if available
-                eeg_analysis = analyze_eeg_data(session['id'])
-                if eeg_analysis:
+                # Show EEG analysis if available, analyzing only on request
+                metrics = None
+                if session['id'] in eeg_metrics.index:
+                    metrics = eeg_metrics.loc[session['id']]
+                elif session['has_eeg']:
+                    if st.button("Analyze EEG", key=f"analyze_eeg_{session['id']}"):
+                        st.session_state.analyzed_sessions.add(session['id'])
+                    if session['id'] in st.session_state.analyzed_sessions:
+                        metrics = analyze_session_eeg(session['id'], features_version)
+                
+                if metrics is not None:
                     st.subheader("EEG Analysis")
-                    metrics = eeg_analysis['cognitive_metrics']
                     st.write(f"Focus Score: {metrics['focus_score']}/5")
                     st.write(f"Relaxation Score: {metrics['relaxation_score']}/5")
                     st.write(f"Mental Clarity: {metrics['clarity_score']}/5")
+                
+                # Raw signal, drawn from the min/max pyramid of the selected time range
+                if session['has_eeg']:
+                    if st.button("Show raw EEG", key=f"raw_eeg_{session['id']}"):
+                        st.session_state.viewed_sessions.add(session['id'])
+                    overview = None
+                    if session['id'] in st.session_state.viewed_sessions:
+                        overview = load_eeg_envelope(session['id'], None, eeg_version)
+                    if overview is not None:
+                        duration = float(overview[1]['duration'])
+                        offsets = st.slider("Time range (seconds)", 0.0, duration, (0.0, duration),
+                                            key=f"raw_eeg_range_{session['id']}")
+                        envelope, info = (overview if offsets == (0.0, duration)
+                                          else load_eeg_envelope(session['id'], offsets, eeg_version))
+                        
+                        with span('plot.raw_eeg'):
+                            fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.05,
+                                                subplot_titles=("Channel 1", "Channel 2"))
+                            for row, channel in enumerate(('channel1', 'channel2'), start=1):
+                                fig.add_trace(go.Scatter(x=envelope['seconds'], y=envelope[f'{channel}_max'],
+                                                         mode='lines', line=dict(width=1), showlegend=False),
+                                              row=row, col=1)
+                                if info['factor'] > 1:
+                                    fig.add_trace(go.Scatter(x=envelope['seconds'], y=envelope[f'{channel}_min'],
+                                                             mode='lines', line=dict(width=1), fill='tonexty',
+                                                             showlegend=False),
+                                                  row=row, col=1)
+                            fig.update_xaxes(title_text="Seconds", row=2, col=1)
+                            fig.update_layout(height=400, margin=dict(t=40, b=40))
+                            st.plotly_chart(fig, use_container_width=True)
+                        st.caption(f"{len(envelope)} points per channel"
+                                   + (f", min/max of every {info['factor']} samples" if info['factor'] > 1 else ""))
 
 # Journal Entry Tab
 with tabs[1]:
@@ -255,6 +313,7 @@ with tabs[1]:
                 user_id=user_id,
                 journal_entry=journal_entry
             ):
+                invalidate_data_cache()
                 st.success("Journal entry saved successfully!")
             else:
                 st.error("Error saving journal entry")
@@ -314,6 +373,7 @@ with tabs[2]:
                 user_id=user_id,
                 diet_log=diet_log
             ):
+                invalidate_data_cache()
                 st.success("Diet log saved successfully!")
             else:
                 st.error("Error saving diet log")
@@ -323,15 +383,7 @@ with tabs[3]:
     st.header("📈 Analysis")
     
     # Load all data for analysis
-    with get_db_connection() as conn:
-        analysis_df = pd.read_sql_query("""
-            SELECT s.*, lc.*, je.*, dl.*
-            FROM sessions s
-            LEFT JOIN lifestyle_context lc ON s.id = lc.session_id
-            LEFT JOIN journal_entries je ON s.id = je.session_id
-            LEFT JOIN diet_log dl ON s.id = dl.session_id
-            WHERE s.user_id = ?
-        """, conn, params=(user_id,))
+    analysis_df = load_analysis_data(user_id, date_range, data_version)
     
     if not analysis_df.empty:
         # Correlation Analysis
@@ -351,11 +403,13 @@ with tabs[3]:
             
             # Display correlation matrix
             st.write("Correlation Matrix")
-            st.dataframe(corr_matrix.style.background_gradient(cmap='RdYlBu'))
+            with span('plot.correlation_matrix'):
+                st.dataframe(corr_matrix.style.background_gradient(cmap='RdYlBu'))
             
             # Display correlation heatmap
             st.write("Correlation Heatmap")
-            st.line_chart(corr_matrix)
+            with span('plot.correlation_chart'):
+                st.line_chart(corr_matrix)
         
         # Diet Analysis
         st.subheader("Diet Analysis")
@@ -363,13 +417,15 @@ with tabs[3]:
         if 'calories' in analysis_df.columns:
             # Daily calorie intake
             st.write("Daily Calorie Intake")
-            st.line_chart(analysis_df.set_index('timestamp')['calories'])
+            with span('plot.calories'):
+                st.line_chart(analysis_df.set_index('session_time')['calories'])
             
             # Macronutrient distribution
             if all(col in analysis_df.columns for col in ['protein', 'carbs', 'fats']):
                 st.write("Macronutrient Distribution")
                 macronutrients = analysis_df[['protein', 'carbs', 'fats']].mean()
-                st.bar_chart(macronutrients)
+                with span('plot.macronutrients'):
+                    st.bar_chart(macronutrients)
         
         # Journal Analysis
         st.subheader("Journal Analysis")
@@ -378,155 +434,124 @@ with tabs[3]:
             # Mood distribution
             st.write("Mood Distribution")
             mood_counts = analysis_df['mood'].value_counts()
-            st.bar_chart(mood_counts)
+            with span('plot.mood'):
+                st.bar_chart(mood_counts)
             
             # Energy and Stress Levels
             if all(col in analysis_df.columns for col in ['energy_level', 'stress_level']):
                 st.write("Energy vs Stress Levels")
                 energy_stress = analysis_df[['energy_level', 'stress_level']].mean()
-                st.bar_chart(energy_stress)
+                with span('plot.energy_stress'):
+                    st.bar_chart(energy_stress)
 
 # Recommendations Tab
 with tabs[4]:
     st.header("💡 Personalized Recommendations")
     
     # Load all data for analysis
-    with get_db_connection() as conn:
-        try:
-            analysis_df = pd.read_sql_query("""
-                SELECT 
-                    s.timestamp,
-                    lc.sleep_hours,
-                    lc.sleep_quality,
-                    lc.last_meal_type,
-                    lc.hours_since_meal,
-                    lc.meal_size,
-                    lc.meal_quality,
-                    lc.hydration_level,
-                    lc.caffeine_intake,
-                    lc.exercise_type,
-                    lc.exercise_duration_mins,
-                    lc.mood_score,
-                    lc.focus_score,
-                    lc.mental_clarity,
-                    lc.activity_type,
-                    lc.time_of_day,
-                    je.energy_level,
-                    je.productivity_score,
-                    dl.meal_type as diet_meal_type,
-                    dl.calories,
-                    dl.protein,
-                    dl.carbs,
-                    dl.fats
-                FROM sessions s
-                LEFT JOIN lifestyle_context lc ON s.id = lc.session_id
-                LEFT JOIN journal_entries je ON s.id = je.session_id
-                LEFT JOIN diet_log dl ON s.id = dl.session_id
-                WHERE s.user_id = ?
-            """, conn, params=(user_id,))
+    try:
+        analysis_df = load_recommendation_data(user_id, date_range, data_version)
+        
+        if not analysis_df.empty:
+            # Quick Wins Section
+            st.subheader("🎯 Quick Wins")
+            col1, col2, col3 = st.columns(3)
             
-            if not analysis_df.empty:
-                # Quick Wins Section
-                st.subheader("🎯 Quick Wins")
-                col1, col2, col3 = st.columns(3)
-                
-                # Calculate average metrics
-                avg_focus = analysis_df['focus_score'].mean()
-                avg_clarity = analysis_df['mental_clarity'].mean()
-                avg_mood = analysis_df['mood_score'].mean()
-                
-                # Focus Quick Win
-                with col1:
-                    st.metric(
-                        "Focus Score",
-                        f"{avg_focus:.1f}/5",
-                        delta=f"{avg_focus - 3:.1f}",
-                        delta_color="normal"
-                    )
-                    if avg_focus < 3.5:
-                        st.info("Try 25-minute focused work sessions with 5-minute breaks")
-                
-                # Mental Clarity Quick Win
-                with col2:
-                    st.metric(
-                        "Mental Clarity",
-                        f"{avg_clarity:.1f}/5",
-                        delta=f"{avg_clarity - 3:.1f}",
-                        delta_color="normal"
-                    )
-                    if avg_clarity < 3.5:
-                        st.info("Consider reducing caffeine intake after 2 PM")
-                
-                # Mood Quick Win
-                with col3:
-                    st.metric(
-                        "Mood Score",
-                        f"{avg_mood:.1f}/5",
-                        delta=f"{avg_mood - 3:.1f}",
-                        delta_color="normal"
-                    )
-                    if avg_mood < 3.5:
-                        st.info("Try 10-minute meditation before starting work")
-                
-                # Optimal Times Section
-                st.subheader("⏰ Optimal Times")
-                
-                # Convert time_of_day to hour
+            # Calculate average metrics
+            avg_focus = analysis_df['focus_score'].mean()
+            avg_clarity = analysis_df['mental_clarity'].mean()
+            avg_mood = analysis_df['mood_score'].mean()
+            
+            # Focus Quick Win
+            with col1:
+                st.metric(
+                    "Focus Score",
+                    f"{avg_focus:.1f}/5",
+                    delta=f"{avg_focus - 3:.1f}",
+                    delta_color="normal"
+                )
+                if avg_focus < 3.5:
+                    st.info("Try 25-minute focused work sessions with 5-minute breaks")
+            
+            # Mental Clarity Quick Win
+            with col2:
+                st.metric(
+                    "Mental Clarity",
+                    f"{avg_clarity:.1f}/5",
+                    delta=f"{avg_clarity - 3:.1f}",
+                    delta_color="normal"
+                )
+                if avg_clarity < 3.5:
+                    st.info("Consider reducing caffeine intake after 2 PM")
+            
+            # Mood Quick Win
+            with col3:
+                st.metric(
+                    "Mood Score",
+                    f"{avg_mood:.1f}/5",
+                    delta=f"{avg_mood - 3:.1f}",
+                    delta_color="normal"
+                )
+                if avg_mood < 3.5:
+                    st.info("Try 10-minute meditation before starting work")
+            
+            # Optimal Times Section
+            st.subheader("⏰ Optimal Times")
+            
+            # Mean scores per hour and per activity and hour. Over the whole
+            # history they come from the rollups; a narrower date range is
+            # aggregated from the loaded sessions.
+            scores = ['focus_score', 'mental_clarity', 'productivity_score']
+            if full_history:
+                hourly, activity_hourly = load_hour_rollups(user_id, data_version)
+            else:
                 analysis_df['hour'] = pd.to_datetime(analysis_df['time_of_day'], format='%H:%M', errors='coerce').dt.hour
-                
-                # Calculate best times for different activities
-                activity_times = {}
-                for activity in ['deep_work', 'creative', 'learning', 'rest']:
-                    activity_data = analysis_df[analysis_df['activity_type'] == activity]
-                    if not activity_data.empty:
-                        best_hour = activity_data.groupby('hour').agg({
-                            'focus_score': 'mean',
-                            'mental_clarity': 'mean',
-                            'productivity_score': 'mean'
-                        }).mean(axis=1).idxmax()
-                        
-                        activity_times[activity] = {
-                            'hour': best_hour,
-                            'score': activity_data.groupby('hour').agg({
-                                'focus_score': 'mean',
-                                'mental_clarity': 'mean',
-                                'productivity_score': 'mean'
-                            }).mean(axis=1).max()
-                        }
-                
-                # Display optimal times in a more user-friendly format
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.write("**Best Times for Different Activities**")
-                    for activity, data in activity_times.items():
-                        try:
-                            hour = int(data['hour'])  # Ensure hour is an integer
-                            score = float(data['score'])  # Ensure score is a float
-                            confidence = "High" if score > 4 else "Medium" if score > 3 else "Low"
-                            
-                            st.write(f"**{activity.replace('_', ' ').title()}**")
-                            st.write(f"🕒 {hour:02d}:00 - {(hour+2)%24:02d}:00")  # Handle hour wrapping
-                            st.write(f"Confidence: {confidence}")
-                            st.progress(min(score/5, 1.0))  # Ensure progress bar doesn't exceed 1.0
-                            st.write("---")
-                        except (ValueError, TypeError) as e:
-                            st.warning(f"Could not process optimal time for {activity}: {str(e)}")
-                            continue
-                
-                with col2:
+                hourly = analysis_df.groupby('hour')[scores].mean().reset_index()
+                activity_hourly = (
+                    analysis_df.groupby(['activity_type', 'hour'], observed=True)[scores].mean().reset_index()
+                )
+            
+            # Calculate best times for different activities
+            activity_times = {}
+            for activity in ['deep_work', 'creative', 'learning', 'rest']:
+                activity_data = activity_hourly[activity_hourly['activity_type'] == activity]
+                if not activity_data.empty:
+                    activity_scores = activity_data.set_index('hour')[scores].mean(axis=1)
+                    activity_times[activity] = {
+                        'hour': activity_scores.idxmax(),
+                        'score': activity_scores.max()
+                    }
+            
+            # Display optimal times in a more user-friendly format
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.write("**Best Times for Different Activities**")
+                for activity, data in activity_times.items():
                     try:
-                        # Create a heatmap of performance by hour
-                        hourly_performance = analysis_df.groupby('hour').agg({
-                            'focus_score': 'mean',
-                            'mental_clarity': 'mean',
-                            'productivity_score': 'mean'
-                        }).mean(axis=1)
-                        
-                        # Ensure all hours are present (0-23)
-                        all_hours = pd.Series(index=range(24), dtype=float)
-                        hourly_performance = hourly_performance.reindex(all_hours.index, fill_value=0)
+                        hour = int(data['hour'])  # Ensure hour is an integer
+                        score = float(data['score'])  # Ensure score is a float
+                        confidence = "High" if score > 4 else "Medium" if score > 3 else "Low"
                         
+                        st.write(f"**{activity.replace('_', ' ').title()}**")
+                        st.write(f"🕒 {hour:02d}:00 - {(hour+2)%24:02d}:00")  # Handle hour wrapping
+                        st.write(f"Confidence: {confidence}")
+                        st.progress(min(score/5, 1.0))  # Ensure progress bar doesn't exceed 1.0
+                        st.write("---")
+                    except (ValueError, TypeError) as e:
+                        st.warning(f"Could not process optimal time for {activity}: {str(e)}")
+                        continue
+            
+            with col2:
+                try:
+                    # Create a heatmap of performance by hour
+                    hourly_performance = hourly.set_index('hour')[scores].mean(axis=1)
+                    
+                    # Ensure all hours are present (0-23)
+                    all_hours = pd.Series(index=range(24), dtype=float)
+                    hourly_performance = hourly_performance.reindex(all_hours.index, fill_value=0)
+                    
+                    with span('plot.performance_heatmap'):
                         # Create a color-coded heatmap
                         fig = go.Figure(data=go.Heatmap(
                             z=[hourly_performance.values],
@@ -535,81 +560,119 @@ with tabs[4]:
                             colorscale='RdYlGn',
                             showscale=True
                         ))
-                        
+                    
                         fig.update_layout(
                             title="Performance by Hour",
                             xaxis_title="Hour of Day",
                             height=200
                         )
                         st.plotly_chart(fig, use_container_width=True)
-                    except Exception as e:
-                        st.warning(f"Could not generate performance heatmap: {str(e)}")
-                
-                # Lifestyle Recommendations
-                st.subheader("🌱 Lifestyle Recommendations")
-                
-                # Sleep Analysis
-                if 'sleep_hours' in analysis_df.columns:
-                    best_sleep = analysis_df.groupby('sleep_hours').agg({
-                        'focus_score': 'mean',
-                        'mental_clarity': 'mean',
-                        'productivity_score': 'mean'
-                    }).mean(axis=1).idxmax()
-                    
-                    current_sleep = analysis_df['sleep_hours'].mean()
-                    
-                    st.write("**Sleep Optimization**")
-                    if abs(current_sleep - best_sleep) > 0.5:
-                        st.warning(f"Your average sleep ({current_sleep:.1f}h) differs from optimal ({best_sleep:.1f}h)")
-                    else:
-                        st.success(f"Your sleep duration is optimal at {current_sleep:.1f} hours")
-                
-                # Exercise Analysis
-                if 'exercise_type' in analysis_df.columns:
-                    best_exercise = analysis_df.groupby('exercise_type').agg({
-                        'focus_score': 'mean',
-                        'mental_clarity': 'mean',
-                        'productivity_score': 'mean'
-                    }).mean(axis=1).idxmax()
-                    
-                    st.write("**Exercise Impact**")
-                    st.write(f"Most effective exercise type: {best_exercise.title()}")
-                
-                # Diet Analysis
-                if 'diet_meal_type' in analysis_df.columns:
-                    best_meal = analysis_df.groupby('diet_meal_type').agg({
-                        'focus_score': 'mean',
-                        'mental_clarity': 'mean',
-                        'productivity_score': 'mean'
-                    }).mean(axis=1).idxmax()
-                    
-                    st.write("**Diet Optimization**")
-                    st.write(f"Most effective meal type: {best_meal.title()}")
-                
-                # Action Items
-                st.subheader("📋 Action Items")
-                
-                # Generate personalized action items based on the analysis
-                action_items = []
-                
-                # Sleep-related action items
-                if 'sleep_hours' in analysis_df.columns and abs(current_sleep - best_sleep) > 0.5:
-                    action_items.append(f"Adjust sleep schedule to target {best_sleep:.1f} hours")
+                except Exception as e:
+                    st.warning(f"Could not generate performance heatmap: {str(e)}")
+            
+            # Lifestyle Recommendations
+            st.subheader("🌱 Lifestyle Recommendations")
+            
+            # Sleep Analysis
+            if 'sleep_hours' in analysis_df.columns:
+                best_sleep = analysis_df.groupby('sleep_hours').agg({
+                    'focus_score': 'mean',
+                    'mental_clarity': 'mean',
+                    'productivity_score': 'mean'
+                }).mean(axis=1).idxmax()
                 
-                # Exercise-related action items
-                if 'exercise_type' in analysis_df.columns:
-                    action_items.append(f"Incorporate more {best_exercise} into your routine")
+                current_sleep = analysis_df['sleep_hours'].mean()
                 
-                # Diet-related action items
-                if 'diet_meal_type' in analysis_df.columns:
-                    action_items.append(f"Plan more {best_meal} meals during work hours")
+                st.write("**Sleep Optimization**")
+                if abs(current_sleep - best_sleep) > 0.5:
+                    st.warning(f"Your average sleep ({current_sleep:.1f}h) differs from optimal ({best_sleep:.1f}h)")
+                else:
+                    st.success(f"Your sleep duration is optimal at {current_sleep:.1f} hours")
+            
+            # Exercise Analysis
+            if 'exercise_type' in analysis_df.columns:
+                best_exercise = analysis_df.groupby('exercise_type', observed=True).agg({
+                    'focus_score': 'mean',
+                    'mental_clarity': 'mean',
+                    'productivity_score': 'mean'
+                }).mean(axis=1).idxmax()
                 
-                # Display action items
-                for item in action_items:
-                    st.write(f"✅ {item}")
+                st.write("**Exercise Impact**")
+                st.write(f"Most effective exercise type: {best_exercise.title()}")
+            
+            # Diet Analysis
+            if 'diet_meal_type' in analysis_df.columns:
+                best_meal = analysis_df.groupby('diet_meal_type', observed=True).agg({
+                    'focus_score': 'mean',
+                    'mental_clarity': 'mean',
+                    'productivity_score': 'mean'
+                }).mean(axis=1).idxmax()
                 
-        except Exception as e:
-            st.error(f"Error loading analysis data: {str(e)}")
+                st.write("**Diet Optimization**")
+                st.write(f"Most effective meal type: {best_meal.title()}")
+            
+            # Action Items
+            st.subheader("📋 Action Items")
+            
+            # Generate personalized action items based on the analysis
+            action_items = []
+            
+            # Sleep-related action items
+            if 'sleep_hours' in analysis_df.columns and abs(current_sleep - best_sleep) > 0.5:
+                action_items.append(f"Adjust sleep schedule to target {best_sleep:.1f} hours")
+            
+            # Exercise-related action items
+            if 'exercise_type' in analysis_df.columns:
+                action_items.append(f"Incorporate more {best_exercise} into your routine")
+            
+            # Diet-related action items
+            if 'diet_meal_type' in analysis_df.columns:
+                action_items.append(f"Plan more {best_meal} meals during work hours")
+            
+            # Display action items
+            for item in action_items:
+                st.write(f"✅ {item}")
+            
+    except Exception as e:
+        st.error(f"Error loading analysis data: {str(e)}")
+
+# Diagnostics Tab
+with tabs[5]:
+    st.header("🩺 Diagnostics")
+    st.checkbox(
+        "Record timings", value=instrumentation.enabled(), key="record_timings",
+        on_change=lambda: instrumentation.enable(st.session_state.record_timings),
+        help="Time SQL, timestamp parsing, EEG analysis and plotting in this server process"
+    )
+    
+    if instrumentation.enabled():
+        # The tabs above have already run, so this rerun is included
+        instrumentation.record('page.rerun', time.perf_counter() - rerun_started)
+    
+    timings = instrumentation.timings_frame()
+    if timings.empty:
+        st.info("No timings recorded yet. Turn on recording, or set NEUROTRACK_TRACE=1 before starting the dashboard.")
+    else:
+        # Time spent per stage, then latency percentiles per instrumented call
+        st.subheader("Time per Stage")
+        st.bar_chart(timings.groupby('stage')['total_ms'].sum().sort_values(ascending=False))
+        
+        st.subheader("Latency by Call (ms)")
+        st.dataframe(timings.sort_values('total_ms', ascending=False).set_index('name').round(2))
+        
+        counters = instrumentation.snapshot()['counters']
+        if counters:
+            st.subheader("Counters")
+            st.dataframe(pd.Series(counters, name='value'))
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Download as JSON lines", instrumentation.export_jsonl(),
+                           file_name="neurotrack-timings.jsonl", mime="application/x-ndjson")
+    with col2:
+        if st.button("Reset timings"):
+            instrumentation.reset()
+            st.experimental_rerun()
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,337 @@
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import traceback
+import warnings
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+# Every module gets its SQLite connections from here, so they all share one
+# database path and the same settings. The path can be overridden with the
+# NEUROTRACK_DB_PATH environment variable. The default is anchored at the
+# project root, so scripts find the same database from any directory.
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+DEFAULT_DB_PATH = str(PROJECT_ROOT / 'data' / 'neurotrack.db')
+DB_PATH_ENV = 'NEUROTRACK_DB_PATH'
+BUSY_TIMEOUT = 20  # seconds to wait for a write lock before failing
+
+# WAL lets readers (the dashboard) run while a writer (SessionLogger) is
+# committing; with WAL, synchronous=NORMAL is still safe against corruption.
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # negative values are KiB, so about 64 MB
+    'mmap_size': 268435456,  # 256 MB
+    'temp_store': 'MEMORY'
+}
+
+# Slow-query log: with a threshold set, every statement run through these
+# connections is timed, from execute until its last row is fetched, and
+# statements at or over the threshold are appended as JSON lines, with
+# their parameters and EXPLAIN QUERY PLAN, to SLOW_QUERY_FILE next to the
+# database (see 'neurotrack db-stats'). Off unless $NEUROTRACK_SLOW_QUERY_MS
+# is set or log_slow_queries is called; 0 logs every statement.
+SLOW_QUERY_ENV = 'NEUROTRACK_SLOW_QUERY_MS'
+SLOW_QUERY_LOG_ENV = 'NEUROTRACK_SLOW_QUERY_LOG'
+SLOW_QUERY_FILE = 'slow_queries.jsonl'
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+MAX_LOGGED_PARAMS = 20
+
+_local = threading.local()
+_open_connections = weakref.WeakSet()
+_slow_query_ms = float(os.environ[SLOW_QUERY_ENV]) if os.environ.get(SLOW_QUERY_ENV) else None
+_slow_query_log = os.environ.get(SLOW_QUERY_LOG_ENV)
+_log_lock = threading.Lock()
+
+
+def resolve_db_path(db_path=None):
+    """Return db_path, or the configured database path if it is None"""
+    if db_path is None:
+        db_path = os.environ.get(DB_PATH_ENV, DEFAULT_DB_PATH)
+    return str(db_path)
+
+
+def log_slow_queries(threshold_ms=0, log_path=None):
+    """
+    Log statements taking at least threshold_ms, or stop logging if it is None
+
+    Applies to connections that are already open too.
+
+    Args:
+        threshold_ms (float): Minimum duration of a logged statement; 0 logs all of them
+        log_path (str): File to append to; SLOW_QUERY_FILE next to each database if None
+    """
+    global _slow_query_ms, _slow_query_log
+    _slow_query_ms = threshold_ms
+    _slow_query_log = log_path
+
+
+def slow_query_log_path(db_path=None):
+    """Return the file slow statements on a database are logged to"""
+    if _slow_query_log:
+        return _slow_query_log
+    return str(Path(resolve_db_path(db_path)).parent / SLOW_QUERY_FILE)
+
+
+def normalize_sql(sql):
+    """Collapse whitespace, so the same statement always logs the same text"""
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def _loggable(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<{len(value)} bytes>'
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return repr(value)
+
+
+def _loggable_params(params):
+    if isinstance(params, dict):
+        return {key: _loggable(value) for key, value in list(params.items())[:MAX_LOGGED_PARAMS]}
+    return [_loggable(value) for value in list(params)[:MAX_LOGGED_PARAMS]]
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor timing each statement from execute until its rows are exhausted
+
+    A statement is finished, and logged if it was slow, when a fetch returns
+    no more rows, the cursor runs another statement or it is closed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._statement = None
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._statement is not None:
+                self._statement[2] += time.perf_counter() - start
+
+    def _begin(self, sql, params, batches=None):
+        self._finish()
+        self._statement = [sql, params, 0.0, batches]
+
+    def _finish(self):
+        statement, self._statement = self._statement, None
+        if statement is not None and _slow_query_ms is not None and statement[2] * 1000 >= _slow_query_ms:
+            self.connection.log_statement(*statement)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        self._timed(super().execute, sql, parameters)
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        self._begin(sql, seq_of_parameters[0] if seq_of_parameters else (), len(seq_of_parameters))
+        self._timed(super().executemany, sql, seq_of_parameters)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+    def close(self):
+        self._finish()
+        super().close()
+
+
+class TrackedConnection(sqlite3.Connection):
+    """sqlite3 connection that remembers where it was opened, to report it if it is never closed"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.opened_at = ''.join(traceback.format_stack(limit=6)[:-2])
+        self.pooled = False
+        self.file_id = None
+        self.closed = False
+        self.db_path = str(args[0]) if args else str(kwargs.get('database', ''))
+        _open_connections.add(self)
+
+    # sqlite3.Connection.execute does not go through cursor(), so both are
+    # routed to a TimedCursor while slow queries are being logged
+    def cursor(self, factory=None):
+        if factory is None and _slow_query_ms is not None:
+            factory = TimedCursor
+        return super().cursor(factory) if factory is not None else super().cursor()
+
+    def execute(self, sql, parameters=()):
+        if _slow_query_ms is None:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if _slow_query_ms is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def log_statement(self, sql, params, seconds, batches=None):
+        """Append a statement, its duration, parameters and query plan to the slow-query log"""
+        plan = None
+        if sql.lstrip().split(None, 1)[0].upper() in EXPLAINABLE:
+            try:
+                # The base class execute, so the plan itself is not timed or logged
+                plan = [row[3] for row in sqlite3.Connection.execute(self, f'EXPLAIN QUERY PLAN {sql}', params)]
+            except sqlite3.Error:
+                pass
+        entry = {
+            'time': time.time(),
+            'db': os.path.abspath(self.db_path),
+            'ms': round(seconds * 1000, 3),
+            'sql': normalize_sql(sql),
+            'params': _loggable_params(params),
+            'plan': plan,
+        }
+        if batches is not None:
+            entry['batches'] = batches
+        path = slow_query_log_path(self.db_path)
+        with _log_lock:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+    def __del__(self):
+        if not getattr(self, 'closed', True) and not self.pooled:
+            warnings.warn(
+                f"SQLite connection was never closed; it was opened at:\n{self.opened_at}",
+                ResourceWarning
+            )
+
+
+def connect(db_path=None):
+    """
+    Open a new connection with the shared settings
+
+    Use this for connections that need their own transaction or lifetime,
+    e.g. long-running writers; the caller must close it. For short reads
+    and writes use get_connection instead.
+
+    Args:
+        db_path (str): Path to the SQLite database; see resolve_db_path
+
+    Returns:
+        sqlite3.Connection: Configured connection
+    """
+    db_path = resolve_db_path(db_path)
+    conn = sqlite3.connect(
+        db_path, timeout=BUSY_TIMEOUT, factory=TrackedConnection
+    )
+    for name, value in PRAGMAS.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def get_connection(db_path=None):
+    """
+    Return this thread's connection to the database, opening it on first use
+
+    The connection is reused for the life of the thread and must not be
+    closed by the caller.
+
+    Args:
+        db_path (str): Path to the SQLite database; see resolve_db_path
+
+    Returns:
+        sqlite3.Connection: Configured connection
+    """
+    key = os.path.abspath(resolve_db_path(db_path))
+    pool = _local.__dict__.setdefault('connections', {})
+    conn = pool.get(key)
+    if conn is not None and conn.file_id != _file_id(key):
+        # The database file was deleted or replaced since the connection was opened
+        conn.close()
+        conn = None
+    if conn is None:
+        conn = connect(key)
+        conn.pooled = True
+        conn.file_id = _file_id(key)
+        pool[key] = conn
+    return conn
+
+
+def _file_id(path):
+    """Identify the file at path, so a replaced database is not served from a stale connection"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+@contextmanager
+def connection(db_path=None):
+    """
+    Use this thread's connection for a block, rolling back on errors
+
+    Example:
+        with connection(db_path) as conn:
+            conn.execute(...)
+    """
+    conn = get_connection(db_path)
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def close_connections():
+    """Close the connections pooled by the calling thread"""
+    for conn in _local.__dict__.pop('connections', {}).values():
+        conn.close()
+
+
+def _report_unclosed():
+    """Close pooled connections at exit and report the ones callers leaked"""
+    for conn in list(_open_connections):
+        if conn.closed:
+            continue
+        if not conn.pooled:
+            warnings.warn(
+                f"SQLite connection was still open at exit; it was opened at:\n{conn.opened_at}",
+                ResourceWarning
+            )
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass  # pooled by another thread, which alone may close it; SQLite closes it at exit
+
+
+atexit.register(_report_unclosed)
@@ -0,0 +1,176 @@
+import pandas as pd
+from datetime import timedelta
+from pathlib import Path
+import sys
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from scripts.data.connection import get_connection
+from scripts.data.eeg_pyramid import DEFAULT_WIDTH, read_envelope
+from scripts.data.eeg_store import CHANNELS
+from scripts.data.instrumentation import timed
+from scripts.data.schema import read_frame
+from scripts.data.timestamps import from_epoch_us, to_epoch_us
+
+# Queries behind the dashboard, kept free of Streamlit so they can be
+# benchmarked and tested; app.py caches their results. Session frames are
+# typed as declared in data.schema.
+
+@timed('sql.get_data_version')
+def get_data_version(db_path=None, name='data'):
+    """
+    Write counter used to key cached frames, bumped by triggers on every change
+
+    Args:
+        db_path (str): Path to the SQLite database
+        name (str): 'data' for users, sessions and their context, journal and
+            diet rows; 'features' for session_features; 'eeg' for stored EEG
+            (see migrations.DATA_VERSION_TRIGGERS)
+
+    Returns:
+        int: The counter, which only ever grows
+    """
+    return get_connection(db_path).execute(
+        'SELECT version FROM data_versions WHERE name = ?', (name,)
+    ).fetchone()[0]
+
+def date_bounds(date_range):
+    """Return inclusive start and exclusive end epoch microseconds for a (start, end) date range"""
+    start_date, end_date = date_range[0], date_range[-1]
+    return to_epoch_us(start_date), to_epoch_us(end_date + timedelta(days=1))
+
+@timed('sql.load_users')
+def load_users(db_path=None):
+    return pd.read_sql_query("SELECT id, name FROM users", get_connection(db_path))
+
+@timed('sql.load_session_date_range')
+def load_session_date_range(user_id, db_path=None):
+    """Return the first and last session time of a user, or None if they have no sessions"""
+    first, last = get_connection(db_path).execute(
+        """
+        SELECT MIN(timestamp), MAX(timestamp)
+        FROM sessions
+        WHERE user_id = ?
+        """,
+        (user_id,)
+    ).fetchone()
+    if first is None:
+        return None
+    return from_epoch_us(first), from_epoch_us(last)
+
+@timed('sql.load_recent_sessions')
+def load_recent_sessions(user_id, date_range, db_path=None):
+    sessions_df = read_frame("""
+        SELECT DISTINCT
+            s.id,
+            s.timestamp,
+            s.user_id,
+            lc.sleep_quality,
+            lc.mood_score,
+            lc.focus_score,
+            lc.mental_clarity,
+            je.energy_level,
+            je.productivity_score,
+            EXISTS (SELECT 1 FROM eeg_recordings r WHERE r.session_id = s.id)
+                OR EXISTS (SELECT 1 FROM eeg_data e WHERE e.session_id = s.id) AS has_eeg
+        FROM sessions s
+        LEFT JOIN lifestyle_context lc ON s.id = lc.session_id
+        LEFT JOIN journal_entries je ON s.id = je.session_id
+        WHERE s.user_id = ? AND s.timestamp >= ? AND s.timestamp < ?
+        ORDER BY s.timestamp DESC
+        LIMIT 10
+    """, get_connection(db_path), params=(user_id, *date_bounds(date_range)))
+    
+    sessions_df['timestamp'] = from_epoch_us(sessions_df['timestamp'])
+    return sessions_df
+
+@timed('sql.load_analysis_data')
+def load_analysis_data(user_id, date_range, db_path=None):
+    analysis_df = read_frame("""
+        SELECT s.*, lc.*, je.*, dl.*, s.timestamp AS session_time
+        FROM sessions s
+        LEFT JOIN lifestyle_context lc ON s.id = lc.session_id
+        LEFT JOIN journal_entries je ON s.id = je.session_id
+        LEFT JOIN diet_log dl ON s.id = dl.session_id
+        WHERE s.user_id = ? AND s.timestamp >= ? AND s.timestamp < ?
+    """, get_connection(db_path), params=(user_id, *date_bounds(date_range)))
+    analysis_df['session_time'] = from_epoch_us(analysis_df['session_time'])
+    return analysis_df
+
+@timed('sql.load_recommendation_data')
+def load_recommendation_data(user_id, date_range, db_path=None):
+    recommendation_df = read_frame("""
+        SELECT
+            s.timestamp,
+            lc.sleep_hours,
+            lc.sleep_quality,
+            lc.last_meal_type,
+            lc.hours_since_meal,
+            lc.meal_size,
+            lc.meal_quality,
+            lc.hydration_level,
+            lc.caffeine_intake,
+            lc.exercise_type,
+            lc.exercise_duration_mins,
+            lc.mood_score,
+            lc.focus_score,
+            lc.mental_clarity,
+            lc.activity_type,
+            lc.time_of_day,
+            je.energy_level,
+            je.productivity_score,
+            dl.meal_type as diet_meal_type,
+            dl.calories,
+            dl.protein,
+            dl.carbs,
+            dl.fats
+        FROM sessions s
+        LEFT JOIN lifestyle_context lc ON s.id = lc.session_id
+        LEFT JOIN journal_entries je ON s.id = je.session_id
+        LEFT JOIN diet_log dl ON s.id = dl.session_id
+        WHERE s.user_id = ? AND s.timestamp >= ? AND s.timestamp < ?
+    """, get_connection(db_path), params=(user_id, *date_bounds(date_range)))
+    recommendation_df['timestamp'] = from_epoch_us(recommendation_df['timestamp'])
+    return recommendation_df
+
+@timed('eeg.load_eeg_envelope')
+def load_eeg_envelope(session_id, offsets=None, width=DEFAULT_WIDTH, db_path=None):
+    """
+    Min/max envelope of a session's EEG for the raw-signal viewer
+
+    Args:
+        session_id (int): ID of the session
+        offsets (tuple): (start, end) in seconds from the start of the
+            recording; the whole recording if None
+        width (int): Maximum points per channel and line, e.g. the plot width in pixels
+        db_path (str): Path to the SQLite database
+
+    Returns:
+        tuple: (frame, info) where frame has the seconds from the start of
+        each bin and the min and max of each channel, and info holds the
+        pyramid factor used and the duration of the recording; None if the
+        session has no stored samples
+    """
+    conn = get_connection(db_path)
+    start = end = None
+    if offsets is not None:
+        recording = conn.execute('SELECT start_time FROM eeg_recordings WHERE session_id = ?',
+                                 (session_id,)).fetchone()
+        if recording is None:
+            return None
+        start, end = (recording[0] + round(offset * 1e6) for offset in offsets)
+
+    envelope = read_envelope(conn, session_id, start, end, width)
+    if envelope is None:
+        return None
+    seconds = (envelope['timestamps'].astype('datetime64[us]').astype('int64') - envelope['start_time']) / 1e6
+    frame = pd.DataFrame({'seconds': seconds})
+    for channel, lows, highs in zip(CHANNELS, envelope['lows'], envelope['highs']):
+        frame[f'{channel}_min'] = lows
+        frame[f'{channel}_max'] = highs
+    info = {
+        'factor': envelope['factor'],
+        'duration': envelope['n_samples'] / envelope['sample_rate'],
+    }
+    return frame, info
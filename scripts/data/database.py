@@ -1,15 +1,16 @@
-import sqlite3
 import pandas as pd
-from pathlib import Path
 
-def get_db_connection():
-    """Create a database connection"""
-    db_path = Path(__file__).parent.parent.parent / 'data' / 'neurotrack.db'
-    return sqlite3.connect(str(db_path))
+from scripts.data.connection import PROJECT_ROOT, get_connection
+from scripts.data.schema import absolute_paths, read_frame
+from scripts.data.timestamps import from_epoch_us
 
-def load_session_data():
-    """Load all sessions with their context data from the database"""
-    conn = get_db_connection()
+def get_db_connection(db_path=None):
+    """Return the shared database connection of this thread"""
+    return get_connection(db_path)
+
+def load_session_data(db_path=None):
+    """Load all sessions with their context data, typed as declared in data.schema"""
+    conn = get_db_connection(db_path)
     query = '''
     SELECT 
         s.id as session_id,
@@ -33,26 +34,20 @@ def load_session_data():
     JOIN lifestyle_context lc ON s.id = lc.session_id
     ORDER BY s.timestamp DESC
     '''
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    df = read_frame(query, conn)
     
-    # Convert timestamp to datetime
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    # Convert timestamp from epoch microseconds to datetime
+    df['timestamp'] = from_epoch_us(df['timestamp'])
     
     # Convert relative paths to absolute paths
-    project_root = Path(__file__).parent.parent.parent
-    df['eeg_file_path'] = df['eeg_file_path'].apply(
-        lambda x: str(project_root / x) if pd.notna(x) else None
-    )
-    df['context_file_path'] = df['context_file_path'].apply(
-        lambda x: str(project_root / x) if pd.notna(x) else None
-    )
+    df['eeg_file_path'] = absolute_paths(df['eeg_file_path'], PROJECT_ROOT)
+    df['context_file_path'] = absolute_paths(df['context_file_path'], PROJECT_ROOT)
     
     return df
 
-def get_session_details(session_id):
+def get_session_details(session_id, db_path=None):
     """Get detailed information for a specific session"""
-    conn = get_db_connection()
+    conn = get_db_connection(db_path)
     query = '''
     SELECT *
     FROM sessions s
@@ -60,5 +55,4 @@ def get_session_details(session_id):
     WHERE s.id = ?
     '''
     df = pd.read_sql_query(query, conn, params=[session_id])
-    conn.close()
     return df.iloc[0] if not df.empty else None
\ No newline at end of file
@@ -0,0 +1,113 @@
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from scripts.data.connection import connect, normalize_sql, resolve_db_path, slow_query_log_path
+
+# Summaries behind 'neurotrack db-stats': the size of every table and index,
+# and the statements of the slow-query log (see connection.log_slow_queries)
+# grouped by their SQL text, worst total time first.
+
+
+def table_sizes(conn):
+    """
+    Row count and bytes on disk of every table, and bytes of every index
+
+    Bytes come from the dbstat virtual table; they are None if SQLite was
+    built without it.
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+
+    Returns:
+        pd.DataFrame: name, type, table, rows and bytes, largest first
+    """
+    objects = pd.read_sql_query('''
+        SELECT name, type, tbl_name AS "table" FROM sqlite_master
+        WHERE type IN ('table', 'index') AND name NOT LIKE 'sqlite_%'
+    ''', conn)
+    try:
+        pages = dict(conn.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name'))
+    except sqlite3.Error:
+        pages = {}
+
+    rows = [
+        conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] if kind == 'table' else None
+        for name, kind in zip(objects['name'], objects['type'])
+    ]
+    objects['rows'] = pd.array(rows, dtype='Int64')
+    objects['bytes'] = pd.array([pages.get(name) for name in objects['name']], dtype='Int64')
+    return objects.sort_values(['bytes', 'rows'], ascending=False, na_position='last').reset_index(drop=True)
+
+
+def read_slow_queries(log_path):
+    """Entries of a slow-query log, skipping lines cut short by a crash"""
+    entries = []
+    if not Path(log_path).exists():
+        return entries
+    with open(log_path) as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+
+def worst_queries(log_path, top=10, db_path=None):
+    """
+    Statements of a slow-query log grouped by SQL text, worst total time first
+
+    Args:
+        log_path (str): Slow-query log to read
+        top (int): Number of statements to return
+        db_path (str): Only count statements run on this database, if the
+            log is shared by several
+
+    Returns:
+        pd.DataFrame: sql, calls, total_ms, mean_ms, max_ms, and the
+        parameters and query plan of the slowest call
+    """
+    columns = ['sql', 'calls', 'total_ms', 'mean_ms', 'max_ms', 'params', 'plan']
+    entries = read_slow_queries(log_path)
+    if not entries:
+        return pd.DataFrame(columns=columns)
+
+    log = pd.DataFrame(entries)
+    if db_path is not None:
+        log = log[log['db'] == os.path.abspath(db_path)]
+        if log.empty:
+            return pd.DataFrame(columns=columns)
+    log = log.assign(sql=log['sql'].map(normalize_sql))
+    slowest = log.loc[log.groupby('sql')['ms'].idxmax(), ['sql', 'params', 'plan']].set_index('sql')
+    stats = log.groupby('sql')['ms'].agg(calls='count', total_ms='sum', mean_ms='mean', max_ms='max')
+    worst = stats.join(slowest).sort_values('total_ms', ascending=False).head(top)
+    return worst.reset_index()[columns]
+
+
+def db_stats(db_path=None, log_path=None, top=10):
+    """
+    Table sizes of a database and the worst statements logged against it
+
+    Args:
+        db_path (str): Path to the SQLite database
+        log_path (str): Slow-query log; the one next to the database if None
+        top (int): Number of statements to return
+
+    Returns:
+        tuple: (table_sizes frame, worst_queries frame, log path)
+    """
+    log_path = log_path or slow_query_log_path(db_path)
+    conn = connect(db_path)
+    try:
+        sizes = table_sizes(conn)
+    finally:
+        conn.close()
+    return sizes, worst_queries(log_path, top, resolve_db_path(db_path)), log_path
@@ -0,0 +1,184 @@
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from scripts.data.connection import connect
+from scripts.data.eeg_store import SAMPLE_DTYPE, read_eeg_array, read_recording, sample_range
+from scripts.data.timestamps import to_epoch_us
+
+# Raw EEG is browsed through a min/max pyramid: for every bin of `factor`
+# samples, the lowest and highest sample of each channel. Plotting the min
+# and max of one bin per pixel looks the same as plotting every sample, so
+# any time range can be drawn from at most two points per pixel. Levels are
+# built from the samples on first access and stored in eeg_pyramid, one BLOB
+# of float32 (bins, channels, 2) per level; triggers on the EEG tables (see
+# migrations) drop them whenever the samples change. Factor 1 is the raw
+# samples themselves and is read from the EEG tables.
+PYRAMID_FACTORS = (16, 256, 4096)
+DEFAULT_WIDTH = 1000  # bins per channel returned when no width is given
+
+
+def build_pyramid(samples, factors=PYRAMID_FACTORS):
+    """
+    Compute every pyramid level of a recording
+
+    Each level is reduced from the one below it, so the samples are only
+    read once.
+
+    Args:
+        samples (np.ndarray): Array with one row per channel
+        factors (tuple): Increasing bin sizes, each a multiple of the previous
+
+    Returns:
+        dict: Factor -> float32 array of shape (bins, channels, 2) holding min and max
+    """
+    levels = {}
+    lows = highs = np.asarray(samples, dtype=SAMPLE_DTYPE)
+    previous = 1
+    for factor in factors:
+        step = factor // previous
+        starts = np.arange(0, lows.shape[-1], step)
+        lows = np.minimum.reduceat(lows, starts, axis=-1)
+        highs = np.maximum.reduceat(highs, starts, axis=-1)
+        levels[factor] = np.ascontiguousarray(np.stack([lows, highs], axis=-1).transpose(1, 0, 2))
+        previous = factor
+    return levels
+
+
+def store_pyramid(cursor, session_id, levels):
+    """Replace the stored pyramid of a session with levels returned by build_pyramid"""
+    cursor.execute('DELETE FROM eeg_pyramid WHERE session_id = ?', (session_id,))
+    cursor.executemany('''
+        INSERT INTO eeg_pyramid (session_id, factor, n_bins, n_channels, data)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [
+        (session_id, factor, level.shape[0], level.shape[1], level.tobytes())
+        for factor, level in levels.items()
+    ])
+
+
+def ensure_pyramid(conn, session_id):
+    """
+    Build and store the pyramid of a session unless it is already stored
+
+    Returns:
+        bool: True if the session has a stored pyramid
+    """
+    if conn.execute('SELECT 1 FROM eeg_pyramid WHERE session_id = ? LIMIT 1', (session_id,)).fetchone():
+        return True
+
+    recording = read_recording(conn, session_id)
+    if recording is None or not recording['n_samples']:
+        return False
+    _, samples = read_eeg_array(conn, session_id)
+    with conn:
+        store_pyramid(conn.cursor(), session_id, build_pyramid(samples))
+    return True
+
+
+def choose_factor(n_samples, width, factors=PYRAMID_FACTORS):
+    """Smallest factor giving at most width bins, or the largest factor"""
+    for factor in (1, *factors):
+        if -(-n_samples // factor) <= width:
+            return factor
+    return factors[-1]
+
+
+def read_envelope(conn, session_id, start=None, end=None, width=DEFAULT_WIDTH):
+    """
+    Read the min/max envelope of a session's EEG at the resolution of a plot
+
+    Picks the finest level that fits the time range into width bins, so the
+    result never holds more than about 2 * width points per channel. Only
+    the bins of the range are read from the stored level.
+
+    Args:
+        conn: Open database connection
+        session_id (int): ID of the session
+        start (datetime): Start of the time range; the start of the recording if None
+        end (datetime): End of the time range; the end of the recording if None
+        width (int): Maximum bins per channel, e.g. the plot width in pixels
+
+    Returns:
+        dict: factor, timestamps (datetime64 start of each bin), lows and highs
+        of shape (channels, bins), plus the recording's start_time (epoch µs),
+        sample_rate and n_samples; None if the session has no stored samples
+        or is still stored as legacy rows
+    """
+    if not ensure_pyramid(conn, session_id):
+        return None
+    recording = read_recording(conn, session_id)
+    first, last = sample_range(recording, start, end)
+    factor = choose_factor(last - first, width)
+
+    if factor == 1:
+        timestamps, samples = read_eeg_array(conn, session_id, start, end)
+        lows = highs = samples
+    else:
+        first_bin, last_bin = first // factor, -(-last // factor)
+        n_bins, n_channels = conn.execute(
+            'SELECT n_bins, n_channels FROM eeg_pyramid WHERE session_id = ? AND factor = ?',
+            (session_id, factor)
+        ).fetchone()
+        last_bin = min(last_bin, n_bins)
+        bin_bytes = n_channels * 2 * np.dtype(SAMPLE_DTYPE).itemsize
+        blob = conn.execute(
+            'SELECT substr(data, ?, ?) FROM eeg_pyramid WHERE session_id = ? AND factor = ?',
+            (first_bin * bin_bytes + 1, (last_bin - first_bin) * bin_bytes, session_id, factor)
+        ).fetchone()[0]
+        level = np.frombuffer(blob, dtype=SAMPLE_DTYPE).reshape(-1, n_channels, 2)
+        lows, highs = level[..., 0].T, level[..., 1].T
+        offsets_us = np.round(np.arange(first_bin, last_bin) * factor * (1e6 / recording['sample_rate']))
+        timestamps = np.datetime64(to_epoch_us(recording['start_time']), 'us') + offsets_us.astype('timedelta64[us]')
+
+    return {
+        'factor': factor,
+        'timestamps': timestamps,
+        'lows': lows,
+        'highs': highs,
+        'start_time': recording['start_time'],
+        'sample_rate': recording['sample_rate'],
+        'n_samples': recording['n_samples'],
+    }
+
+
+def build_all(db_path=None, rebuild=False):
+    """
+    Build the pyramid of every session with stored EEG that does not have one
+
+    Sessions still stored as legacy rows are skipped; convert them first.
+
+    Returns:
+        int: Number of sessions whose pyramid was built
+    """
+    conn = connect(db_path)
+    try:
+        if rebuild:
+            with conn:
+                conn.execute('DELETE FROM eeg_pyramid')
+        session_ids = [row[0] for row in conn.execute('''
+            SELECT session_id FROM eeg_recordings WHERE n_samples > 0
+            EXCEPT
+            SELECT session_id FROM eeg_pyramid
+        ''')]
+        for session_id in session_ids:
+            ensure_pyramid(conn, session_id)
+    finally:
+        conn.close()
+    return len(session_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the min/max pyramids used to browse raw EEG")
+    parser.add_argument('command', choices=['build', 'rebuild'],
+                        help="'build' adds missing pyramids, 'rebuild' recomputes all of them")
+    parser.add_argument('--db', help="Path to the SQLite database (default: $NEUROTRACK_DB_PATH or data/neurotrack.db)")
+    args = parser.parse_args()
+
+    count = build_all(args.db, rebuild=args.command == 'rebuild')
+    print(f"Built EEG pyramids for {count} sessions")
@@ -0,0 +1,576 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts.data.connection import PROJECT_ROOT, resolve_db_path
+from scripts.data.timestamps import to_epoch_us
+
+# EEG samples are stored as fixed-size chunks of contiguous float32 arrays,
+# one BLOB per channel, instead of one row per sample. The start time (in
+# epoch microseconds) and sampling rate are kept once per session in
+# eeg_recordings and per-sample timestamps are reconstructed on read.
+# Sessions can alternatively be kept in memory-mappable .npy sidecar files
+# in eeg/ next to the database (storage = 'sidecar'), whose absolute paths
+# are kept in sessions.eeg_file_path. A sidecar file is only removed once
+# the deletion of its recording has committed (see delete_eeg), so a
+# rolled-back transaction never loses samples.
+CHUNK_SIZE = 4096  # samples per chunk
+CHANNELS = ('channel1', 'channel2')
+SAMPLE_DTYPE = np.float32
+DEFAULT_SAMPLE_RATE = 256
+
+
+def infer_sample_rate(timestamps, default=DEFAULT_SAMPLE_RATE):
+    """Infer the sampling rate in Hz from a sequence of sample timestamps"""
+    if len(timestamps) < 2:
+        return default
+
+    times = pd.to_datetime(pd.Series(timestamps), format='ISO8601')
+    span = (times.iloc[-1] - times.iloc[0]).total_seconds()
+    if span <= 0:
+        return default
+
+    return (len(times) - 1) / span
+
+
+def split_eeg_rows(eeg_data, sample_rate=None):
+    """
+    Split [timestamp, channel1, channel2] readings into columnar arrays
+
+    Args:
+        eeg_data (list): List of [timestamp, channel1, channel2] readings
+        sample_rate (float): Sampling rate in Hz, inferred from the timestamps if None
+
+    Returns:
+        tuple: (start_time, sample_rate, channel1, channel2)
+    """
+    timestamps, channel1, channel2 = zip(*eeg_data)
+    if sample_rate is None:
+        sample_rate = infer_sample_rate(timestamps)
+
+    return (
+        pd.Timestamp(timestamps[0]).to_pydatetime(),
+        sample_rate,
+        np.asarray(channel1, dtype=SAMPLE_DTYPE),
+        np.asarray(channel2, dtype=SAMPLE_DTYPE)
+    )
+
+
+def write_eeg(cursor, session_id, channel1, channel2, start_time, sample_rate=DEFAULT_SAMPLE_RATE):
+    """
+    Store the EEG samples of a session as float32 chunks, replacing any existing samples
+
+    Args:
+        cursor: Cursor of an open connection; the caller owns the transaction
+        session_id (int): ID of the session
+        channel1 (array-like): Samples of the first channel
+        channel2 (array-like): Samples of the second channel
+        start_time (datetime): Time of the first sample
+        sample_rate (float): Sampling rate in Hz
+
+    Returns:
+        int: Number of samples stored
+    """
+    samples = _stack_channels(channel1, channel2)
+    n_samples = samples.shape[1]
+    delete_eeg(cursor, session_id)
+
+    cursor.execute('''
+        INSERT INTO eeg_recordings (session_id, start_time, sample_rate, n_samples, storage)
+        VALUES (?, ?, ?, ?, 'chunks')
+    ''', (session_id, to_epoch_us(start_time), float(sample_rate), n_samples))
+
+    cursor.executemany('''
+        INSERT INTO eeg_chunks (session_id, chunk_index, n_samples, channel1, channel2)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        (
+            session_id,
+            chunk_index,
+            min(CHUNK_SIZE, n_samples - offset),
+            samples[0, offset:offset + CHUNK_SIZE].tobytes(),
+            samples[1, offset:offset + CHUNK_SIZE].tobytes()
+        )
+        for chunk_index, offset in enumerate(range(0, n_samples, CHUNK_SIZE))
+    ))
+
+    return n_samples
+
+
+def write_sidecar(cursor, session_id, channel1, channel2, start_time, sample_rate=DEFAULT_SAMPLE_RATE,
+                  eeg_dir=None):
+    """
+    Store the EEG samples of a session in a .npy sidecar file, replacing any existing samples
+
+    The file holds a (channels, samples) float32 array so each channel is
+    contiguous on disk and can be memory-mapped on its own. Its absolute
+    path is recorded in sessions.eeg_file_path. The file is written before
+    the caller's transaction commits, under a name no other recording uses,
+    so the caller must remove it if the transaction rolls back.
+
+    Args:
+        cursor: Cursor of an open connection; the caller owns the transaction
+        session_id (int): ID of the session
+        channel1 (array-like): Samples of the first channel
+        channel2 (array-like): Samples of the second channel
+        start_time (datetime): Time of the first sample
+        sample_rate (float): Sampling rate in Hz
+        eeg_dir (str): Directory for sidecar files; eeg/ next to the configured
+            database if None
+
+    Returns:
+        str: Path of the sidecar file
+    """
+    samples = _stack_channels(channel1, channel2)
+    n_samples = samples.shape[1]
+    delete_eeg(cursor, session_id)
+
+    file_path = sidecar_path(session_id, eeg_dir)
+    tmp_path = file_path.with_suffix('.tmp.npy')
+    np.save(tmp_path, samples)
+    os.replace(tmp_path, file_path)
+
+    cursor.execute('''
+        INSERT INTO eeg_recordings (session_id, start_time, sample_rate, n_samples, storage)
+        VALUES (?, ?, ?, ?, 'sidecar')
+    ''', (session_id, to_epoch_us(start_time), float(sample_rate), n_samples))
+    cursor.execute(
+        'UPDATE sessions SET eeg_file_path = ? WHERE id = ?',
+        (str(file_path), session_id)
+    )
+
+    return str(file_path)
+
+
+def sidecar_path(session_id, eeg_dir=None):
+    """
+    Return an absolute path for a new sidecar file of a session, creating its directory
+
+    A file already at the usual name, such as the one of a recording being
+    replaced, is never overwritten; a numbered name is used instead.
+    """
+    if eeg_dir is None:
+        eeg_dir = Path(resolve_db_path()).parent / 'eeg'
+    eeg_dir = Path(eeg_dir).absolute()
+    eeg_dir.mkdir(parents=True, exist_ok=True)
+    file_path = eeg_dir / f'session_{session_id}.npy'
+    version = 1
+    while file_path.exists():
+        version += 1
+        file_path = eeg_dir / f'session_{session_id}_{version}.npy'
+    return file_path
+
+
+def begin_recording(cursor, session_id, start_time, sample_rate=DEFAULT_SAMPLE_RATE):
+    """
+    Start streaming EEG samples of a session into chunk storage, replacing any existing samples
+
+    The recording is marked as in progress until finish_recording is called,
+    so sessions interrupted by a crash can be found and resumed.
+
+    Args:
+        cursor: Cursor of an open connection; the caller owns the transaction
+        session_id (int): ID of the session
+        start_time (datetime): Time of the first sample
+        sample_rate (float): Sampling rate in Hz
+    """
+    delete_eeg(cursor, session_id)
+    cursor.execute('''
+        INSERT INTO eeg_recordings (session_id, start_time, sample_rate, n_samples, storage, status)
+        VALUES (?, ?, ?, 0, 'chunks', 'recording')
+    ''', (session_id, to_epoch_us(start_time), float(sample_rate)))
+
+
+def append_chunks(cursor, session_id, samples, first_chunk):
+    """
+    Append (channels, samples) float32 data to a recording as chunks starting at first_chunk
+
+    Every chunk but the last one written to a recording must hold exactly
+    CHUNK_SIZE samples, so callers buffer partial chunks until the recording
+    is finished.
+
+    Args:
+        cursor: Cursor of an open connection; the caller owns the transaction
+        session_id (int): ID of the session
+        samples (np.ndarray): (channels, samples) array to append
+        first_chunk (int): Index of the first chunk to write
+
+    Returns:
+        int: Number of samples in the recording after the append
+    """
+    n_samples = samples.shape[1]
+    cursor.executemany('''
+        INSERT INTO eeg_chunks (session_id, chunk_index, n_samples, channel1, channel2)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        (
+            session_id,
+            first_chunk + offset // CHUNK_SIZE,
+            min(CHUNK_SIZE, n_samples - offset),
+            np.ascontiguousarray(samples[0, offset:offset + CHUNK_SIZE]).tobytes(),
+            np.ascontiguousarray(samples[1, offset:offset + CHUNK_SIZE]).tobytes()
+        )
+        for offset in range(0, n_samples, CHUNK_SIZE)
+    ))
+
+    total = first_chunk * CHUNK_SIZE + n_samples
+    cursor.execute(
+        'UPDATE eeg_recordings SET n_samples = ? WHERE session_id = ?', (total, session_id)
+    )
+    return total
+
+
+def write_gaps(cursor, session_id, gaps):
+    """
+    Record sample ranges of a recording that were filled in rather than recorded
+
+    Args:
+        cursor: Cursor of an open connection; the caller owns the transaction
+        session_id (int): ID of the session
+        gaps (list): (start_sample, end_sample) pairs
+    """
+    cursor.executemany(
+        'INSERT OR REPLACE INTO eeg_gaps (session_id, start_sample, end_sample) VALUES (?, ?, ?)',
+        [(session_id, int(start), int(end)) for start, end in gaps]
+    )
+
+
+def read_gaps(conn, session_id):
+    """Return the (start_sample, end_sample) ranges filled in when a session was recorded"""
+    return [tuple(row) for row in conn.execute(
+        'SELECT start_sample, end_sample FROM eeg_gaps WHERE session_id = ? ORDER BY start_sample',
+        (session_id,)
+    )]
+
+
+def finish_recording(cursor, session_id):
+    """Mark a streamed recording as complete"""
+    cursor.execute(
+        "UPDATE eeg_recordings SET status = 'complete' WHERE session_id = ?", (session_id,)
+    )
+
+
+def chunks_to_sidecar(conn, session_id, eeg_dir=None):
+    """
+    Move the chunk storage of a session into a .npy sidecar file
+
+    The file is filled one chunk at a time through a memory map, so memory
+    use does not grow with the length of the recording.
+
+    Args:
+        conn: Open database connection
+        session_id (int): ID of the session
+        eeg_dir (str): Directory for sidecar files; eeg/ next to the configured
+            database if None
+
+    Raises:
+        ValueError: If the session has no EEG recording kept in chunks
+    """
+    recording = read_recording(conn, session_id)
+    if recording is None:
+        raise ValueError(f"Session {session_id} has no EEG recording to move to a sidecar file")
+    if recording['storage'] != 'chunks':
+        raise ValueError(f"EEG of session {session_id} is not stored in chunks")
+    file_path = sidecar_path(session_id, eeg_dir)
+    tmp_path = file_path.with_suffix('.tmp.npy')
+
+    samples = np.lib.format.open_memmap(
+        tmp_path, mode='w+', dtype=SAMPLE_DTYPE, shape=(len(CHANNELS), recording['n_samples'])
+    )
+    cursor = conn.execute(f'''
+        SELECT chunk_index, {', '.join(CHANNELS)}
+        FROM eeg_chunks
+        WHERE session_id = ?
+        ORDER BY chunk_index
+    ''', (session_id,))
+    for chunk_index, *blobs in cursor:
+        offset = chunk_index * CHUNK_SIZE
+        for row, blob in enumerate(blobs):
+            chunk = np.frombuffer(blob, dtype=SAMPLE_DTYPE)
+            samples[row, offset:offset + len(chunk)] = chunk
+    samples.flush()
+    del samples
+    os.replace(tmp_path, file_path)
+
+    try:
+        with conn:
+            conn.execute('DELETE FROM eeg_chunks WHERE session_id = ?', (session_id,))
+            conn.execute(
+                "UPDATE eeg_recordings SET storage = 'sidecar' WHERE session_id = ?", (session_id,)
+            )
+            conn.execute(
+                'UPDATE sessions SET eeg_file_path = ? WHERE id = ?', (str(file_path), session_id)
+            )
+    except Exception:
+        # The chunks are still in place; drop the copy nothing refers to
+        file_path.unlink(missing_ok=True)
+        raise
+
+
+def _stack_channels(channel1, channel2):
+    """Stack both channels into a contiguous (channels, samples) float32 array"""
+    channel1 = np.asarray(channel1, dtype=SAMPLE_DTYPE)
+    channel2 = np.asarray(channel2, dtype=SAMPLE_DTYPE)
+    if len(channel1) != len(channel2):
+        raise ValueError("EEG channels must have the same number of samples")
+
+    return np.ascontiguousarray(np.stack([channel1, channel2]))
+
+
+def delete_eeg(cursor, session_id):
+    """
+    Remove all stored EEG samples of a session
+
+    Its sidecar file is not unlinked here, since the caller's transaction
+    may still roll back; it is queued in deleted_sidecars instead, and
+    remove_deleted_sidecars unlinks it once the deletion has committed.
+    """
+    row = cursor.execute('''
+        SELECT s.eeg_file_path
+        FROM eeg_recordings r
+        JOIN sessions s ON s.id = r.session_id
+        WHERE r.session_id = ? AND r.storage = 'sidecar'
+    ''', (session_id,)).fetchone()
+    if row and row[0]:
+        cursor.execute('INSERT OR IGNORE INTO deleted_sidecars (file_path) VALUES (?)', (row[0],))
+        cursor.execute('UPDATE sessions SET eeg_file_path = NULL WHERE id = ?', (session_id,))
+
+    cursor.execute('DELETE FROM eeg_chunks WHERE session_id = ?', (session_id,))
+    cursor.execute('DELETE FROM eeg_gaps WHERE session_id = ?', (session_id,))
+    cursor.execute('DELETE FROM eeg_recordings WHERE session_id = ?', (session_id,))
+
+
+def remove_deleted_sidecars(conn):
+    """
+    Unlink the sidecar files of recordings whose deletion has committed
+
+    Call it outside of a transaction. Files that a session refers to again
+    are kept.
+
+    Returns:
+        int: Number of files removed
+    """
+    queued = conn.execute('''
+        SELECT file_path, file_path IN (SELECT eeg_file_path FROM sessions WHERE eeg_file_path IS NOT NULL)
+        FROM deleted_sidecars
+    ''').fetchall()
+    if not queued:
+        return 0
+    removed = [path for path, in_use in queued if not in_use]
+    for path in removed:
+        sidecar_file(path).unlink(missing_ok=True)
+    with conn:
+        conn.executemany('DELETE FROM deleted_sidecars WHERE file_path = ?', [(path,) for path, _ in queued])
+    return len(removed)
+
+
+def sidecar_file(file_path):
+    """Resolve a stored sidecar path; relative ones, from older databases, against the project root"""
+    return PROJECT_ROOT / file_path
+
+
+def read_recording(conn, session_id):
+    """
+    Return the header of a session's stored EEG, or None
+
+    Returns:
+        dict: start_time, sample_rate, n_samples, storage, status and file_path
+    """
+    row = conn.execute('''
+        SELECT r.start_time, r.sample_rate, r.n_samples, r.storage, r.status, s.eeg_file_path
+        FROM eeg_recordings r
+        LEFT JOIN sessions s ON s.id = r.session_id
+        WHERE r.session_id = ?
+    ''', (session_id,)).fetchone()
+    if row is None:
+        return None
+
+    return dict(zip(('start_time', 'sample_rate', 'n_samples', 'storage', 'status', 'file_path'), row))
+
+
+def sample_timestamps(start_time, sample_rate, n_samples, offset=0):
+    """Reconstruct per-sample timestamps as a datetime64[us] array"""
+    start = np.datetime64(to_epoch_us(start_time), 'us')
+    offsets_us = np.round((np.arange(n_samples) + offset) * (1e6 / sample_rate))
+    return start + offsets_us.astype('timedelta64[us]')
+
+
+def sample_range(recording, start=None, end=None):
+    """Return the [first, last) sample indices of a recording that fall in [start, end)"""
+    start_us = to_epoch_us(recording['start_time'])
+    sample_rate = recording['sample_rate']
+    n_samples = recording['n_samples']
+
+    first, last = 0, n_samples
+    if start is not None:
+        offset = (to_epoch_us(start) - start_us) / 1e6 * sample_rate
+        first = min(n_samples, max(0, int(np.ceil(offset - 1e-6))))
+    if end is not None:
+        offset = (to_epoch_us(end) - start_us) / 1e6 * sample_rate
+        last = min(n_samples, max(first, int(np.ceil(offset - 1e-6))))
+
+    return first, last
+
+
+def open_sidecar(file_path):
+    """Memory-map a sidecar file as a read-only (channels, samples) array without reading it"""
+    return np.load(sidecar_file(file_path), mmap_mode='r')
+
+
+def channel_indices(channels=None):
+    """Map channel names to row indices, as a slice when they are contiguous"""
+    if channels is None:
+        return slice(None)
+
+    indices = [CHANNELS.index(name) for name in channels]
+    if indices == list(range(indices[0], indices[-1] + 1)):
+        return slice(indices[0], indices[-1] + 1)
+    return indices
+
+
+def read_eeg_array(conn, session_id, start=None, end=None, channels=None):
+    """
+    Read the EEG samples of a session as a single (channels, samples) float32 array
+
+    Sidecar sessions are returned as a np.memmap view into the file, so only
+    the pages that are actually touched are read from disk. Chunk sessions
+    only fetch the chunks and channel columns that are requested. Sessions
+    that have not been converted from legacy rows yet are read with
+    np.fromiter instead of building Python lists.
+
+    Args:
+        conn: Open database connection
+        session_id (int): ID of the session
+        start (datetime): Only return samples at or after this time
+        end (datetime): Only return samples before this time
+        channels (list): Channel names to return, e.g. ['channel1']; all if None
+
+    Returns:
+        tuple: (timestamps, samples) with one row of samples per selected
+        channel, or (None, None) if the session has no stored samples
+    """
+    selected = channel_indices(channels)
+    names = np.array(CHANNELS)[selected].tolist()
+
+    recording = read_recording(conn, session_id)
+    if recording is None or not recording['n_samples']:
+        return read_legacy_array(conn, session_id, start, end, names)
+
+    first, last = sample_range(recording, start, end)
+    timestamps = sample_timestamps(
+        recording['start_time'], recording['sample_rate'], last - first, offset=first
+    )
+
+    if recording['storage'] == 'sidecar':
+        return timestamps, open_sidecar(recording['file_path'])[selected, first:last]
+
+    samples = np.empty((len(names), last - first), dtype=SAMPLE_DTYPE)
+    if last > first:
+        cursor = conn.execute(f'''
+            SELECT chunk_index, {', '.join(names)}
+            FROM eeg_chunks
+            WHERE session_id = ? AND chunk_index BETWEEN ? AND ?
+            ORDER BY chunk_index
+        ''', (session_id, first // CHUNK_SIZE, (last - 1) // CHUNK_SIZE))
+        for chunk_index, *blobs in cursor:
+            chunk_start = chunk_index * CHUNK_SIZE
+            for row, blob in enumerate(blobs):
+                chunk = np.frombuffer(blob, dtype=SAMPLE_DTYPE)
+                lo = max(first, chunk_start)
+                hi = min(last, chunk_start + len(chunk))
+                samples[row, lo - first:hi - first] = chunk[lo - chunk_start:hi - chunk_start]
+
+    return timestamps, samples
+
+
+def read_eeg(conn, session_id, start=None, end=None, channels=None):
+    """
+    Read the EEG samples of a session as separate channel arrays
+
+    Args:
+        conn: Open database connection
+        session_id (int): ID of the session
+        start (datetime): Only return samples at or after this time
+        end (datetime): Only return samples before this time
+        channels (list): Channel names to read, e.g. ['channel1']; all if None
+
+    Returns:
+        tuple: (timestamps, channel1, channel2), with None for channels that
+        were not selected, or (None, None, None) if the session has no
+        stored samples
+    """
+    timestamps, samples = read_eeg_array(conn, session_id, start, end, channels)
+    if timestamps is None:
+        return None, None, None
+
+    rows = dict(zip(CHANNELS if channels is None else channels, samples))
+    return (timestamps,) + tuple(rows.get(name) for name in CHANNELS)
+
+
+def read_legacy_array(conn, session_id, start=None, end=None, channels=CHANNELS):
+    """Read EEG samples stored one row per sample in the legacy eeg_data table"""
+    where = 'session_id = ?'
+    params = [session_id]
+    if start is not None:
+        where += ' AND timestamp >= ?'
+        params.append(to_epoch_us(start))
+    if end is not None:
+        where += ' AND timestamp < ?'
+        params.append(to_epoch_us(end))
+
+    # One pass over the cursor straight into a structured array, without
+    # materialising a Python list of rows; timestamps are epoch microseconds
+    cursor = conn.execute(
+        f'SELECT timestamp, {", ".join(channels)} FROM eeg_data WHERE {where} ORDER BY timestamp',
+        params
+    )
+    rows = np.fromiter(
+        cursor, dtype=[('timestamp', np.int64)] + [(name, SAMPLE_DTYPE) for name in channels]
+    )
+    if len(rows) == 0:
+        return None, None
+
+    return (
+        rows['timestamp'].astype('datetime64[us]'),
+        np.stack([rows[name] for name in channels])
+    )
+
+
+def read_legacy_rows(conn, session_id, start=None, end=None):
+    """Read legacy eeg_data rows as (timestamps, channel1, channel2)"""
+    timestamps, samples = read_legacy_array(conn, session_id, start, end)
+    if timestamps is None:
+        return None, None, None
+
+    return timestamps, samples[0], samples[1]
+
+
+def convert_legacy_rows(conn):
+    """
+    Convert EEG samples from the legacy one-row-per-sample eeg_data table
+    into chunk storage, one session per transaction
+
+    Args:
+        conn: Open database connection
+
+    Returns:
+        int: Number of sessions converted
+    """
+    session_ids = [row[0] for row in conn.execute(
+        'SELECT DISTINCT session_id FROM eeg_data'
+    ).fetchall()]
+
+    for session_id in session_ids:
+        timestamps, channel1, channel2 = read_legacy_rows(conn, session_id)
+        sample_rate = infer_sample_rate(timestamps)
+        with conn:
+            cursor = conn.cursor()
+            write_eeg(
+                cursor, session_id, channel1, channel2,
+                pd.Timestamp(timestamps[0]).to_pydatetime(), sample_rate
+            )
+            cursor.execute('DELETE FROM eeg_data WHERE session_id = ?', (session_id,))
+
+    return len(session_ids)
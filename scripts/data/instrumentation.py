@@ -0,0 +1,221 @@
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+import pandas as pd
+
+# In-process timings and counters of the hot paths, so a slow dashboard can
+# be broken down into SQL, timestamp parsing, Welch and plotting. Functions
+# are wrapped with @timed(name) and blocks with `with span(name)`; names are
+# dotted, the first part being the stage ('sql', 'timestamps', 'welch',
+# 'plot', ...). Durations go into log-scaled histograms with
+# BUCKETS_PER_DECADE buckets per power of ten, so memory stays constant and
+# percentiles are accurate to about 6%. Tracing is off unless
+# $NEUROTRACK_TRACE is set or enable() is called; while off, a wrapped call
+# costs one flag check.
+BUCKETS_PER_DECADE = 20
+PERCENTILES = (50, 90, 95, 99)
+
+_enabled = os.environ.get('NEUROTRACK_TRACE', '').lower() in ('1', 'true', 'yes')
+_lock = threading.Lock()
+_timers = {}
+_counters = {}
+
+
+class Histogram:
+    """Count, total, extremes and log-scaled bucket counts of durations in seconds"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        bucket = math.floor(math.log10(max(seconds, 1e-9)) * BUCKETS_PER_DECADE)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, q):
+        """Duration below which q percent of the recorded durations fall, from the buckets"""
+        if not self.count:
+            return None
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                # Geometric middle of the bucket, kept within the observed range
+                value = 10 ** ((bucket + 0.5) / BUCKETS_PER_DECADE)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            **{f'p{q}': self.percentile(q) for q in PERCENTILES},
+        }
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    """Start (or with on=False, stop) recording timings and counters"""
+    global _enabled
+    _enabled = bool(on)
+
+
+def disable():
+    enable(False)
+
+
+def reset():
+    """Forget everything recorded so far"""
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def record(name, seconds):
+    """Add a duration to the histogram of a stage"""
+    with _lock:
+        histogram = _timers.get(name)
+        if histogram is None:
+            histogram = _timers[name] = Histogram()
+        histogram.add(seconds)
+
+
+def count(name, n=1):
+    """Add n to a counter, e.g. rows read or cache misses"""
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def timed(name):
+    """
+    Decorator recording the duration of every call of a function under name
+
+    Calls that raise are recorded too.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Context manager recording the duration of a block under name"""
+    return _Span(name) if _enabled else _NO_SPAN
+
+
+def snapshot():
+    """
+    Summaries of every timer and the value of every counter
+
+    Returns:
+        dict: 'timers' maps names to the count, total, mean, min, max and
+        percentiles (seconds) of their durations; 'counters' maps names to values
+    """
+    with _lock:
+        return {
+            'timers': {name: histogram.summary() for name, histogram in sorted(_timers.items())},
+            'counters': dict(sorted(_counters.items())),
+        }
+
+
+def timings_frame():
+    """One row per timer with its stage, call count and latency statistics in milliseconds"""
+    rows = []
+    for name, summary in snapshot()['timers'].items():
+        rows.append({
+            'stage': name.split('.', 1)[0],
+            'name': name,
+            'calls': summary['count'],
+            'total_ms': summary['total'] * 1000,
+            'mean_ms': summary['mean'] * 1000,
+            **{f'p{q}_ms': summary[f'p{q}'] * 1000 for q in PERCENTILES},
+            'max_ms': summary['max'] * 1000,
+        })
+    columns = ['stage', 'name', 'calls', 'total_ms', 'mean_ms', *(f'p{q}_ms' for q in PERCENTILES), 'max_ms']
+    return pd.DataFrame(rows, columns=columns)
+
+
+def export_jsonl(file=None):
+    """
+    Write the current timers and counters as JSON lines
+
+    Each line is one timer (kind 'timer', with its summary and bucket
+    counts, so histograms of several processes can be merged) or one
+    counter (kind 'counter'), stamped with the time and process ID.
+
+    Args:
+        file: Writable text file; if None the lines are returned instead
+
+    Returns:
+        str: The lines, if no file was given
+    """
+    stamp = {'time': time.time(), 'pid': os.getpid()}
+    with _lock:
+        records = [
+            {**stamp, 'kind': 'timer', 'name': name, **histogram.summary(),
+             'buckets_per_decade': BUCKETS_PER_DECADE,
+             'buckets': {str(b): n for b, n in sorted(histogram.buckets.items())}}
+            for name, histogram in sorted(_timers.items())
+        ] + [
+            {**stamp, 'kind': 'counter', 'name': name, 'value': value}
+            for name, value in sorted(_counters.items())
+        ]
+    text = ''.join(json.dumps(entry) + '\n' for entry in records)
+    if file is None:
+        return text
+    file.write(text)
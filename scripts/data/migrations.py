@@ -0,0 +1,313 @@
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from scripts.data.connection import connect
+from scripts.data.rollups import rollup_schema_statements
+from scripts.data.timestamps import epoch_us_sql, unparseable_timestamp_sql
+
+# Columns holding timestamps as epoch microseconds, with the key of their rows
+EPOCH_US_COLUMNS = [
+    ('sessions', 'timestamp', 'id'),
+    ('eeg_data', 'timestamp', 'id'),
+    ('eeg_recordings', 'start_time', 'session_id'),
+]
+
+
+def check_text_timestamps(conn):
+    """Fail, listing the offending rows, if any text timestamp cannot be converted"""
+    unparseable = []
+    for table, column, key in EPOCH_US_COLUMNS:
+        unparseable += [f'{table}.{key}={row_key}: {value!r}' for row_key, value in conn.execute(f'''
+            SELECT {key}, {column} FROM {table}
+            WHERE {unparseable_timestamp_sql(column)}
+            ORDER BY {key}
+        ''')]
+    if unparseable:
+        raise ValueError(
+            "Timestamps that cannot be converted to epoch microseconds; fix or delete these rows "
+            f"and migrate again: {'; '.join(unparseable)}"
+        )
+
+
+def epoch_us_statements():
+    """Convert text timestamps to epoch microseconds and keep later inserts that way"""
+    statements = [check_text_timestamps]
+    for table, column, key in EPOCH_US_COLUMNS:
+        statements.append(f'''
+            UPDATE {table} SET {column} = {epoch_us_sql(column)}
+            WHERE typeof({column}) = 'text'
+        ''')
+        # Text written by older code or column defaults such as CURRENT_TIMESTAMP;
+        # text that is not a timestamp is rejected rather than stored as NULL
+        statements.append(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_{column}_epoch_us
+            AFTER INSERT ON {table}
+            WHEN typeof(NEW.{column}) = 'text'
+            BEGIN
+                SELECT RAISE(ABORT, 'cannot convert {table}.{column} to epoch microseconds')
+                WHERE {unparseable_timestamp_sql(f'NEW.{column}')};
+                UPDATE {table} SET {column} = {epoch_us_sql(f'NEW.{column}')}
+                WHERE {key} = NEW.{key};
+            END
+        ''')
+    return statements
+
+
+def eeg_invalidation_triggers(name, derived_tables):
+    """Triggers deleting a session's rows in derived_tables whenever its EEG samples change"""
+    statements = []
+    for table in ('eeg_recordings', 'eeg_chunks', 'eeg_data'):
+        for event, ids in (('INSERT', 'NEW.session_id'),
+                           ('UPDATE', 'OLD.session_id, NEW.session_id'),
+                           ('DELETE', 'OLD.session_id')):
+            deletes = '\n                    '.join(
+                f'DELETE FROM {derived} WHERE session_id IN ({ids});' for derived in derived_tables
+            )
+            statements.append(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_invalidate_{name}
+                AFTER {event} ON {table}
+                BEGIN
+                    {deletes}
+                END
+            ''')
+    return statements
+
+
+def signal_quality_statements():
+    """Tables of per-session signal quality, dropped whenever a session's EEG changes"""
+    statements = [
+        '''CREATE TABLE IF NOT EXISTS signal_quality (
+               session_id INTEGER PRIMARY KEY,
+               window_samples INTEGER NOT NULL,
+               n_windows INTEGER NOT NULL,
+               bad_windows INTEGER NOT NULL,
+               assessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               FOREIGN KEY (session_id) REFERENCES sessions (id)
+           )''',
+        '''CREATE TABLE IF NOT EXISTS eeg_bad_intervals (
+               session_id INTEGER NOT NULL,
+               channel INTEGER NOT NULL,
+               start_sample INTEGER NOT NULL,
+               end_sample INTEGER NOT NULL,
+               reasons TEXT NOT NULL,
+               PRIMARY KEY (session_id, channel, start_sample)
+           ) WITHOUT ROWID''',
+    ]
+    return statements + eeg_invalidation_triggers('quality', ['signal_quality', 'eeg_bad_intervals'])
+
+
+def eeg_pyramid_statements():
+    """Table of min/max pyramid levels per session, dropped whenever a session's EEG changes"""
+    return [
+        '''CREATE TABLE IF NOT EXISTS eeg_pyramid (
+               session_id INTEGER NOT NULL,
+               factor INTEGER NOT NULL,
+               n_bins INTEGER NOT NULL,
+               n_channels INTEGER NOT NULL,
+               data BLOB NOT NULL,
+               PRIMARY KEY (session_id, factor)
+           ) WITHOUT ROWID''',
+    ] + eeg_invalidation_triggers('pyramid', ['eeg_pyramid'])
+
+
+def migration_checkpoint_statements():
+    """Table recording which archived sessions migrate_data has stored or failed to parse"""
+    return [
+        '''CREATE TABLE IF NOT EXISTS migration_checkpoints (
+               session_id INTEGER PRIMARY KEY,
+               status TEXT NOT NULL CHECK(status IN ('done', 'failed')),
+               n_samples INTEGER,
+               error TEXT,
+               updated_at INTEGER NOT NULL
+           )''',
+    ]
+
+
+def eeg_gap_statements():
+    """Table of sample ranges filled in for frames lost while streaming"""
+    return [
+        '''CREATE TABLE IF NOT EXISTS eeg_gaps (
+               session_id INTEGER NOT NULL,
+               start_sample INTEGER NOT NULL,
+               end_sample INTEGER NOT NULL,
+               PRIMARY KEY (session_id, start_sample)
+           ) WITHOUT ROWID''',
+    ]
+
+
+def deleted_sidecar_statements():
+    """Table of sidecar files whose recordings were deleted, unlinked once the deletion commits"""
+    return [
+        '''CREATE TABLE IF NOT EXISTS deleted_sidecars (
+               file_path TEXT PRIMARY KEY
+           )''',
+    ]
+
+
+def session_features_statements():
+    """Spectral features per session and analysis parameters, dropped whenever a session's EEG changes"""
+    return [
+        '''CREATE TABLE IF NOT EXISTS session_features (
+               session_id INTEGER,
+               params_hash TEXT,
+               sampling_rate FLOAT,
+               nperseg INTEGER,
+               noverlap INTEGER,
+               delta FLOAT,
+               theta FLOAT,
+               alpha FLOAT,
+               beta FLOAT,
+               gamma FLOAT,
+               focus_score FLOAT,
+               relaxation_score FLOAT,
+               clarity_score FLOAT,
+               psd BLOB,
+               computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               PRIMARY KEY (session_id, params_hash),
+               FOREIGN KEY (session_id) REFERENCES sessions (id)
+           )''',
+    ] + eeg_invalidation_triggers('features', ['session_features'])
+
+
+# Write counters for cache keys: each name is bumped by triggers on the
+# tables it covers, so a cache can tell that something it read changed,
+# including edits that keep row counts and ids the same.
+# (name, table, events)
+DATA_VERSION_TRIGGERS = [
+    *(('data', table, ('INSERT', 'UPDATE', 'DELETE'))
+      for table in ('users', 'sessions', 'lifestyle_context', 'journal_entries', 'diet_log')),
+    # Whether a session has EEG, but not the n_samples updates of every chunk written
+    ('data', 'eeg_recordings', ('INSERT', 'DELETE')),
+    ('features', 'session_features', ('INSERT', 'UPDATE', 'DELETE')),
+    ('eeg', 'eeg_recordings', ('INSERT', 'UPDATE', 'DELETE')),
+]
+
+
+def data_version_statements():
+    """Table of write counters and the triggers bumping them"""
+    names = dict.fromkeys(name for name, _, _ in DATA_VERSION_TRIGGERS)
+    statements = [
+        '''CREATE TABLE IF NOT EXISTS data_versions (
+               name TEXT PRIMARY KEY,
+               version INTEGER NOT NULL DEFAULT 0
+           ) WITHOUT ROWID''',
+        'INSERT OR IGNORE INTO data_versions (name) VALUES ' + ', '.join(f"('{name}')" for name in names),
+    ]
+    for name, table, events in DATA_VERSION_TRIGGERS:
+        for event in events:
+            statements.append(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_bump_{name}_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE name = '{name}';
+                END
+            ''')
+    return statements
+
+
+# Schema migrations, applied in order. The version of a database is kept in
+# PRAGMA user_version, so each migration runs exactly once per database.
+# Steps are SQL statements, or functions of the connection for checks SQL
+# cannot express.
+# Append new migrations to the end of the list; never edit or reorder ones
+# that have been released.
+MIGRATIONS = [
+    (1, "Index EEG rows and sessions by their lookup keys", [
+        # load_eeg_data: WHERE session_id = ? [AND timestamp range] ORDER BY timestamp,
+        # answered from the index alone
+        '''CREATE INDEX IF NOT EXISTS idx_eeg_data_session_time
+           ON eeg_data (session_id, timestamp, channel1, channel2)''',
+        # Dashboard: WHERE user_id = ? AND timestamp range ORDER BY timestamp
+        '''CREATE INDEX IF NOT EXISTS idx_sessions_user_time
+           ON sessions (user_id, timestamp)''',
+    ]),
+    (2, "Index per-session context tables for joins on session_id", [
+        'CREATE INDEX IF NOT EXISTS idx_lifestyle_context_session ON lifestyle_context (session_id)',
+        'CREATE INDEX IF NOT EXISTS idx_journal_entries_session ON journal_entries (session_id)',
+        'CREATE INDEX IF NOT EXISTS idx_diet_log_session ON diet_log (session_id)',
+    ]),
+    (3, "Store session and EEG timestamps as integer epoch microseconds", epoch_us_statements()),
+    (4, "Add hourly, daily and activity rollups of session scores", rollup_schema_statements()),
+    (5, "Store per-session signal quality and bad EEG intervals", signal_quality_statements()),
+    (6, "Store min/max pyramids for browsing raw EEG", eeg_pyramid_statements()),
+    (7, "Checkpoint sessions migrated from CSV and JSON archives", migration_checkpoint_statements()),
+    (8, "Record sample ranges filled in for frames lost while streaming", eeg_gap_statements()),
+    (9, "Queue sidecar files of deleted recordings for removal after commit", deleted_sidecar_statements()),
+    (10, "Cache spectral features per session and analysis parameters", session_features_statements()),
+    (11, "Count writes per kind of data to key dashboard caches", data_version_statements()),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    """Return the schema version recorded in the database"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """
+    Apply the migrations a database has not seen yet, each in its own transaction
+
+    Safe to call on every start: an up-to-date database only costs one
+    PRAGMA read.
+
+    Args:
+        conn: Open database connection
+        target (int): Version to migrate up to
+
+    Returns:
+        list: Versions that were applied
+    """
+    applied = []
+    current = schema_version(conn)
+    for version, description, statements in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have migrated while we waited for the lock
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+
+    return applied
+
+
+def run_migrations(db_path=None):
+    """
+    Bring a database file up to the latest schema version
+
+    Args:
+        db_path (str): Path to the SQLite database
+
+    Returns:
+        list: Versions that were applied
+    """
+    conn = connect(db_path)
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    applied = run_migrations()
+    if applied:
+        print(f"Applied migrations: {', '.join(map(str, applied))}")
+    print(f"Schema is at version {LATEST_VERSION}")
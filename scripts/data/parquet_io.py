@@ -0,0 +1,263 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from scripts.data.connection import connect
+from scripts.data.eeg_store import SAMPLE_DTYPE, read_eeg_array, remove_deleted_sidecars, write_eeg
+from scripts.data.rollups import rebuild_rollups
+from scripts.data.timestamps import from_epoch_us
+
+# Sessions, their context, journal and diet rows and their EEG are exported
+# as Parquet, one directory per table and hive-style partitions per user and
+# month of the session, e.g. sessions/user_id=1/month=2024-03/part-0.parquet.
+# The partition keys are not repeated inside the files, so pd.read_parquet
+# or pyarrow.dataset on a table directory adds them back as columns. EEG is
+# one row per sample with float32 channels; eeg_recordings holds each
+# session's start time and sampling rate.
+SESSION_TABLES = ['sessions', 'lifestyle_context', 'journal_entries', 'diet_log']
+
+# Low-cardinality text columns written as dictionary-encoded categoricals
+CATEGORICAL_COLUMNS = {
+    'lifestyle_context': ['last_meal_type', 'meal_size', 'exercise_type', 'activity_type'],
+    'journal_entries': ['mood'],
+    'diet_log': ['meal_type'],
+}
+
+# Columns holding epoch microseconds, written as timestamps
+EPOCH_US_COLUMNS = {
+    'sessions': ['timestamp'],
+    'eeg_recordings': ['start_time'],
+}
+
+PART_FILE = 'part-0.parquet'
+
+
+def partition_dir(root, table, user_id, month):
+    return Path(root) / table / f'user_id={user_id}' / f'month={month}'
+
+
+def _month_bounds(month):
+    """Epoch microseconds of the start of a 'YYYY-MM' month and of the next one"""
+    start = pd.Timestamp(f'{month}-01')
+    return start.value // 1000, (start + pd.offsets.MonthBegin(1)).value // 1000
+
+
+def _to_arrow(df, table):
+    """Typed Arrow table of a frame read from SQLite"""
+    df = df.copy()
+    for column in EPOCH_US_COLUMNS.get(table, []):
+        df[column] = from_epoch_us(df[column])
+    for column in CATEGORICAL_COLUMNS.get(table, []):
+        df[column] = df[column].astype('category')
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _write(table, path, **options):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, path, coerce_timestamps='us', allow_truncated_timestamps=True, **options)
+
+
+def _eeg_table(session_ids, conn):
+    """One row per sample of the given sessions, with float32 channels"""
+    parts = []
+    for session_id in session_ids:
+        _, samples = read_eeg_array(conn, session_id)
+        if samples is None:
+            continue
+        n_samples = samples.shape[1]
+        parts.append(pa.table({
+            'session_id': pa.array(np.full(n_samples, session_id, dtype=np.int64)),
+            'sample_index': pa.array(np.arange(n_samples, dtype=np.int32)),
+            'channel1': pa.array(np.asarray(samples[0], dtype=SAMPLE_DTYPE)),
+            'channel2': pa.array(np.asarray(samples[1], dtype=SAMPLE_DTYPE)),
+        }))
+    return pa.concat_tables(parts) if parts else None
+
+
+def export_parquet(output_dir, db_path=None, user_ids=None, eeg=True):
+    """
+    Export users, sessions, context, journal, diet and EEG to partitioned Parquet
+
+    Partitions are written one user and month at a time, so memory use is
+    bounded by the largest partition. Re-exporting overwrites the files of
+    the partitions it writes.
+
+    Args:
+        output_dir (str): Directory to write the tables to
+        db_path (str): Path to the SQLite database
+        user_ids (list): Only export these users; all if None
+        eeg (bool): Also export EEG samples
+
+    Returns:
+        dict: Number of rows written per table
+    """
+    conn = connect(db_path)
+    counts = dict.fromkeys(['users', *SESSION_TABLES, *(['eeg_recordings', 'eeg'] if eeg else [])], 0)
+    try:
+        user_filter, users_filter, params = '', '', []
+        if user_ids:
+            placeholders = ', '.join('?' * len(user_ids))
+            user_filter, users_filter = f'WHERE user_id IN ({placeholders})', f'WHERE id IN ({placeholders})'
+            params = [int(user_id) for user_id in user_ids]
+
+        users = pd.read_sql_query(f'SELECT * FROM users {users_filter}', conn, params=params)
+        _write(pa.Table.from_pandas(users, preserve_index=False), Path(output_dir) / 'users' / PART_FILE)
+        counts['users'] = len(users)
+
+        partitions = conn.execute(f'''
+            SELECT DISTINCT user_id, strftime('%Y-%m', timestamp / 1000000, 'unixepoch') AS month
+            FROM sessions {user_filter}
+            ORDER BY user_id, month
+        ''', params).fetchall()
+
+        for user_id, month in partitions:
+            if user_id is None or month is None:
+                continue
+            start, end = _month_bounds(month)
+            in_partition = 's.user_id = ? AND s.timestamp >= ? AND s.timestamp < ?'
+            partition_params = (user_id, start, end)
+
+            for table in SESSION_TABLES:
+                if table == 'sessions':
+                    query = f'SELECT s.* FROM sessions s WHERE {in_partition} ORDER BY s.id'
+                else:
+                    query = f'''
+                        SELECT t.* FROM {table} t JOIN sessions s ON s.id = t.session_id
+                        WHERE {in_partition} ORDER BY t.id
+                    '''
+                df = pd.read_sql_query(query, conn, params=partition_params)
+                if table == 'sessions':
+                    df = df.drop(columns='user_id')
+                if not df.empty:
+                    _write(_to_arrow(df, table), partition_dir(output_dir, table, user_id, month) / PART_FILE)
+                    counts[table] += len(df)
+
+            if not eeg:
+                continue
+            recordings = pd.read_sql_query(f'''
+                SELECT r.session_id, r.start_time, r.sample_rate, r.n_samples
+                FROM eeg_recordings r JOIN sessions s ON s.id = r.session_id
+                WHERE {in_partition} AND r.n_samples > 0
+                ORDER BY r.session_id
+            ''', conn, params=partition_params)
+            samples = _eeg_table(recordings['session_id'].tolist(), conn)
+            if samples is not None:
+                _write(_to_arrow(recordings, 'eeg_recordings'),
+                       partition_dir(output_dir, 'eeg_recordings', user_id, month) / PART_FILE)
+                # IDs and sample indexes are runs and counters; delta encoding makes them nearly free
+                _write(samples, partition_dir(output_dir, 'eeg', user_id, month) / PART_FILE, use_dictionary=False,
+                       column_encoding={'session_id': 'DELTA_BINARY_PACKED', 'sample_index': 'DELTA_BINARY_PACKED'})
+                counts['eeg_recordings'] += len(recordings)
+                counts['eeg'] += samples.num_rows
+    finally:
+        conn.close()
+    return counts
+
+
+def _partitions(input_dir, table):
+    """(user_id, month, path) of every partition file of a table"""
+    for path in sorted((Path(input_dir) / table).glob(f'user_id=*/month=*/{PART_FILE}')):
+        user_id = int(path.parent.parent.name.split('=', 1)[1])
+        yield user_id, path.parent.name.split('=', 1)[1], path
+
+
+def _rows(df):
+    """Plain Python rows of a frame read from Parquet, with None for missing values"""
+    df = df.copy()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].astype('datetime64[us]').astype('int64').where(df[column].notna())
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def _session_samples(samples):
+    """Split an EEG table into (session_id, channel1, channel2) per session, in sample order"""
+    session_ids = samples['session_id'].to_numpy()
+    sample_index = samples['sample_index'].to_numpy()
+    channels = [samples[name].to_numpy() for name in ('channel1', 'channel2')]
+    # Exports are written in order; only files rewritten by other tools need sorting
+    if np.any(np.diff(session_ids) < 0) or np.any((np.diff(sample_index) != 1) & (np.diff(session_ids) == 0)):
+        order = np.lexsort((sample_index, session_ids))
+        session_ids, channels = session_ids[order], [channel[order] for channel in channels]
+    starts = np.flatnonzero(np.r_[True, session_ids[1:] != session_ids[:-1]])
+    for start, end in zip(starts, np.r_[starts[1:], len(session_ids)]):
+        yield int(session_ids[start]), channels[0][start:end], channels[1][start:end]
+
+
+def _insert(conn, table, df):
+    """Insert or replace the rows of a frame, keeping only the table's columns"""
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    df = df[[column for column in df.columns if column in existing]]
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {table} ({', '.join(df.columns)}) VALUES ({', '.join('?' * len(df.columns))})",
+        _rows(df)
+    )
+    return len(df)
+
+
+def import_parquet(input_dir, db_path=None, eeg=True):
+    """
+    Load a directory written by export_parquet into a database
+
+    Rows keep their IDs and replace existing rows with the same ID, so
+    importing the same export twice is harmless. Each user and month is
+    loaded in one transaction; rollups are rebuilt at the end.
+
+    Args:
+        input_dir (str): Directory written by export_parquet
+        db_path (str): Path to the SQLite database; created if missing
+        eeg (bool): Also import EEG samples
+
+    Returns:
+        dict: Number of rows read per table
+    """
+    from scripts.init_db import create_database
+    create_database(db_path)
+
+    conn = connect(db_path)
+    counts = dict.fromkeys(['users', *SESSION_TABLES, *(['eeg_recordings', 'eeg'] if eeg else [])], 0)
+    try:
+        users_path = Path(input_dir) / 'users' / PART_FILE
+        if users_path.exists():
+            with conn:
+                counts['users'] = _insert(conn, 'users', pq.read_table(users_path).to_pandas())
+
+        for table in SESSION_TABLES:
+            for user_id, _, path in _partitions(input_dir, table):
+                df = pq.read_table(path).to_pandas()
+                if table == 'sessions':
+                    df.insert(1, 'user_id', user_id)
+                with conn:
+                    counts[table] += _insert(conn, table, df)
+
+        if eeg:
+            for user_id, month, path in _partitions(input_dir, 'eeg_recordings'):
+                recordings = pq.read_table(path).to_pandas().set_index('session_id')
+                samples = pq.read_table(partition_dir(input_dir, 'eeg', user_id, month) / PART_FILE)
+                with conn:
+                    cursor = conn.cursor()
+                    for session_id, channel1, channel2 in _session_samples(samples):
+                        if session_id not in recordings.index:
+                            continue
+                        recording = recordings.loc[session_id]
+                        write_eeg(cursor, session_id, channel1, channel2,
+                                  recording['start_time'], recording['sample_rate'])
+                        counts['eeg_recordings'] += 1
+                        counts['eeg'] += len(channel1)
+            # Sidecar files of the recordings replaced above
+            remove_deleted_sidecars(conn)
+
+        with conn:
+            rebuild_rollups(conn)
+    finally:
+        conn.close()
+    return counts
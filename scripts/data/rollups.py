@@ -0,0 +1,247 @@
+import argparse
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from scripts.data.connection import connect, get_connection
+from scripts.data.instrumentation import span
+from scripts.data.timestamps import from_epoch_us, hour_of_day_sql, to_epoch_us
+
+# Rollups hold running sums and counts of the self-reported scores per user
+# and hour of day, day, or activity and hour. SessionLogger adds each new
+# session in the same transaction that stores it, so charts read a few
+# dozen rows however long the history is. Means are sum / count, with
+# separate counts per score because any of them may be missing.
+
+US_PER_DAY = 86400 * 1000000
+
+# Summed scores and the column each one is read from. A session counts once
+# however many side rows it has: context comes from its latest
+# lifestyle_context row and productivity is the mean over its journal entries.
+MEASURES = {
+    'focus_score': 'lc.focus_score',
+    'mental_clarity': 'lc.mental_clarity',
+    'mood_score': 'lc.mood_score',
+    'productivity_score': '(SELECT AVG(productivity_score) FROM journal_entries WHERE session_id = s.id)',
+}
+
+HOUR_SQL = hour_of_day_sql('lc.time_of_day')
+
+# Rollup tables and their keys besides user_id: (name, type, expression)
+ROLLUPS = {
+    'rollup_hourly': [('hour', 'INTEGER', HOUR_SQL)],
+    'rollup_daily': [('day', 'INTEGER', f's.timestamp - s.timestamp % {US_PER_DAY}')],
+    'rollup_activity_hourly': [('activity_type', 'TEXT', 'lc.activity_type'), ('hour', 'INTEGER', HOUR_SQL)],
+}
+
+# Join condition picking a session's latest lifestyle_context row; the raw
+# paths of analyze_patterns use it too, so they agree with the rollups
+LATEST_CONTEXT = 'lc.id = (SELECT MAX(id) FROM lifestyle_context WHERE session_id = s.id)'
+
+SOURCE = f'''
+FROM sessions s
+LEFT JOIN lifestyle_context lc ON {LATEST_CONTEXT}
+'''
+
+
+def _columns(table):
+    """Key columns and summed columns of a rollup table"""
+    keys = ['user_id'] + [name for name, _, _ in ROLLUPS[table]]
+    values = ['sessions'] + [f'{measure}_{part}' for measure in MEASURES for part in ('sum', 'count')]
+    return keys, values
+
+
+def _aggregate_select(table, where='1'):
+    """SELECT summing the sessions matching where into rows of a rollup table"""
+    key_exprs = ['s.user_id'] + [expr for _, _, expr in ROLLUPS[table]]
+    measures = ', '.join(f'TOTAL({expr}), COUNT({expr})' for expr in MEASURES.values())
+    return f'''
+        SELECT {', '.join(key_exprs)}, COUNT(DISTINCT s.id), {measures}
+        {SOURCE}
+        WHERE ({where}) AND {' AND '.join(f'({expr}) IS NOT NULL' for expr in key_exprs)}
+        GROUP BY {', '.join(str(i + 1) for i in range(len(key_exprs)))}
+    '''
+
+
+def rollup_schema_statements():
+    """Create the rollup tables and fill them from the sessions already stored"""
+    statements = []
+    for table, keys in ROLLUPS.items():
+        key_columns, _ = _columns(table)
+        key_defs = ''.join(f'{name} {type_} NOT NULL, ' for name, type_, _ in keys)
+        measure_defs = ''.join(
+            f'{measure}_sum REAL NOT NULL DEFAULT 0, {measure}_count INTEGER NOT NULL DEFAULT 0, '
+            for measure in MEASURES
+        )
+        statements.append(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                user_id INTEGER NOT NULL, {key_defs}
+                sessions INTEGER NOT NULL DEFAULT 0, {measure_defs}
+                PRIMARY KEY ({', '.join(key_columns)})
+            ) WITHOUT ROWID
+        ''')
+        statements.append(f'DELETE FROM {table}')
+        statements.append(_rebuild_statement(table))
+    return statements
+
+
+def _rebuild_statement(table):
+    keys, values = _columns(table)
+    return f"INSERT INTO {table} ({', '.join(keys + values)}) {_aggregate_select(table)}"
+
+
+def update_rollups(cursor, session_id):
+    """
+    Add a newly stored session to every rollup
+
+    Call once per session after its context and journal entry are
+    stored, inside the same transaction.
+
+    Args:
+        cursor: Database cursor of the transaction storing the session
+        session_id (int): ID of the session
+    """
+    for table in ROLLUPS:
+        keys, values = _columns(table)
+        cursor.execute(f'''
+            INSERT INTO {table} ({', '.join(keys + values)})
+            {_aggregate_select(table, 's.id = ?')}
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+            {', '.join(f'{column} = {column} + excluded.{column}' for column in values)}
+        ''', (session_id,))
+
+
+def rebuild_rollups(conn):
+    """
+    Recompute every rollup from the raw tables; the caller commits
+
+    Needed after sessions are written, changed or deleted without
+    SessionLogger, e.g. by seed_data or migrate_data.
+
+    Returns:
+        dict: Number of rows per rollup table
+    """
+    counts = {}
+    for table in ROLLUPS:
+        conn.execute(f'DELETE FROM {table}')
+        conn.execute(_rebuild_statement(table))
+        counts[table] = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    return counts
+
+
+def _stats(table, group_by, user_id=None, where='1', params=(), db_path=None):
+    """Mean scores and session counts of a rollup table, grouped by (alias, expression) pairs"""
+    keys = ', '.join(f'{expr} AS {alias}' for alias, expr in group_by)
+    means = ', '.join(
+        f'SUM({measure}_sum) / NULLIF(SUM({measure}_count), 0) AS {measure}' for measure in MEASURES
+    )
+    if user_id is not None:
+        where += ' AND user_id = ?'
+        params = (*params, int(user_id))
+    query = f'''
+        SELECT {keys}, SUM(sessions) AS sessions, {means}
+        FROM {table}
+        WHERE {where}
+        GROUP BY {', '.join(str(i + 1) for i in range(len(group_by)))}
+        ORDER BY {', '.join(str(i + 1) for i in range(len(group_by)))}
+    '''
+    with span(f'sql.{table}'):
+        return pd.read_sql_query(query, get_connection(db_path), params=params)
+
+
+def hourly_stats(user_id=None, db_path=None):
+    """
+    Mean focus, clarity, mood and productivity per hour of day
+
+    Args:
+        user_id (int): Only this user's sessions; all users if None
+        db_path (str): Path to the SQLite database
+
+    Returns:
+        pd.DataFrame: hour, sessions and one mean column per score
+    """
+    return _stats('rollup_hourly', [('hour', 'hour')], user_id, db_path=db_path)
+
+
+def activity_hourly_stats(user_id=None, db_path=None):
+    """
+    Mean scores per activity type and hour of day
+
+    Args:
+        user_id (int): Only this user's sessions; all users if None
+        db_path (str): Path to the SQLite database
+
+    Returns:
+        pd.DataFrame: activity_type, hour, sessions and one mean column per score
+    """
+    return _stats('rollup_activity_hourly', [('activity_type', 'activity_type'), ('hour', 'hour')],
+                  user_id, db_path=db_path)
+
+
+def _day_range(start, end):
+    """WHERE clause and parameters for days in [start, end)"""
+    where, params = '1', []
+    if start is not None:
+        where += ' AND day >= ?'
+        params.append(to_epoch_us(start))
+    if end is not None:
+        where += ' AND day < ?'
+        params.append(to_epoch_us(end))
+    return where, params
+
+
+def daily_stats(user_id=None, start=None, end=None, db_path=None):
+    """
+    Mean scores per calendar day
+
+    Args:
+        user_id (int): Only this user's sessions; all users if None
+        start: First day to include; see to_epoch_us
+        end: Day after the last one to include
+        db_path (str): Path to the SQLite database
+
+    Returns:
+        pd.DataFrame: day, sessions and one mean column per score
+    """
+    where, params = _day_range(start, end)
+    daily = _stats('rollup_daily', [('day', 'day')], user_id, where, params, db_path)
+    daily['day'] = from_epoch_us(daily['day'])
+    return daily
+
+
+def weekday_stats(user_id=None, start=None, end=None, db_path=None):
+    """
+    Mean scores per day of the week, Monday = 0 as in pandas
+
+    Args:
+        user_id (int): Only this user's sessions; all users if None
+        start: First day to include; see to_epoch_us
+        end: Day after the last one to include
+        db_path (str): Path to the SQLite database
+
+    Returns:
+        pd.DataFrame: weekday, sessions and one mean column per score
+    """
+    weekday = "(CAST(strftime('%w', day / 1000000, 'unixepoch') AS INTEGER) + 6) % 7"
+    where, params = _day_range(start, end)
+    return _stats('rollup_daily', [('weekday', weekday)], user_id, where, params, db_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the hourly, daily and activity rollup tables")
+    parser.add_argument('command', choices=['rebuild'], help="'rebuild' recomputes all rollups from raw rows")
+    parser.add_argument('--db', help="Path to the SQLite database (default: $NEUROTRACK_DB_PATH or data/neurotrack.db)")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        with conn:
+            counts = rebuild_rollups(conn)
+    finally:
+        conn.close()
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
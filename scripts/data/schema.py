@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Column types of the analytical frames read from the session tables. The
+# choice columns are categoricals whose categories are the values allowed by
+# the CHECK constraints in init_db, which are built from the same CHOICES,
+# so frames of different users share one set of codes. Other repeated text
+# columns are categoricals over the values present. Categories are sorted,
+# so sorting or grouping by them orders rows as ORDER BY does on the text.
+# Scores are int8 and counts int16, both falling back to float32 when a
+# LEFT JOIN leaves gaps (NumPy integers have no missing value); measures
+# are float32.
+CHOICES = {
+    'last_meal_type': ('balanced', 'high-protein', 'high-carb', 'light', 'skip'),
+    'meal_size': ('small', 'medium', 'large'),
+    'activity_type': ('deep_work', 'creative', 'learning', 'rest', 'other'),
+    'meal_type': ('breakfast', 'lunch', 'dinner', 'snack'),
+    'storage': ('chunks', 'sidecar'),
+    'status': ('recording', 'complete'),
+}
+
+CATEGORIES = {
+    **{column: pd.CategoricalDtype(sorted(CHOICES[column])) for column in
+       ('last_meal_type', 'meal_size', 'activity_type', 'meal_type')},
+    'diet_meal_type': pd.CategoricalDtype(sorted(CHOICES['meal_type'])),
+    'exercise_type': None,
+    'time_of_day': None,
+    'mood': None,
+    'user_name': None,
+}
+
+SCORE_COLUMNS = [
+    'sleep_quality', 'meal_quality', 'hydration_level', 'mood_score', 'focus_score',
+    'mental_clarity', 'energy_level', 'stress_level', 'productivity_score', 'hour',
+]
+COUNT_COLUMNS = ['caffeine_intake', 'exercise_duration_mins', 'calories']
+MEASURE_COLUMNS = ['sleep_hours', 'hours_since_meal', 'protein', 'carbs', 'fats', 'fiber', 'sugar']
+
+INTEGER_DTYPES = {
+    **dict.fromkeys(SCORE_COLUMNS, np.int8),
+    **dict.fromkeys(COUNT_COLUMNS, np.int16),
+}
+
+
+def check_in(column):
+    """CHECK constraint limiting a column to its CHOICES"""
+    values = ', '.join(f"'{value}'" for value in CHOICES[column])
+    return f'CHECK({column} IN ({values}))'
+
+
+def typed_column(name, values):
+    """A column converted to the type declared for its name, or unchanged if none is"""
+    if name in CATEGORIES:
+        return values.astype(CATEGORIES[name] or 'category')
+    if name in INTEGER_DTYPES:
+        return values.astype(np.float32 if values.isna().any() else INTEGER_DTYPES[name])
+    if name in MEASURE_COLUMNS:
+        return values.astype(np.float32)
+    return values
+
+
+def apply_schema(df):
+    """
+    Convert the columns of a frame to their declared types, in place
+
+    Columns are converted by position, so frames of joins repeating a
+    column name (e.g. SELECT s.*, lc.*) are handled too.
+
+    Returns:
+        pd.DataFrame: The same frame
+    """
+    for position, name in enumerate(df.columns):
+        df.isetitem(position, typed_column(name, df.iloc[:, position]))
+    return df
+
+
+def read_frame(query, conn, params=None):
+    """Run a query with pd.read_sql_query and apply the declared column types"""
+    return apply_schema(pd.read_sql_query(query, conn, params=params))
+
+
+def absolute_paths(paths, root):
+    """
+    Resolve paths relative to a root directory, leaving absolute and missing ones alone
+
+    Vectorized equivalent of applying str(Path(root) / path) to each value.
+    """
+    paths = paths.astype(object)
+    relative = paths.notna() & ~paths.str.match(r'([A-Za-z]:)?[\\/]', na=False)
+    result = paths.where(paths.notna(), None)
+    result[relative] = os.path.join(str(root), '') + paths[relative]
+    return result
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from scripts.data.instrumentation import timed
+
+# Timestamps are stored as integer microseconds since the Unix epoch. Naive
+# datetimes keep their wall-clock time (they are treated as UTC both ways),
+# so a value reads back exactly as it was written. Integers compare and
+# index like any other number, so time-range predicates can use an index.
+
+
+def to_epoch_us(value):
+    """
+    Convert a datetime, date, string, np.datetime64 or pd.Timestamp to epoch microseconds
+
+    Integers are assumed to be epoch microseconds already and None stays None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return pd.Timestamp(value).value // 1000
+
+
+@timed('timestamps.from_epoch_us')
+def from_epoch_us(values):
+    """Convert epoch microseconds (a scalar, array or Series) to datetimes in one vectorized call"""
+    return pd.to_datetime(values, unit='us')
+
+
+def epoch_us_sql(column):
+    """
+    SQL expression converting a text timestamp column to epoch microseconds
+
+    Handles the formats sqlite3 and CURRENT_TIMESTAMP write, with or
+    without fractional seconds. Used by the migration that converts text
+    timestamps and by the triggers that normalize text inserted later.
+    Text it cannot parse gives NULL, so callers check for it first with
+    unparseable_timestamp_sql.
+    """
+    return (
+        f"CAST(strftime('%s', {column}) AS INTEGER) * 1000000 + "
+        f"CASE WHEN substr({column}, 20, 1) = '.' "
+        f"THEN CAST(ROUND(CAST('0' || substr({column}, 20) AS REAL) * 1000000) AS INTEGER) "
+        f"ELSE 0 END"
+    )
+
+
+def unparseable_timestamp_sql(column):
+    """SQL condition true for text in a timestamp column that epoch_us_sql cannot convert"""
+    return f"typeof({column}) = 'text' AND strftime('%s', {column}) IS NULL"
+
+
+def hour_of_day_sql(column):
+    """SQL expression for the hour of an 'H:MM' or 'HH:MM' text column, NULL if it has no hour"""
+    return (
+        f"CASE WHEN instr({column}, ':') > 1 "
+        f"THEN CAST(substr({column}, 1, instr({column}, ':') - 1) AS INTEGER) END"
+    )
@@ -1,13 +1,29 @@
-import sqlite3
 import os
+import sys
 from pathlib import Path
 
-def create_database():
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.data.connection import connect, resolve_db_path
+from scripts.data.migrations import migrate
+from scripts.data.schema import check_in
+
+def add_missing_columns(cursor, table, columns):
+    """Add columns that were introduced after a table was first created"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+def create_database(db_path=None):
     # Create data directory if it doesn't exist
-    Path("data").mkdir(exist_ok=True)
+    db_path = resolve_db_path(db_path)
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
     
     # Connect to SQLite database (creates it if it doesn't exist)
-    conn = sqlite3.connect('data/neurotrack.db')
+    conn = connect(db_path)
     cursor = conn.cursor()
 
     # Create users table
@@ -26,11 +42,17 @@ def create_database():
         user_id INTEGER,
         timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         notes TEXT,
+        eeg_file_path TEXT,
+        context_file_path TEXT,
         FOREIGN KEY (user_id) REFERENCES users (id)
     )
     ''')
+    add_missing_columns(cursor, 'sessions', {
+        'eeg_file_path': 'TEXT',
+        'context_file_path': 'TEXT'
+    })
 
-    # Create eeg_data table
+    # Create eeg_data table (legacy one-row-per-sample storage, see eeg_chunks)
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS eeg_data (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -42,16 +64,46 @@ def create_database():
     )
     ''')
 
-    # Create lifestyle_context table with enhanced diet tracking
+    # Create eeg_recordings table holding the start time and sampling rate of each session's EEG
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS eeg_recordings (
+        session_id INTEGER PRIMARY KEY,
+        start_time TIMESTAMP,
+        sample_rate FLOAT,
+        n_samples INTEGER DEFAULT 0,
+        storage TEXT DEFAULT 'chunks' {check_in('storage')},
+        status TEXT DEFAULT 'complete' {check_in('status')},
+        FOREIGN KEY (session_id) REFERENCES sessions (id)
+    )
+    ''')
+    add_missing_columns(cursor, 'eeg_recordings', {
+        'storage': f"TEXT DEFAULT 'chunks' {check_in('storage')}",
+        'status': f"TEXT DEFAULT 'complete' {check_in('status')}"
+    })
+
+    # Create eeg_chunks table storing samples as fixed-size float32 arrays per channel
     cursor.execute('''
+    CREATE TABLE IF NOT EXISTS eeg_chunks (
+        session_id INTEGER,
+        chunk_index INTEGER,
+        n_samples INTEGER,
+        channel1 BLOB,
+        channel2 BLOB,
+        PRIMARY KEY (session_id, chunk_index),
+        FOREIGN KEY (session_id) REFERENCES sessions (id)
+    )
+    ''')
+
+    # Create lifestyle_context table with enhanced diet tracking
+    cursor.execute(f'''
     CREATE TABLE IF NOT EXISTS lifestyle_context (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         session_id INTEGER,
         sleep_hours FLOAT,
         sleep_quality INTEGER CHECK(sleep_quality BETWEEN 1 AND 5),
-        last_meal_type TEXT CHECK(last_meal_type IN ('balanced', 'high-protein', 'high-carb', 'light', 'skip')),
+        last_meal_type TEXT {check_in('last_meal_type')},
         hours_since_meal FLOAT,
-        meal_size TEXT CHECK(meal_size IN ('small', 'medium', 'large')),
+        meal_size TEXT {check_in('meal_size')},
         meal_quality INTEGER CHECK(meal_quality BETWEEN 1 AND 5),
         hydration_level INTEGER CHECK(hydration_level BETWEEN 1 AND 5),
         caffeine_intake INTEGER,
@@ -60,7 +112,7 @@ def create_database():
         mood_score INTEGER CHECK(mood_score BETWEEN 1 AND 5),
         focus_score INTEGER CHECK(focus_score BETWEEN 1 AND 5),
         mental_clarity INTEGER CHECK(mental_clarity BETWEEN 1 AND 5),
-        activity_type TEXT CHECK(activity_type IN ('deep_work', 'creative', 'learning', 'rest', 'other')),
+        activity_type TEXT {check_in('activity_type')},
         time_of_day TEXT,
         FOREIGN KEY (session_id) REFERENCES sessions (id)
     )
@@ -83,12 +135,12 @@ def create_database():
     ''')
 
     # Create diet_log table for detailed meal tracking
-    cursor.execute('''
+    cursor.execute(f'''
     CREATE TABLE IF NOT EXISTS diet_log (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         session_id INTEGER,
         timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        meal_type TEXT CHECK(meal_type IN ('breakfast', 'lunch', 'dinner', 'snack')),
+        meal_type TEXT {check_in('meal_type')},
         food_items TEXT,
         calories INTEGER,
         protein FLOAT,
@@ -102,6 +154,9 @@ def create_database():
     ''')
 
     conn.commit()
+
+    # Indexes and later schema changes are versioned migrations
+    migrate(conn)
     conn.close()
 
 if __name__ == "__main__":
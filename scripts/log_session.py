@@ -1,22 +1,53 @@
-import sqlite3
 import json
 import os
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
+import sys
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.data.connection import connect, connection, get_connection, resolve_db_path
+from scripts.data.instrumentation import timed
+from scripts.data.migrations import run_migrations
+from scripts.data.rollups import update_rollups
+from scripts.data.timestamps import to_epoch_us
+from scripts.data.eeg_store import (
+    CHANNELS, CHUNK_SIZE, DEFAULT_SAMPLE_RATE, SAMPLE_DTYPE, append_chunks, begin_recording,
+    chunks_to_sidecar, finish_recording, read_eeg, read_recording, remove_deleted_sidecars, split_eeg_rows,
+    write_eeg, write_gaps, write_sidecar
+)
 
 class SessionLogger:
-    def __init__(self):
-        self.db_path = 'data/neurotrack.db'
+    def __init__(self, db_path=None, eeg_storage='chunks'):
+        """
+        Args:
+            db_path (str): Path to the SQLite database; the configured database if None
+            eeg_storage (str): 'chunks' to store EEG samples in the database or
+                'sidecar' to write memory-mappable .npy files next to it under eeg/
+        """
+        if eeg_storage not in ('chunks', 'sidecar'):
+            raise ValueError(f"Unknown EEG storage mode: {eeg_storage}")
+        self.db_path = resolve_db_path(db_path)
+        self.eeg_storage = eeg_storage
+        self.eeg_dir = Path(self.db_path).parent / 'eeg'
         self.ensure_db_exists()
 
     def ensure_db_exists(self):
-        """Ensure the database and its directory exist"""
-        Path('data').mkdir(exist_ok=True)
+        """Ensure the database and its directory exist and the schema is up to date"""
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
         if not os.path.exists(self.db_path):
-            from init_db import create_database
-            create_database()
+            from scripts.init_db import create_database
+            create_database(self.db_path)
+        else:
+            run_migrations(self.db_path)
 
-    def log_session(self, user_id, eeg_data=None, context_data=None, journal_entry=None, diet_log=None):
+    @timed('logger.log_session')
+    def log_session(self, user_id, eeg_data=None, context_data=None, journal_entry=None, diet_log=None,
+                    sampling_rate=None):
         """
         Log a new session with EEG data and context
         
@@ -26,109 +57,177 @@ class SessionLogger:
             context_data (dict): Dictionary of lifestyle context data
             journal_entry (dict): Dictionary of journal entry data
             diet_log (dict): Dictionary of diet log data
+            sampling_rate (float): Sampling rate of eeg_data in Hz, inferred from
+                the timestamps if None
             
         Returns:
             int: ID of the created session
         """
-        conn = sqlite3.connect(self.db_path)
+        conn = get_connection(self.db_path)
         cursor = conn.cursor()
+        sidecar = None
         
         try:
             # Create session
             cursor.execute('''
                 INSERT INTO sessions (user_id, timestamp, notes)
                 VALUES (?, ?, ?)
-            ''', (user_id, datetime.now(), "Session logged via SessionLogger"))
+            ''', (user_id, to_epoch_us(datetime.now()), "Session logged via SessionLogger"))
             session_id = cursor.lastrowid
             
             # Store EEG data if provided
-            if eeg_data:
-                cursor.executemany('''
-                    INSERT INTO eeg_data (session_id, timestamp, channel1, channel2)
-                    VALUES (?, ?, ?, ?)
-                ''', [(session_id, ts, ch1, ch2) for ts, ch1, ch2 in eeg_data])
-            
-            # Store context data if provided
-            if context_data:
-                cursor.execute('''
-                    INSERT INTO lifestyle_context (
-                        session_id, sleep_hours, sleep_quality, last_meal_type,
-                        hours_since_meal, meal_size, meal_quality, hydration_level,
-                        caffeine_intake, exercise_type, exercise_duration_mins,
-                        mood_score, focus_score, mental_clarity, activity_type,
-                        time_of_day
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    session_id,
-                    context_data.get('sleep_hours'),
-                    context_data.get('sleep_quality'),
-                    context_data.get('last_meal_type'),
-                    context_data.get('hours_since_meal'),
-                    context_data.get('meal_size'),
-                    context_data.get('meal_quality'),
-                    context_data.get('hydration_level'),
-                    context_data.get('caffeine_intake'),
-                    context_data.get('exercise_type'),
-                    context_data.get('exercise_duration_mins'),
-                    context_data.get('mood_score'),
-                    context_data.get('focus_score'),
-                    context_data.get('mental_clarity'),
-                    context_data.get('activity_type'),
-                    context_data.get('time_of_day')
-                ))
-            
-            # Store journal entry if provided
-            if journal_entry:
-                cursor.execute('''
-                    INSERT INTO journal_entries (
-                        session_id, mood, energy_level, stress_level,
-                        productivity_score, notes, tags
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    session_id,
-                    journal_entry.get('mood'),
-                    journal_entry.get('energy_level'),
-                    journal_entry.get('stress_level'),
-                    journal_entry.get('productivity_score'),
-                    journal_entry.get('notes'),
-                    journal_entry.get('tags')
-                ))
+            if eeg_data is not None and len(eeg_data):
+                start_time, sample_rate, channel1, channel2 = split_eeg_rows(eeg_data, sampling_rate)
+                if self.eeg_storage == 'sidecar':
+                    sidecar = write_sidecar(cursor, session_id, channel1, channel2, start_time, sample_rate,
+                                            self.eeg_dir)
+                else:
+                    write_eeg(cursor, session_id, channel1, channel2, start_time, sample_rate)
             
-            # Store diet log if provided
-            if diet_log:
-                cursor.execute('''
-                    INSERT INTO diet_log (
-                        session_id, meal_type, food_items, calories,
-                        protein, carbs, fats, fiber, sugar, notes
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    session_id,
-                    diet_log.get('meal_type'),
-                    json.dumps(diet_log.get('food_items', [])),
-                    diet_log.get('calories'),
-                    diet_log.get('protein'),
-                    diet_log.get('carbs'),
-                    diet_log.get('fats'),
-                    diet_log.get('fiber'),
-                    diet_log.get('sugar'),
-                    diet_log.get('notes')
-                ))
+            self._store_session_details(cursor, session_id, context_data, journal_entry, diet_log)
             
             conn.commit()
-            return session_id
             
         except Exception as e:
             conn.rollback()
+            if sidecar is not None:
+                # Nothing refers to the file once the session is rolled back
+                Path(sidecar).unlink(missing_ok=True)
             raise e
-        finally:
-            conn.close()
+
+        remove_deleted_sidecars(conn)
+        return session_id
+
+    def open_session(self, user_id, sampling_rate=DEFAULT_SAMPLE_RATE, start_time=None, batch_chunks=16):
+        """
+        Start a session whose EEG samples are streamed in with a SessionWriter
+
+        Args:
+            user_id (int): ID of the user
+            sampling_rate (float): Sampling rate of the samples in Hz
+            start_time (datetime): Time of the first sample; taken from the first
+                reading passed to SessionWriter.extend, or now, if None
+            batch_chunks (int): Number of chunks buffered per write transaction
+
+        Returns:
+            SessionWriter: Writer for the new session
+        """
+        with connection(self.db_path) as conn:
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO sessions (user_id, timestamp, notes)
+                    VALUES (?, ?, ?)
+                ''', (user_id, to_epoch_us(datetime.now()), "Session logged via SessionLogger"))
+                session_id = cursor.lastrowid
+                begin_recording(cursor, session_id, start_time or datetime.now(), sampling_rate)
+
+        return SessionWriter(self, session_id, batch_chunks, set_start_time=start_time is None)
+
+    def resume_session(self, session_id, batch_chunks=16):
+        """
+        Reopen a streamed session that was interrupted before it was closed
+
+        Samples that were committed before the interruption are kept; the
+        writer's n_samples tells the caller where to continue reading from
+        the source.
+
+        Args:
+            session_id (int): ID of the session
+            batch_chunks (int): Number of chunks buffered per write transaction
+
+        Returns:
+            SessionWriter: Writer continuing the session
+        """
+        with connection(self.db_path) as conn:
+            recording = read_recording(conn, session_id)
+
+        if recording is None or recording['status'] != 'recording':
+            raise ValueError(f"Session {session_id} has no recording in progress")
+        return SessionWriter(self, session_id, batch_chunks)
+
+    def incomplete_sessions(self):
+        """Return the IDs of streamed sessions that were never closed"""
+        with connection(self.db_path) as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT session_id FROM eeg_recordings WHERE status = 'recording' ORDER BY session_id"
+            )]
+
+    def _store_session_details(self, cursor, session_id, context_data=None, journal_entry=None, diet_log=None):
+        """Store the context, journal entry and diet log of a session and add it to the rollups"""
+        # Store context data if provided
+        if context_data:
+            cursor.execute('''
+                INSERT INTO lifestyle_context (
+                    session_id, sleep_hours, sleep_quality, last_meal_type,
+                    hours_since_meal, meal_size, meal_quality, hydration_level,
+                    caffeine_intake, exercise_type, exercise_duration_mins,
+                    mood_score, focus_score, mental_clarity, activity_type,
+                    time_of_day
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                session_id,
+                context_data.get('sleep_hours'),
+                context_data.get('sleep_quality'),
+                context_data.get('last_meal_type'),
+                context_data.get('hours_since_meal'),
+                context_data.get('meal_size'),
+                context_data.get('meal_quality'),
+                context_data.get('hydration_level'),
+                context_data.get('caffeine_intake'),
+                context_data.get('exercise_type'),
+                context_data.get('exercise_duration_mins'),
+                context_data.get('mood_score'),
+                context_data.get('focus_score'),
+                context_data.get('mental_clarity'),
+                context_data.get('activity_type'),
+                context_data.get('time_of_day')
+            ))
+
+        # Store journal entry if provided
+        if journal_entry:
+            cursor.execute('''
+                INSERT INTO journal_entries (
+                    session_id, mood, energy_level, stress_level,
+                    productivity_score, notes, tags
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                session_id,
+                journal_entry.get('mood'),
+                journal_entry.get('energy_level'),
+                journal_entry.get('stress_level'),
+                journal_entry.get('productivity_score'),
+                journal_entry.get('notes'),
+                journal_entry.get('tags')
+            ))
+
+        # Store diet log if provided
+        if diet_log:
+            cursor.execute('''
+                INSERT INTO diet_log (
+                    session_id, meal_type, food_items, calories,
+                    protein, carbs, fats, fiber, sugar, notes
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                session_id,
+                diet_log.get('meal_type'),
+                json.dumps(diet_log.get('food_items', [])),
+                diet_log.get('calories'),
+                diet_log.get('protein'),
+                diet_log.get('carbs'),
+                diet_log.get('fats'),
+                diet_log.get('fiber'),
+                diet_log.get('sugar'),
+                diet_log.get('notes')
+            ))
+
+        update_rollups(cursor, session_id)
 
     def get_session_data(self, session_id):
         """Retrieve all data for a specific session"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
+        with connection(self.db_path) as conn:
+            cursor = conn.cursor()
+            
             # Get session info
             cursor.execute('SELECT * FROM sessions WHERE id = ?', (session_id,))
             session = cursor.fetchone()
@@ -136,9 +235,9 @@ class SessionLogger:
             if not session:
                 return None
             
-            # Get EEG data
-            cursor.execute('SELECT * FROM eeg_data WHERE session_id = ?', (session_id,))
-            eeg_data = cursor.fetchall()
+            # Get EEG data as (timestamp, channel1, channel2) readings
+            timestamps, channel1, channel2 = read_eeg(conn, session_id)
+            eeg_data = list(zip(timestamps, channel1, channel2)) if timestamps is not None else []
             
             # Get context data
             cursor.execute('SELECT * FROM lifestyle_context WHERE session_id = ?', (session_id,))
@@ -159,9 +258,159 @@ class SessionLogger:
                 'journal': journal,
                 'diet': diet
             }
-            
+
+class SessionWriter:
+    """
+    Streams the EEG samples of one session into chunk storage
+
+    Samples are buffered until batch_chunks full chunks are available and
+    then committed in one short transaction, so memory use and write locks
+    stay bounded however long the recording is. Committed samples survive
+    a crash and the session can be continued with SessionLogger.resume_session.
+
+    Example:
+        with logger.open_session(user_id=1, sampling_rate=256) as writer:
+            for channel1, channel2 in device.read_blocks():
+                writer.append(channel1, channel2)
+            writer.close(context_data=context)
+    """
+
+    def __init__(self, logger, session_id, batch_chunks=16, set_start_time=False):
+        self.logger = logger
+        self.session_id = session_id
+        self.conn = connect(logger.db_path)
+        recording = read_recording(self.conn, session_id)
+        self.sample_rate = recording['sample_rate']
+        self.n_samples = recording['n_samples']  # samples committed so far
+        self.closed = False
+        self._set_start_time = set_start_time and not self.n_samples
+        self._buffer = np.empty((len(CHANNELS), batch_chunks * CHUNK_SIZE), dtype=SAMPLE_DTYPE)
+        self._buffered = 0
+        self._gaps = []  # filled-in sample ranges not committed yet
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None and not self.closed:
+            self.close()
+        elif not self.closed:
+            # Leave the recording in progress so it can be resumed
+            self.conn.close()
+            self.closed = True
+
+    def append(self, channel1, channel2, padded=0):
+        """
+        Append a block of samples
+
+        Args:
+            channel1 (array-like): Samples of the first channel
+            channel2 (array-like): Samples of the second channel
+            padded (int): Leading samples of the block that were filled in for
+                lost ones rather than recorded; they are stored as a gap
+        """
+        channel1 = np.asarray(channel1, dtype=SAMPLE_DTYPE)
+        channel2 = np.asarray(channel2, dtype=SAMPLE_DTYPE)
+        if len(channel1) != len(channel2):
+            raise ValueError("EEG channels must have the same number of samples")
+        self._set_start_time = False
+        if padded:
+            start = self.n_samples + self._buffered
+            self._gaps.append((start, start + padded))
+
+        offset = 0
+        while offset < len(channel1):
+            count = min(len(channel1) - offset, self._buffer.shape[1] - self._buffered)
+            self._buffer[0, self._buffered:self._buffered + count] = channel1[offset:offset + count]
+            self._buffer[1, self._buffered:self._buffered + count] = channel2[offset:offset + count]
+            self._buffered += count
+            offset += count
+            if self._buffered == self._buffer.shape[1]:
+                self.flush()
+
+    def extend(self, readings):
+        """
+        Append [timestamp, channel1, channel2] readings from any iterable
+
+        The readings are consumed one chunk at a time, so generators over
+        long recordings are never held in memory as a whole.
+
+        Args:
+            readings (iterable): [timestamp, channel1, channel2] readings
+        """
+        readings = iter(readings)
+        while True:
+            batch = list(islice(readings, CHUNK_SIZE))
+            if not batch:
+                break
+            if self._set_start_time:
+                with self.conn:
+                    self.conn.execute(
+                        'UPDATE eeg_recordings SET start_time = ? WHERE session_id = ?',
+                        (to_epoch_us(batch[0][0]), self.session_id)
+                    )
+            self.append([row[1] for row in batch], [row[2] for row in batch])
+
+    def flush(self):
+        """Commit all buffered full chunks"""
+        full = self._buffered - self._buffered % CHUNK_SIZE
+        if not full:
+            return
+
+        with self.conn:
+            cursor = self.conn.cursor()
+            self.n_samples = append_chunks(
+                cursor, self.session_id, self._buffer[:, :full], self.n_samples // CHUNK_SIZE
+            )
+            self._write_gaps(cursor)
+        remainder = self._buffered - full
+        self._buffer[:, :remainder] = self._buffer[:, full:self._buffered]
+        self._buffered = remainder
+
+    def _write_gaps(self, cursor):
+        """Store the gaps, or their parts, that lie within the committed samples"""
+        committed = [(start, min(end, self.n_samples)) for start, end in self._gaps if start < self.n_samples]
+        write_gaps(cursor, self.session_id, committed)
+        self._gaps = [(max(start, self.n_samples), end) for start, end in self._gaps if end > self.n_samples]
+
+    def close(self, context_data=None, journal_entry=None, diet_log=None):
+        """
+        Write the remaining samples and the session's context, then complete it
+
+        Args:
+            context_data (dict): Dictionary of lifestyle context data
+            journal_entry (dict): Dictionary of journal entry data
+            diet_log (dict): Dictionary of diet log data
+
+        Returns:
+            int: ID of the session
+        """
+        if self.closed:
+            return self.session_id
+
+        try:
+            self.flush()
+            with self.conn:
+                cursor = self.conn.cursor()
+                if self._buffered:
+                    self.n_samples = append_chunks(
+                        cursor, self.session_id, self._buffer[:, :self._buffered],
+                        self.n_samples // CHUNK_SIZE
+                    )
+                    self._buffered = 0
+                self._write_gaps(cursor)
+                self.logger._store_session_details(
+                    cursor, self.session_id, context_data, journal_entry, diet_log
+                )
+                finish_recording(cursor, self.session_id)
+
+            if self.logger.eeg_storage == 'sidecar':
+                chunks_to_sidecar(self.conn, self.session_id, self.logger.eeg_dir)
         finally:
-            conn.close()
+            self.conn.close()
+            self.closed = True
+
+        return self.session_id
 
 if __name__ == "__main__":
     # Example usage
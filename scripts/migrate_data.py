@@ -1,96 +1,297 @@
-import sqlite3
 import pandas as pd
 import json
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
 import numpy as np
+import sys
 
-def migrate_data():
-    """Migrate existing data from CSV files to the database"""
-    # Initialize database
-    from init_db import create_database
-    create_database()
-    
-    conn = sqlite3.connect('data/neurotrack.db')
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.data.connection import PROJECT_ROOT, connect
+from scripts.data.eeg_store import CHANNELS, DEFAULT_SAMPLE_RATE, SAMPLE_DTYPE, convert_legacy_rows, write_eeg
+from scripts.data.rollups import rebuild_rollups
+from scripts.data.timestamps import to_epoch_us
+
+# Sessions archived as an EEG CSV and a context JSON file are migrated by a
+# pipeline: worker processes parse the files, reading each CSV in chunks of
+# CSV_CHUNK_ROWS rows with the C parser straight into float32, and this
+# process writes the parsed sessions, committing every BATCH_SESSIONS. Each
+# session is written under a savepoint and recorded in migration_checkpoints,
+# as 'done' or as 'failed' with the error, in the same transaction. A rerun
+# skips sessions that are done, so an interrupted run loses at most one
+# uncommitted batch, and retries the ones that failed.
+CSV_CHUNK_ROWS = 65536
+BATCH_SESSIONS = 50
+PROGRESS_SECONDS = 2.0
+
+CONTEXT_COLUMNS = [
+    'sleep_hours', 'sleep_quality', 'last_meal_type', 'hours_since_meal', 'meal_size',
+    'meal_quality', 'hydration_level', 'caffeine_intake', 'exercise_type',
+    'exercise_duration_mins', 'mood_score', 'focus_score', 'mental_clarity',
+    'activity_type', 'time_of_day',
+]
+
+
+def read_eeg_csv(path, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Parse an EEG CSV with timestamp (optional), channel1 and channel2 columns
+
+    The file is read in chunks, so memory use is the float32 samples plus
+    one chunk of text. The sampling rate is inferred from the first and last
+    timestamps, as infer_sample_rate does; without timestamps the default
+    rate is assumed, with the recording ending now.
+
+    Args:
+        path (str): Path to the CSV file
+        chunk_rows (int): Rows parsed at a time
+
+    Returns:
+        tuple: (channel1, channel2, start_time, sample_rate)
+    """
+    parts = {channel: [] for channel in CHANNELS}
+    first = last = None
+    with pd.read_csv(path, chunksize=chunk_rows, engine='c',
+                     usecols=lambda column: column in ('timestamp', *CHANNELS),
+                     dtype={'timestamp': str, **dict.fromkeys(CHANNELS, SAMPLE_DTYPE)}) as reader:
+        for chunk in reader:
+            for channel in CHANNELS:
+                parts[channel].append(chunk[channel].to_numpy())
+            if 'timestamp' in chunk.columns and len(chunk):
+                first = chunk['timestamp'].iloc[0] if first is None else first
+                last = chunk['timestamp'].iloc[-1]
+
+    channel1, channel2 = (
+        np.concatenate(parts[channel]) if parts[channel] else np.empty(0, dtype=SAMPLE_DTYPE)
+        for channel in CHANNELS
+    )
+    n_samples = len(channel1)
+    if first is None:
+        sample_rate = DEFAULT_SAMPLE_RATE
+        return channel1, channel2, datetime.now() - pd.Timedelta(seconds=n_samples / sample_rate), sample_rate
+
+    start, end = pd.to_datetime([first, last], format='ISO8601')
+    span = (end - start).total_seconds()
+    sample_rate = (n_samples - 1) / span if n_samples > 1 and span > 0 else DEFAULT_SAMPLE_RATE
+    return channel1, channel2, start.to_pydatetime(), sample_rate
+
+
+def parse_session(task):
+    """
+    Parse the archived EEG and context files of one session, in a worker
+
+    Args:
+        task (tuple): (session_id, eeg_path, context_path, chunk_rows)
+
+    Returns:
+        dict: session_id and either the parsed eeg and context or the error
+    """
+    session_id, eeg_path, context_path, chunk_rows = task
+    try:
+        eeg = read_eeg_csv(eeg_path, chunk_rows)
+        with open(context_path, 'r') as f:
+            context_data = json.load(f)
+        context = tuple(context_data.get(column) for column in CONTEXT_COLUMNS)
+    except Exception as e:
+        return {'session_id': session_id, 'error': f'{type(e).__name__}: {e}'}
+    return {'session_id': session_id, 'eeg': eeg, 'context': context}
+
+
+def _parsed_sessions(tasks, workers):
+    """
+    Yield parse_session results in task order
+
+    With several workers, at most two tasks per worker are in flight, so
+    parsed sessions never pile up faster than they are written.
+    """
+    if workers == 1:
+        yield from map(parse_session, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(parse_session, task))
+            if len(pending) >= 2 * (workers or os.cpu_count() or 1):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_session(cursor, parsed):
+    """
+    Store a parsed session's EEG and context and checkpoint it as done
+
+    Returns:
+        int: Number of samples stored
+    """
+    session_id = parsed['session_id']
+    channel1, channel2, start_time, sample_rate = parsed['eeg']
+    n_samples = write_eeg(cursor, session_id, channel1, channel2, start_time, sample_rate)
+    cursor.execute(f'''
+        INSERT INTO lifestyle_context (session_id, {', '.join(CONTEXT_COLUMNS)})
+        VALUES (?, {', '.join('?' * len(CONTEXT_COLUMNS))})
+    ''', (session_id, *parsed['context']))
+    checkpoint(cursor, session_id, 'done', n_samples)
+    return n_samples
+
+
+def checkpoint(cursor, session_id, status, n_samples=None, error=None):
+    """Record the outcome of migrating a session"""
+    cursor.execute('''
+        INSERT OR REPLACE INTO migration_checkpoints (session_id, status, n_samples, error, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (session_id, status, n_samples, error, to_epoch_us(datetime.now())))
+
+
+class MigrationProgress:
+    """Counts migrated sessions and samples and prints throughput every PROGRESS_SECONDS"""
+
+    def __init__(self, total, quiet=False):
+        self.total = total
+        self.quiet = quiet
+        self.done = self.failed = self.samples = 0
+        self.started = self.reported = time.perf_counter()
+
+    def update(self, n_samples=None, error=None):
+        if error is None:
+            self.done += 1
+            self.samples += n_samples
+        else:
+            self.failed += 1
+        now = time.perf_counter()
+        if now - self.reported >= PROGRESS_SECONDS:
+            self.reported = now
+            self.report()
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'sessions': self.total,
+            'migrated': self.done,
+            'failed': self.failed,
+            'samples': self.samples,
+            'seconds': elapsed,
+            'samples_per_second': self.samples / elapsed if elapsed else 0.0,
+        }
+
+    def report(self, final=False):
+        if self.quiet:
+            return
+        stats = self.summary()
+        processed = self.done + self.failed
+        line = (f"{processed}/{self.total} sessions ({self.failed} failed), {self.samples:,} samples "
+                f"in {stats['seconds']:.1f}s, {stats['samples_per_second']:,.0f} samples/s")
+        if not final and processed:
+            line += f", about {stats['seconds'] / processed * (self.total - processed):.0f}s left"
+        print(line)
+
+
+def migrate_data(db_path=None, workers=None, batch_size=BATCH_SESSIONS, chunk_rows=CSV_CHUNK_ROWS, quiet=False):
+    """
+    Migrate sessions archived as EEG CSV and context JSON files into the database
+
+    Sessions are those with both file paths set, no stored EEG and no 'done'
+    checkpoint. Sessions whose files cannot be parsed or stored are
+    checkpointed as failed and retried by the next run; the others are kept.
+
+    Args:
+        db_path (str): Path to the SQLite database
+        workers (int): Processes parsing files; the CPU count if None, 1
+            parses them in this process
+        batch_size (int): Sessions written per commit
+        chunk_rows (int): CSV rows parsed at a time
+        quiet (bool): Do not print progress
+
+    Returns:
+        dict: Session counts (sessions, migrated, failed), samples stored,
+        seconds taken and samples per second
+    """
+    # Initialize database and apply pending schema migrations
+    from scripts.init_db import create_database
+    create_database(db_path)
+
+    conn = connect(db_path)
     cursor = conn.cursor()
-    
+
     try:
-        # Get existing sessions
-        cursor.execute('SELECT id, eeg_file_path, context_file_path FROM sessions')
-        sessions = cursor.fetchall()
-        
-        for session_id, eeg_path, context_path in sessions:
-            if not eeg_path or not context_path:
-                continue
-                
-            print(f"Migrating session {session_id}...")
-            
-            # Load EEG data
-            try:
-                eeg_df = pd.read_csv(eeg_path)
-                if 'timestamp' not in eeg_df.columns:
-                    # Create timestamps if they don't exist
-                    start_time = datetime.now() - pd.Timedelta(seconds=len(eeg_df))
-                    eeg_df['timestamp'] = pd.date_range(start=start_time, periods=len(eeg_df), freq='1S')
-                
-                # Insert EEG data
-                eeg_data = list(zip(
-                    eeg_df['timestamp'],
-                    eeg_df['channel1'],
-                    eeg_df['channel2']
-                ))
-                cursor.executemany('''
-                    INSERT INTO eeg_data (session_id, timestamp, channel1, channel2)
-                    VALUES (?, ?, ?, ?)
-                ''', [(session_id, ts, ch1, ch2) for ts, ch1, ch2 in eeg_data])
-                
-            except Exception as e:
-                print(f"Error migrating EEG data for session {session_id}: {e}")
-            
-            # Load context data
-            try:
-                with open(context_path, 'r') as f:
-                    context_data = json.load(f)
-                
-                # Insert context data
-                cursor.execute('''
-                    INSERT INTO lifestyle_context (
-                        session_id, sleep_hours, sleep_quality, last_meal_type,
-                        hours_since_meal, meal_size, meal_quality, hydration_level,
-                        caffeine_intake, exercise_type, exercise_duration_mins,
-                        mood_score, focus_score, mental_clarity, activity_type,
-                        time_of_day
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    session_id,
-                    context_data.get('sleep_hours'),
-                    context_data.get('sleep_quality'),
-                    context_data.get('last_meal_type'),
-                    context_data.get('hours_since_meal'),
-                    context_data.get('meal_size'),
-                    context_data.get('meal_quality'),
-                    context_data.get('hydration_level'),
-                    context_data.get('caffeine_intake'),
-                    context_data.get('exercise_type'),
-                    context_data.get('exercise_duration_mins'),
-                    context_data.get('mood_score'),
-                    context_data.get('focus_score'),
-                    context_data.get('mental_clarity'),
-                    context_data.get('activity_type'),
-                    context_data.get('time_of_day')
-                ))
-                
-            except Exception as e:
-                print(f"Error migrating context data for session {session_id}: {e}")
-        
+        # Convert EEG samples still stored one row per sample into chunk storage
+        converted = convert_legacy_rows(conn)
+        if converted and not quiet:
+            print(f"Converted EEG rows of {converted} sessions to chunk storage")
+
+        # Get archived sessions that have not been migrated yet; relative file
+        # paths are resolved against the project root, not the workers' cwd
+        tasks = [(
+            session_id, str(PROJECT_ROOT / eeg_path), str(PROJECT_ROOT / context_path), chunk_rows
+        ) for session_id, eeg_path, context_path in cursor.execute('''
+            SELECT id, eeg_file_path, context_file_path
+            FROM sessions
+            WHERE eeg_file_path IS NOT NULL AND context_file_path IS NOT NULL
+              AND id NOT IN (SELECT session_id FROM eeg_recordings)
+              AND id NOT IN (SELECT session_id FROM migration_checkpoints WHERE status = 'done')
+            ORDER BY id
+        ''').fetchall()]
+
+        progress = MigrationProgress(len(tasks), quiet)
+        uncommitted = 0
+        for parsed in _parsed_sessions(tasks, workers):
+            session_id, error = parsed['session_id'], parsed.get('error')
+            n_samples = None
+            if error is None:
+                # Inside the batch's transaction, so releasing the savepoint does not commit
+                if not conn.in_transaction:
+                    cursor.execute('BEGIN')
+                cursor.execute('SAVEPOINT migrate_session')
+                try:
+                    n_samples = write_session(cursor, parsed)
+                    cursor.execute('RELEASE migrate_session')
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO migrate_session')
+                    cursor.execute('RELEASE migrate_session')
+                    error = f'{type(e).__name__}: {e}'
+            if error is not None:
+                checkpoint(cursor, session_id, 'failed', error=error)
+            progress.update(n_samples, error)
+
+            uncommitted += 1
+            if uncommitted >= batch_size:
+                conn.commit()
+                uncommitted = 0
         conn.commit()
-        print("Data migration completed successfully!")
-        
-    except Exception as e:
+
+        rebuild_rollups(conn)
+        conn.commit()
+        progress.report(final=True)
+
+        if progress.failed and not quiet:
+            for session_id, error in conn.execute('''
+                SELECT session_id, error FROM migration_checkpoints
+                WHERE status = 'failed' ORDER BY session_id LIMIT 10
+            '''):
+                print(f"Session {session_id} failed: {error}")
+        return progress.summary()
+
+    except BaseException:
         conn.rollback()
-        print(f"Error during migration: {e}")
+        raise
     finally:
         conn.close()
 
+
 if __name__ == "__main__":
-    migrate_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Migrate sessions archived as EEG CSV and context JSON files")
+    parser.add_argument('--workers', type=int, help="Processes parsing files (default: CPU count)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SESSIONS,
+                        help=f"Sessions written per commit (default: {BATCH_SESSIONS})")
+    parser.add_argument('--chunk-rows', type=int, default=CSV_CHUNK_ROWS,
+                        help=f"CSV rows parsed at a time (default: {CSV_CHUNK_ROWS})")
+    parser.add_argument('--db', help="Path to the SQLite database (default: $NEUROTRACK_DB_PATH or data/neurotrack.db)")
+    args = parser.parse_args()
+
+    summary = migrate_data(args.db, args.workers, args.batch_size, args.chunk_rows)
+    print(f"Migrated {summary['migrated']} of {summary['sessions']} sessions, {summary['failed']} failed")
@@ -0,0 +1,82 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.data.connection import log_slow_queries
+from scripts.data.db_stats import db_stats
+from scripts.data.parquet_io import export_parquet, import_parquet
+
+
+def export_command(args):
+    counts = export_parquet(args.output_dir, args.db, args.users, eeg=not args.no_eeg)
+    return f"Exported to {args.output_dir}", counts
+
+
+def import_command(args):
+    counts = import_parquet(args.input_dir, args.db, eeg=not args.no_eeg)
+    return f"Imported from {args.input_dir}", counts
+
+
+def db_stats_command(args):
+    # The report's own queries are not worth logging
+    log_slow_queries(None)
+    sizes, worst, log_path = db_stats(args.db, args.log, args.top)
+
+    print("Tables and indexes:")
+    for row in sizes.itertuples():
+        rows = f"{row.rows:,} rows" if not pd.isna(row.rows) else f"index on {row.table}"
+        size = f"{row.bytes / 1024:,.0f} KiB" if not pd.isna(row.bytes) else ''
+        print(f"  {row.name:<40} {rows:>28} {size:>14}")
+
+    if worst.empty:
+        print(f"No statements logged in {log_path}; set $NEUROTRACK_SLOW_QUERY_MS to log them")
+    else:
+        print(f"Worst statements in {log_path}:")
+        for i, row in enumerate(worst.itertuples(), 1):
+            print(f"{i:>3}. {row.calls} calls, {row.total_ms:,.1f} ms total, "
+                  f"{row.mean_ms:,.1f} ms mean, {row.max_ms:,.1f} ms max")
+            print(f"     {row.sql}")
+            print(f"     slowest with {row.params}")
+            for step in row.plan or []:
+                print(f"       {step}")
+    return "Collected database statistics", {}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='neurotrack', description="NeuroTrack data tools")
+    parser.add_argument('--db', help="Path to the SQLite database (default: $NEUROTRACK_DB_PATH or data/neurotrack.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help="Write sessions, context, journal, diet and EEG as Parquet "
+                                                "partitioned by user and month")
+    export.add_argument('output_dir', help="Directory to write one subdirectory per table to")
+    export.add_argument('--users', type=int, nargs='+', help="Only export these user IDs")
+    export.add_argument('--no-eeg', action='store_true', help="Leave out EEG samples")
+    export.set_defaults(handler=export_command)
+
+    load = commands.add_parser('import', help="Bulk-load a Parquet export into the database")
+    load.add_argument('input_dir', help="Directory written by 'neurotrack export'")
+    load.add_argument('--no-eeg', action='store_true', help="Leave out EEG samples")
+    load.set_defaults(handler=import_command)
+
+    stats = commands.add_parser('db-stats', help="Show table sizes and the worst statements in the slow-query log")
+    stats.add_argument('--top', type=int, default=10, help="Number of statements to show (default: 10)")
+    stats.add_argument('--log', help="Slow-query log to read (default: slow_queries.jsonl next to the database)")
+    stats.set_defaults(handler=db_stats_command)
+
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    start = time.perf_counter()
+    message, counts = args.handler(args)
+    print(f"{message} in {time.perf_counter() - start:.1f}s")
+    for table, count in counts.items():
+        print(f"  {table}: {count} rows")
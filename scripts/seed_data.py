@@ -1,236 +1,347 @@
-import sqlite3
+import argparse
 import numpy as np
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
-import random
+from multiprocessing import Pool
 from pathlib import Path
+import sys
+import time
 
-def generate_sample_eeg_data(duration_seconds=300, sampling_rate=256):
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.data.connection import connect
+from scripts.data.eeg_store import SAMPLE_DTYPE, write_eeg
+from scripts.data.rollups import rebuild_rollups
+from scripts.data.timestamps import to_epoch_us
+
+# Sessions are spread over this period, between 6:00 and 22:59
+START_DATE = datetime(2024, 1, 1)
+END_DATE = datetime(2024, 5, 20)
+
+USER_NAMES = ['John Doe', 'Jane Smith', 'Alex Johnson']
+
+# Activity done at each hour of the day
+ACTIVITY_HOURS = {
+    'deep_work': [9, 14, 16],
+    'creative': [10, 15],
+    'learning': [11, 19],
+    'rest': [13, 17]
+}
+
+# Meal eaten around each hour, and the meal types it can be
+MEAL_PATTERNS = {
+    'breakfast': {'hours': [7, 8, 9], 'types': ['balanced', 'high-protein']},
+    'lunch': {'hours': [12, 13], 'types': ['balanced', 'high-carb']},
+    'dinner': {'hours': [18, 19, 20], 'types': ['balanced', 'high-protein']},
+    'snack': {'hours': [10, 15, 16], 'types': ['light']}
+}
+
+# Inclusive score ranges by activity: (focus, mental clarity)
+SCORE_RANGES = {
+    'deep_work': ((4, 5), (3, 5)),
+    'creative': ((3, 5), (4, 5)),
+    'learning': ((3, 5), (3, 5)),
+    'rest': ((2, 4), (2, 4)),
+    'other': ((2, 4), (2, 4))
+}
+
+MOOD_OPTIONS = {
+    'deep_work': ['focused', 'determined', 'productive'],
+    'creative': ['inspired', 'energetic', 'excited'],
+    'learning': ['curious', 'engaged', 'motivated'],
+    'rest': ['relaxed', 'calm', 'peaceful'],
+    'other': ['neutral', 'balanced', 'content']
+}
+
+MEAL_CALORIES = {
+    'breakfast': (300, 600),
+    'lunch': (500, 800),
+    'dinner': (600, 900),
+    'snack': (100, 300)
+}
+
+ACTIVITIES = list(SCORE_RANGES)
+MEALS = list(MEAL_PATTERNS)
+
+# Sessions whose EEG is generated together; also the unit of work per process
+EEG_BLOCK = 32
+
+
+def _hour_lookup(hours, names, default):
+    """Index into names of the entry each hour of the day belongs to"""
+    lookup = np.full(24, names.index(default))
+    for name in reversed(list(hours)):
+        lookup[hours[name]] = names.index(name)
+    return lookup
+
+
+ACTIVITY_BY_HOUR = _hour_lookup(ACTIVITY_HOURS, ACTIVITIES, 'other')
+MEAL_BY_HOUR = _hour_lookup({meal: p['hours'] for meal, p in MEAL_PATTERNS.items()}, MEALS, 'snack')
+
+
+def generate_sample_eeg_data(duration_seconds=300, sampling_rate=256, rng=None):
     """Generate sample EEG data with realistic patterns."""
-    t = np.linspace(0, duration_seconds, duration_seconds * sampling_rate)
-    
-    # Generate base signals
+    rng = np.random.default_rng() if rng is None else rng
+    t = np.arange(duration_seconds * sampling_rate) / sampling_rate
+    channel1, channel2 = _eeg_base(t) + rng.normal(0, 0.1, len(t))
+    return t, channel1, channel2
+
+
+def _eeg_base(t):
+    """Alpha and beta waves on channel 1, theta and delta waves on channel 2"""
     alpha = 0.5 * np.sin(2 * np.pi * 10 * t)  # 10 Hz alpha waves
     beta = 0.3 * np.sin(2 * np.pi * 20 * t)   # 20 Hz beta waves
     theta = 0.4 * np.sin(2 * np.pi * 5 * t)   # 5 Hz theta waves
     delta = 0.2 * np.sin(2 * np.pi * 2 * t)   # 2 Hz delta waves
-    
-    # Add some noise
-    noise = np.random.normal(0, 0.1, len(t))
-    
-    # Combine signals
-    channel1 = alpha + beta + noise
-    channel2 = theta + delta + noise
-    
-    return t, channel1, channel2
+    return np.stack([alpha + beta, theta + delta])
+
+
+def generate_eeg_block(args):
+    """
+    Generate the EEG of a block of sessions at once
+
+    Each block has its own seed, so the samples do not depend on how
+    blocks are spread over processes.
+
+    Args:
+        args (tuple): (n_sessions, n_samples, sampling_rate, seed sequence)
+
+    Returns:
+        np.ndarray: float32 array of shape (sessions, 2, samples)
+    """
+    n_sessions, n_samples, sampling_rate, seed = args
+    rng = np.random.default_rng(seed)
+    base = _eeg_base(np.arange(n_samples) / sampling_rate).astype(SAMPLE_DTYPE)
+    # Vary the rhythm strength per session and add noise shared by both channels
+    gain = rng.uniform(0.8, 1.2, (n_sessions, 2, 1)).astype(SAMPLE_DTYPE)
+    noise = rng.standard_normal((n_sessions, 1, n_samples), dtype=SAMPLE_DTYPE) * SAMPLE_DTYPE(0.1)
+    return base * gain + noise
+
+
+def _choice(rng, options, index):
+    """Pick one of options[index[i]] at random for every row i"""
+    picks = rng.random(len(index))
+    return np.array([options[i][int(p * len(options[i]))] for i, p in zip(index.tolist(), picks)])
 
-def seed_database():
-    conn = sqlite3.connect('data/neurotrack.db')
+
+def generate_sessions(rng, user_ids, sessions_per_user=None):
+    """
+    Draw sessions and their context, journal and diet columns for all users at once
+
+    Args:
+        rng (np.random.Generator): Source of randomness
+        user_ids (list): Users to create sessions for
+        sessions_per_user (int): Sessions per user; 50 to 100 at random if None
+
+    Returns:
+        dict: Column name -> array with one entry per session, ordered by user and time
+    """
+    if sessions_per_user is None:
+        counts = rng.integers(50, 101, len(user_ids))
+    else:
+        counts = np.full(len(user_ids), sessions_per_user)
+    n = int(counts.sum())
+
+    days = (END_DATE - START_DATE).days
+    offsets = (
+        rng.integers(0, days + 1, n) * 86400
+        + rng.integers(6, 23, n) * 3600
+        + rng.integers(0, 60, n) * 60
+        + rng.integers(0, 60, n)
+    )
+    user_column = np.repeat(user_ids, counts)
+    order = np.lexsort((offsets, user_column))
+    offsets, user_column = offsets[order], user_column[order]
+    hours = offsets % 86400 // 3600
+    minutes = offsets % 3600 // 60
+
+    activity = ACTIVITY_BY_HOUR[hours]
+    meal = MEAL_BY_HOUR[hours]
+    focus_low, focus_high = np.array([SCORE_RANGES[a][0] for a in ACTIVITIES]).T
+    clarity_low, clarity_high = np.array([SCORE_RANGES[a][1] for a in ACTIVITIES]).T
+    focus = rng.integers(focus_low[activity], focus_high[activity] + 1)
+    clarity = rng.integers(clarity_low[activity], clarity_high[activity] + 1)
+    calories_low, calories_high = np.array([MEAL_CALORIES[m] for m in MEALS]).T
+    calories = rng.integers(calories_low[meal], calories_high[meal] + 1)
+    activity_names = np.array(ACTIVITIES)[activity]
+    meal_names = np.array(MEALS)[meal]
+    # Sessions are numbered per user
+    number = np.arange(n) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+
+    return {
+        'user_id': user_column,
+        'timestamp': to_epoch_us(START_DATE) + offsets * 1000000,
+        'sleep_hours': np.round(rng.uniform(7, 9, n), 1),
+        'sleep_quality': rng.integers(3, 6, n),
+        'last_meal_type': _choice(rng, [MEAL_PATTERNS[m]['types'] for m in MEALS], meal),
+        'hours_since_meal': np.round(rng.uniform(0.5, 4, n), 1),
+        'meal_size': rng.choice(['small', 'medium', 'large'], n),
+        'meal_quality': rng.integers(3, 6, n),
+        'hydration_level': rng.integers(3, 6, n),
+        'caffeine_intake': rng.integers(0, 301, n),
+        'exercise_type': rng.choice(['cardio', 'strength', 'yoga', 'none'], n),
+        'exercise_duration_mins': rng.integers(0, 61, n),
+        'mood_score': rng.integers(3, 6, n),
+        'focus_score': focus,
+        'mental_clarity': clarity,
+        'activity_type': activity_names,
+        'time_of_day': np.char.add(np.char.add(np.char.zfill(hours.astype(str), 2), ':'),
+                                   np.char.zfill(minutes.astype(str), 2)),
+        'mood': _choice(rng, [MOOD_OPTIONS[a] for a in ACTIVITIES], activity),
+        'energy_level': rng.integers(3, 6, n),
+        'stress_level': rng.integers(1, 4, n),
+        'meal_type': meal_names,
+        'calories': calories,
+        # 20-30% of calories from protein, 40-50% from carbs, 20-30% from fats
+        'protein': np.round(calories * rng.uniform(0.2, 0.3, n) / 4, 1),
+        'carbs': np.round(calories * rng.uniform(0.4, 0.5, n) / 4, 1),
+        'fats': np.round(calories * rng.uniform(0.2, 0.3, n) / 9, 1),
+        'fiber': np.round(rng.uniform(2, 15, n), 1),
+        'sugar': np.round(rng.uniform(5, 25, n), 1),
+        'notes': np.char.add('Sample session ', number.astype(str)),
+        'journal_notes': np.char.add(np.char.add('Sample journal entry for ', activity_names), ' session'),
+        'tags': np.char.add(np.char.add(activity_names, ',focus,'), meal_names),
+        'food_items': np.array([json.dumps([f"{m} item 1", f"{m} item 2"]) for m in MEALS])[meal],
+        'diet_notes': np.char.add(np.char.add('Sample ', meal_names), ' notes'),
+    }
+
+
+def _rows(columns, names, ids):
+    """Rows of plain Python values for executemany, each starting with its session ID"""
+    return zip(ids, *(columns[name].tolist() for name in names))
+
+
+def seed_database(db_path=None, users=3, sessions=None, duration=300, sampling_rate=256, seed=None,
+                  workers=1, eeg_fraction=1.0):
+    """
+    Replace the contents of a database with generated users and sessions
+
+    All rows are written in one transaction with one executemany per
+    table. EEG is generated in blocks of sessions, optionally in several
+    processes; the same seed gives the same database whatever the number
+    of workers.
+
+    Args:
+        db_path (str): Path to the SQLite database
+        users (int): Number of users
+        sessions (int): Sessions per user; 50 to 100 at random per user if None
+        duration (int): Length of each session's EEG in seconds
+        sampling_rate (int): EEG sampling rate in Hz
+        seed (int): Random seed; a fresh one if None
+        workers (int): Processes generating EEG; 1 generates it in this process
+        eeg_fraction (float): Share of sessions that get EEG
+
+    Returns:
+        dict: Numbers of users and sessions and the IDs of sessions with EEG
+    """
+    seed_sequence = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seed_sequence)
+    user_ids = np.arange(1, users + 1)
+    columns = generate_sessions(rng, user_ids, sessions)
+    n = len(columns['user_id'])
+    session_ids = np.arange(1, n + 1)
+    eeg_ids = session_ids[rng.random(n) < eeg_fraction]
+
+    conn = connect(db_path)
     cursor = conn.cursor()
+    try:
+        # Clear existing data
+        for table in ('diet_log', 'journal_entries', 'lifestyle_context', 'eeg_data', 'eeg_chunks',
+                      'eeg_recordings', 'session_features', 'migration_checkpoints', 'sessions', 'users'):
+            cursor.execute(f'DELETE FROM {table}')
+
+        names = [USER_NAMES[i] if i < len(USER_NAMES) else f'User {i + 1}' for i in range(users)]
+        cursor.executemany('INSERT INTO users (id, name) VALUES (?, ?)', zip(user_ids.tolist(), names))
+        cursor.executemany('''
+            INSERT INTO sessions (id, user_id, timestamp, notes) VALUES (?, ?, ?, ?)
+        ''', _rows(columns, ['user_id', 'timestamp', 'notes'], session_ids.tolist()))
+        cursor.executemany('''
+            INSERT INTO lifestyle_context (
+                session_id, sleep_hours, sleep_quality, last_meal_type,
+                hours_since_meal, meal_size, meal_quality, hydration_level,
+                caffeine_intake, exercise_type, exercise_duration_mins,
+                mood_score, focus_score, mental_clarity, activity_type,
+                time_of_day
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', _rows(columns, [
+            'sleep_hours', 'sleep_quality', 'last_meal_type', 'hours_since_meal', 'meal_size',
+            'meal_quality', 'hydration_level', 'caffeine_intake', 'exercise_type',
+            'exercise_duration_mins', 'mood_score', 'focus_score', 'mental_clarity',
+            'activity_type', 'time_of_day'
+        ], session_ids.tolist()))
+        # Productivity follows the focus score
+        cursor.executemany('''
+            INSERT INTO journal_entries (
+                session_id, mood, energy_level, stress_level,
+                productivity_score, notes, tags
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', _rows(columns, ['mood', 'energy_level', 'stress_level', 'focus_score', 'journal_notes', 'tags'],
+                   session_ids.tolist()))
+        cursor.executemany('''
+            INSERT INTO diet_log (
+                session_id, meal_type, food_items, calories,
+                protein, carbs, fats, fiber, sugar, notes
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', _rows(columns, ['meal_type', 'food_items', 'calories', 'protein', 'carbs', 'fats', 'fiber', 'sugar',
+                             'diet_notes'], session_ids.tolist()))
+
+        _write_eeg_blocks(cursor, eeg_ids, columns['timestamp'], duration, sampling_rate, seed_sequence, workers)
+
+        # Sessions were inserted directly rather than through SessionLogger
+        rebuild_rollups(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
-    # Clear existing data
-    cursor.execute('DELETE FROM diet_log')
-    cursor.execute('DELETE FROM journal_entries')
-    cursor.execute('DELETE FROM lifestyle_context')
-    cursor.execute('DELETE FROM eeg_data')
-    cursor.execute('DELETE FROM sessions')
-    cursor.execute('DELETE FROM users')
-    conn.commit()
-
-    # Create sample users
-    users = [
-        ('John Doe',),
-        ('Jane Smith',),
-        ('Alex Johnson',)
+    return {'users': users, 'sessions': n, 'eeg_sessions': eeg_ids.tolist()}
+
+
+def _write_eeg_blocks(cursor, eeg_ids, timestamps, duration, sampling_rate, seed_sequence, workers):
+    """Generate EEG block by block, in worker processes if asked, and store it in order"""
+    n_samples = duration * sampling_rate
+    blocks = [eeg_ids[i:i + EEG_BLOCK] for i in range(0, len(eeg_ids), EEG_BLOCK)]
+    tasks = [
+        (len(block), n_samples, sampling_rate, block_seed)
+        for block, block_seed in zip(blocks, seed_sequence.spawn(len(blocks)))
     ]
-    cursor.executemany('INSERT INTO users (name) VALUES (?)', users)
-    conn.commit()
-
-    # Get user IDs
-    cursor.execute('SELECT id FROM users')
-    user_ids = [row[0] for row in cursor.fetchall()]
-
-    # Generate sessions from January 1, 2024, to May 20, 2024
-    start_date = datetime(2024, 1, 1)
-    end_date = datetime(2024, 5, 20)
-    
-    # Define activity patterns for each user
-    activity_patterns = {
-        'deep_work': {'hours': [9, 14, 16], 'duration': 2},
-        'creative': {'hours': [10, 15], 'duration': 3},
-        'learning': {'hours': [11, 19], 'duration': 2},
-        'rest': {'hours': [13, 17], 'duration': 1}
-    }
-    
-    # Define meal patterns
-    meal_patterns = {
-        'breakfast': {'hours': [7, 8, 9], 'types': ['balanced', 'high-protein']},
-        'lunch': {'hours': [12, 13], 'types': ['balanced', 'high-carb']},
-        'dinner': {'hours': [18, 19, 20], 'types': ['balanced', 'high-protein']},
-        'snack': {'hours': [10, 15, 16], 'types': ['light']}
-    }
-    
-    for user_id in user_ids:
-        # Generate a random number of sessions for this user
-        num_sessions = random.randint(50, 100)
-        for _ in range(num_sessions):
-            # Generate a random timestamp between start_date and end_date
-            session_time = start_date + timedelta(
-                days=random.randint(0, (end_date - start_date).days),
-                hours=random.randint(6, 22),
-                minutes=random.randint(0, 59),
-                seconds=random.randint(0, 59)
-            )
-            
-            # Determine activity type based on time of day
-            hour = session_time.hour
-            activity_type = 'other'
-            for act, pattern in activity_patterns.items():
-                if hour in pattern['hours']:
-                    activity_type = act
-                    break
-            
-            # Determine meal type based on time of day
-            meal_type = 'snack'
-            for meal, pattern in meal_patterns.items():
-                if hour in pattern['hours']:
-                    meal_type = meal
-                    break
-            
-            # Create session
-            cursor.execute('''
-                INSERT INTO sessions (user_id, timestamp, notes)
-                VALUES (?, ?, ?)
-            ''', (user_id, session_time, f"Sample session {_ + 1}"))
-            session_id = cursor.lastrowid
-
-            # Generate and store EEG data
-            t, channel1, channel2 = generate_sample_eeg_data()
-            eeg_data = list(zip(
-                [session_time + timedelta(seconds=float(ts)) for ts in t],
-                channel1,
-                channel2
-            ))
-            cursor.executemany('''
-                INSERT INTO eeg_data (session_id, timestamp, channel1, channel2)
-                VALUES (?, ?, ?, ?)
-            ''', [(session_id, ts, ch1, ch2) for ts, ch1, ch2 in eeg_data])
-
-            # Generate correlated lifestyle context
-            sleep_hours = round(random.uniform(7, 9), 1)  # More realistic sleep range
-            sleep_quality = random.randint(3, 5)  # Higher quality sleep
-            
-            # Generate correlated scores based on activity type and time
-            if activity_type == 'deep_work':
-                focus_score = random.randint(4, 5)
-                mental_clarity = random.randint(3, 5)
-            elif activity_type == 'creative':
-                focus_score = random.randint(3, 5)
-                mental_clarity = random.randint(4, 5)
-            elif activity_type == 'learning':
-                focus_score = random.randint(3, 5)
-                mental_clarity = random.randint(3, 5)
-            else:
-                focus_score = random.randint(2, 4)
-                mental_clarity = random.randint(2, 4)
-
-            # Create lifestyle context with correlated data
-            cursor.execute('''
-                INSERT INTO lifestyle_context (
-                    session_id, sleep_hours, sleep_quality, last_meal_type,
-                    hours_since_meal, meal_size, meal_quality, hydration_level,
-                    caffeine_intake, exercise_type, exercise_duration_mins,
-                    mood_score, focus_score, mental_clarity, activity_type,
-                    time_of_day
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                session_id,
-                sleep_hours,
-                sleep_quality,
-                random.choice(meal_patterns[meal_type]['types']),
-                round(random.uniform(0.5, 4), 1),
-                random.choice(['small', 'medium', 'large']),
-                random.randint(3, 5),
-                random.randint(3, 5),
-                random.randint(0, 300),
-                random.choice(['cardio', 'strength', 'yoga', 'none']),
-                random.randint(0, 60),
-                random.randint(3, 5),  # Higher mood scores
-                focus_score,
-                mental_clarity,
-                activity_type,
-                session_time.strftime('%H:%M')
-            ))
-
-            # Create journal entry with correlated mood
-            mood_options = {
-                'deep_work': ['focused', 'determined', 'productive'],
-                'creative': ['inspired', 'energetic', 'excited'],
-                'learning': ['curious', 'engaged', 'motivated'],
-                'rest': ['relaxed', 'calm', 'peaceful'],
-                'other': ['neutral', 'balanced', 'content']
-            }
-            
-            cursor.execute('''
-                INSERT INTO journal_entries (
-                    session_id, mood, energy_level, stress_level,
-                    productivity_score, notes, tags
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                session_id,
-                random.choice(mood_options[activity_type]),
-                random.randint(3, 5),  # Higher energy levels
-                random.randint(1, 3),  # Lower stress levels
-                focus_score,  # Correlate with focus score
-                f"Sample journal entry for {activity_type} session",
-                f"{activity_type},focus,{meal_type}"
-            ))
-
-            # Create diet log with realistic meal data
-            meal_calories = {
-                'breakfast': (300, 600),
-                'lunch': (500, 800),
-                'dinner': (600, 900),
-                'snack': (100, 300)
-            }
-            
-            calories = random.randint(*meal_calories[meal_type])
-            protein = round(calories * random.uniform(0.2, 0.3) / 4, 1)  # 20-30% of calories from protein
-            carbs = round(calories * random.uniform(0.4, 0.5) / 4, 1)    # 40-50% of calories from carbs
-            fats = round(calories * random.uniform(0.2, 0.3) / 9, 1)     # 20-30% of calories from fats
-            
-            cursor.execute('''
-                INSERT INTO diet_log (
-                    session_id, meal_type, food_items, calories,
-                    protein, carbs, fats, fiber, sugar, notes
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                session_id,
-                meal_type,
-                json.dumps([f"{meal_type} item 1", f"{meal_type} item 2"]),
-                calories,
-                protein,
-                carbs,
-                fats,
-                round(random.uniform(2, 15), 1),
-                round(random.uniform(5, 25), 1),
-                f"Sample {meal_type} notes"
-            ))
-
-    conn.commit()
-    conn.close()
+
+    def store(results):
+        for block, samples in zip(blocks, results):
+            for session_id, (channel1, channel2) in zip(block.tolist(), samples):
+                write_eeg(cursor, session_id, channel1, channel2, int(timestamps[session_id - 1]), sampling_rate)
+
+    if workers > 1 and len(tasks) > 1:
+        with Pool(workers) as pool:
+            store(pool.imap(generate_eeg_block, tasks))
+    else:
+        store(map(generate_eeg_block, tasks))
+
 
 if __name__ == "__main__":
-    # Create data directory if it doesn't exist
-    Path("data").mkdir(exist_ok=True)
-    
+    parser = argparse.ArgumentParser(description="Fill the database with generated users, sessions and EEG")
+    parser.add_argument('--users', type=int, default=3, help="Number of users (default: 3)")
+    parser.add_argument('--sessions', type=int, help="Sessions per user (default: 50 to 100 at random)")
+    parser.add_argument('--duration', type=int, default=300, help="Seconds of EEG per session (default: 300)")
+    parser.add_argument('--sampling-rate', type=int, default=256, help="EEG sampling rate in Hz (default: 256)")
+    parser.add_argument('--eeg-fraction', type=float, default=1.0, help="Share of sessions with EEG (default: 1)")
+    parser.add_argument('--seed', type=int, help="Random seed, for a reproducible database")
+    parser.add_argument('--workers', type=int, default=1, help="Processes generating EEG (default: 1)")
+    parser.add_argument('--db', help="Path to the SQLite database (default: $NEUROTRACK_DB_PATH or data/neurotrack.db)")
+    args = parser.parse_args()
+
     # Initialize database
-    import sys
-    sys.path.append('.')
+    from scripts.data.connection import resolve_db_path
     from scripts.init_db import create_database
-    create_database()
-    
+    Path(resolve_db_path(args.db)).parent.mkdir(parents=True, exist_ok=True)
+    create_database(args.db)
+
     # Seed the database
-    seed_database()
-    print("Database seeded successfully!")
+    start = time.perf_counter()
+    summary = seed_database(args.db, args.users, args.sessions, args.duration, args.sampling_rate,
+                            args.seed, args.workers, args.eeg_fraction)
+    print(f"Seeded {summary['users']} users, {summary['sessions']} sessions and "
+          f"{len(summary['eeg_sessions'])} EEG recordings in {time.perf_counter() - start:.1f}s")
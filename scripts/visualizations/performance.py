@@ -57,9 +57,9 @@ def get_activity_recommendations(time_activity_metrics):
     evening = time_activity_metrics[time_activity_metrics['hour'].between(18, 23)]
     
     # Get the activity with highest average performance for each period
-    morning_best = morning.groupby('activity_type')['performance'].mean().nlargest(1).index[0]
-    afternoon_best = afternoon.groupby('activity_type')['performance'].mean().nlargest(1).index[0]
-    evening_best = evening.groupby('activity_type')['performance'].mean().nlargest(1).index[0]
+    morning_best = morning.groupby('activity_type', observed=True)['performance'].mean().nlargest(1).index[0]
+    afternoon_best = afternoon.groupby('activity_type', observed=True)['performance'].mean().nlargest(1).index[0]
+    evening_best = evening.groupby('activity_type', observed=True)['performance'].mean().nlargest(1).index[0]
     
     return {
         'morning': morning_best,
@@ -2,23 +2,23 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
-def create_performance_trends(df):
-    """Create performance trends visualization"""
+def create_performance_trends(daily_avg, weekly):
+    """
+    Create performance trends visualization
+
+    Args:
+        daily_avg (pd.DataFrame): Mean scores per day, from rollups.daily_stats
+        weekly (pd.DataFrame): Mean scores per weekday, from rollups.weekday_stats
+    """
     fig = make_subplots(
         rows=2, cols=1,
         subplot_titles=('Daily Performance Scores', 'Weekly Patterns')
     )
     
     # Daily performance trend
-    daily_avg = df.groupby(df['timestamp'].dt.date).agg({
-        'focus_score': 'mean',
-        'mental_clarity': 'mean',
-        'mood_score': 'mean'
-    }).reset_index()
-    
     fig.add_trace(
         go.Scatter(
-            x=daily_avg['timestamp'],
+            x=daily_avg['day'],
             y=daily_avg['focus_score'],
             name='Focus Score',
             line=dict(color='blue')
@@ -27,14 +27,8 @@ def create_performance_trends(df):
     )
     
     # Weekly patterns
-    weekly = df.groupby(df['timestamp'].dt.dayofweek).agg({
-        'focus_score': 'mean',
-        'mental_clarity': 'mean',
-        'mood_score': 'mean'
-    }).reset_index()
-    
     days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    weekly['day'] = weekly['timestamp'].map(lambda x: days[x])
+    weekly = weekly.assign(day=weekly['weekday'].map(lambda x: days[x]))
     
     fig.add_trace(
         go.Bar(
@@ -62,7 +56,7 @@ def create_lifestyle_impact_chart(df):
     }).reset_index()
     
     # Exercise impact
-    exercise_impact = df.groupby('exercise_type').agg({
+    exercise_impact = df.groupby('exercise_type', observed=True).agg({
         'focus_score': 'mean',
         'mental_clarity': 'mean'
     }).reset_index()
@@ -2,6 +2,12 @@ import pytest
 import sqlite3
 from pathlib import Path
 import os
+import sys
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.init_db import create_database
 
 @pytest.fixture(scope="session")
 def test_db_path():
@@ -14,6 +20,13 @@ def test_db_path():
         os.remove(db_path)
     return db_path
 
+@pytest.fixture
+def db_path(tmp_path):
+    """Create an empty database in a temporary directory"""
+    path = str(tmp_path / 'neurotrack.db')
+    create_database(path)
+    return path
+
 @pytest.fixture(scope="session")
 def test_db_connection(test_db_path):
     """Create a test database connection"""
@@ -0,0 +1,148 @@
+import pytest
+import asyncio
+import json
+import socket
+import sqlite3
+from pathlib import Path
+import sys
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.acquisition_server import AcquisitionServer, encode_frame, parse_lines
+from scripts.analysis.quality import load_bad_intervals
+from scripts.data.eeg_store import read_eeg_array, read_gaps
+
+FRAME_SAMPLES = 256
+
+@pytest.fixture
+def db_path(db_path):
+    """Add two users to the database"""
+    conn = sqlite3.connect(db_path)
+    conn.executemany('INSERT INTO users (id, name) VALUES (?, ?)', [(1, 'User 1'), (2, 'User 2')])
+    conn.commit()
+    conn.close()
+    return db_path
+
+def frames(seed, n_frames):
+    rng = np.random.default_rng(seed)
+    return [rng.normal(size=(2, FRAME_SAMPLES)).astype(np.float32) for _ in range(n_frames)]
+
+async def send_tcp_frames(port, user_id, blocks, skip=()):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    hello = {'user_id': user_id, 'sampling_rate': 256, 'device': f'headset-{user_id}'}
+    writer.write(json.dumps(hello).encode() + b'\n')
+    session_id = json.loads(await reader.readline())['session_id']
+    for sequence, block in enumerate(blocks):
+        if sequence not in skip:
+            writer.write(encode_frame(sequence, *block))
+            await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+    return session_id
+
+def send_datagrams(port, blocks):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(5)
+        sock.sendto(json.dumps({'user_id': 2, 'sampling_rate': 128}).encode(), ('127.0.0.1', port))
+        session_id = json.loads(sock.recv(1024))['session_id']
+        for sequence, block in enumerate(blocks, start=100):
+            sock.sendto(encode_frame(sequence, *block), ('127.0.0.1', port))
+        sock.sendto(b'{"end": true}', ('127.0.0.1', port))
+    return session_id
+
+async def send_lines(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    for data in (b'0.5,0.25\n1.5,1.25\n2.5,', b'2.25\nnoise\n2024-03-01T09:00:00,3.5,3.25\n'):
+        writer.write(data)
+        await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+async def streams_closed(server):
+    while not all(stream.closed for stream in server.streams.values()):
+        await asyncio.sleep(0.01)
+
+def test_parse_lines_skips_malformed_lines():
+    """Test that text lines with or without a timestamp parse into channel blocks"""
+    samples, malformed = parse_lines([b'1,2', b'', b'12:00:00,3,4\r'])
+    np.testing.assert_array_equal(samples, [[1, 3], [2, 4]])
+    assert malformed == 0
+    samples, malformed = parse_lines([b'1,2', b'#reset', b'5'])
+    np.testing.assert_array_equal(samples, [[1], [2]])
+    assert malformed == 2
+
+def test_devices_stream_concurrently_into_sessions(db_path):
+    """Test that TCP, UDP and line streams are recorded at once, with lost frames filled in"""
+    headset_1, headset_2, udp_blocks = frames(1, 12), frames(2, 12), frames(3, 4)
+
+    async def record():
+        server = AcquisitionServer(db_path, frames_port=0, datagram_port=0, lines_port=0,
+                                   queue_blocks=4, user_id=1)
+        await server.start()
+        session_ids = await asyncio.gather(
+            send_tcp_frames(server.ports['frames'], 1, headset_1, skip={5}),
+            send_tcp_frames(server.ports['frames'], 2, headset_2),
+            send_lines(server.ports['lines']),
+        )
+        # UDP frames are dropped rather than waited for while the queue is full, so they
+        # are sent once the TCP streams have ended and the hello has been answered, which
+        # means the writer has caught up
+        await streams_closed(server)
+        loop = asyncio.get_running_loop()
+        session_ids.append(await loop.run_in_executor(None, send_datagrams, server.ports['datagram'], udp_blocks))
+        await streams_closed(server)
+        await server.stop()
+        return session_ids, server.stats()
+
+    session_ids, stats = asyncio.run(record())
+    tcp_1, tcp_2, udp = session_ids[0], session_ids[1], session_ids[3]
+    assert stats['streams_open'] == 0 and stats['peak_queue_depth'] <= 4
+    assert stats['written_samples'] == 24 * FRAME_SAMPLES + 4 * FRAME_SAMPLES + 4
+    by_session = {stream['session_id']: stream for stream in stats['streams']}
+    assert by_session[tcp_1]['dropped_frames'] == 1 and by_session[tcp_1]['padded_samples'] == FRAME_SAMPLES
+
+    conn = sqlite3.connect(db_path)
+    statuses = dict(conn.execute('SELECT session_id, status FROM eeg_recordings'))
+    assert set(statuses.values()) == {'complete'} and len(statuses) == 4
+
+    _, samples = read_eeg_array(conn, tcp_1)
+    padding = np.repeat(headset_1[4][:, -1:], FRAME_SAMPLES, axis=1)
+    expected = np.concatenate(headset_1[:5] + [padding] + headset_1[6:], axis=1)
+    np.testing.assert_array_equal(samples, expected)
+    _, samples = read_eeg_array(conn, tcp_2)
+    np.testing.assert_array_equal(samples, np.concatenate(headset_2, axis=1))
+    _, samples = read_eeg_array(conn, udp)
+    np.testing.assert_array_equal(samples, np.concatenate(udp_blocks, axis=1))
+    assert conn.execute('SELECT sample_rate FROM eeg_recordings WHERE session_id = ?', (udp,)).fetchone()[0] == 128
+
+    lines_session = (set(statuses) - {tcp_1, tcp_2, udp}).pop()
+    _, samples = read_eeg_array(conn, lines_session)
+    np.testing.assert_array_equal(samples, [[0.5, 1.5, 2.5, 3.5], [0.25, 1.25, 2.25, 3.25]])
+    conn.close()
+
+def test_filled_in_frames_are_recorded_as_gaps(db_path):
+    """Test that samples filled in for lost frames are stored as gaps and reported as bad intervals"""
+    blocks = frames(4, 8)
+
+    async def record():
+        server = AcquisitionServer(db_path, frames_port=0, datagram_port=None, lines_port=None)
+        await server.start()
+        session_id = await send_tcp_frames(server.ports['frames'], 1, blocks, skip={2, 3, 6})
+        await streams_closed(server)
+        await server.stop()
+        return session_id
+
+    session_id = asyncio.run(record())
+    conn = sqlite3.connect(db_path)
+    assert read_gaps(conn, session_id) == [
+        (2 * FRAME_SAMPLES, 4 * FRAME_SAMPLES), (6 * FRAME_SAMPLES, 7 * FRAME_SAMPLES)
+    ]
+    conn.close()
+
+    padded = [(channel, start, end) for channel, start, end, reasons in load_bad_intervals(session_id, db_path)
+              if 'padded' in reasons.split(',')]
+    assert padded == [(channel, start * FRAME_SAMPLES, end * FRAME_SAMPLES)
+                      for channel in range(2) for start, end in ((2, 4), (6, 7))]
@@ -0,0 +1,109 @@
+import pytest
+import sqlite3
+import random
+from pathlib import Path
+import sys
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.analyze_patterns import CognitivePatternAnalyzer, run_batch
+from scripts.data.rollups import rebuild_rollups
+
+@pytest.fixture
+def db_path(db_path):
+    """Add random self-reports of a few users to the database"""
+    rng = random.Random(7)
+    conn = sqlite3.connect(db_path)
+    for user_id in range(1, 5):
+        conn.execute('INSERT INTO users (id, name) VALUES (?, ?)', (user_id, f'User {user_id}'))
+        for day in range(30):
+            cursor = conn.execute('INSERT INTO sessions (user_id, timestamp) VALUES (?, ?)',
+                                  (user_id, f'2024-03-{day % 28 + 1:02d} 09:00:00'))
+            conn.execute('''
+                INSERT INTO lifestyle_context (
+                    session_id, sleep_hours, last_meal_type, hours_since_meal, exercise_type,
+                    mood_score, focus_score, mental_clarity, activity_type, time_of_day
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                cursor.lastrowid, round(rng.uniform(5, 9), 1), rng.choice(['balanced', 'light', 'skip']),
+                round(rng.uniform(0, 5), 1), rng.choice(['none', 'yoga', 'running']),
+                rng.randint(1, 5), rng.randint(1, 5), rng.randint(1, 5),
+                rng.choice(['deep_work', 'creative', 'rest']), f'{rng.choice([9, 10, 14, 15, 16])}:00'
+            ))
+    rebuild_rollups(conn)
+    conn.commit()
+    conn.close()
+    return db_path
+
+def test_batch_insights_match_per_user_insights(db_path):
+    """Test that vectorized insights for all users equal insights computed one user at a time"""
+    analyzer = CognitivePatternAnalyzer(db_path)
+    batch = analyzer.generate_batch_insights(analyzer.load_data())
+
+    assert sorted(batch) == [1, 2, 3, 4]
+    for user_id, (insights, hourly, activity) in batch.items():
+        expected, expected_hourly, expected_activity = analyzer.generate_insights(user_id)
+        for key, value in expected.items():
+            assert (insights[key] == pytest.approx(value)) if isinstance(value, dict) else insights[key] == value
+        assert hourly.to_dict('list') == pytest.approx(expected_hourly[hourly.columns].to_dict('list'))
+        assert activity.to_dict('list') == pytest.approx(expected_activity[activity.columns].to_dict('list'))
+
+def test_sql_aggregates_match_pandas_aggregates(db_path):
+    """Test that hourly and activity metrics computed in SQLite equal the ones computed from raw rows"""
+    analyzer = CognitivePatternAnalyzer(db_path)
+    for user_id in (None, 3):
+        df = analyzer.load_data(user_id)
+
+        hourly = analyzer.load_hourly_metrics(user_id)
+        expected = analyzer.analyze_optimal_times(df)
+        assert hourly[expected.columns].to_dict('list') == pytest.approx(expected.to_dict('list'))
+        assert hourly['sessions'].tolist() == df.groupby('hour').size().tolist()
+
+        activity = analyzer.load_activity_patterns(user_id)
+        expected = analyzer.analyze_activity_patterns(df)
+        assert activity[expected.columns].to_dict('list') == pytest.approx(expected.to_dict('list'))
+        assert activity['sessions'].sum() == len(df)
+
+def test_sessions_with_several_context_rows_count_once(db_path):
+    """Test that rollup-backed and raw-row insights agree when a session has two context rows"""
+    conn = sqlite3.connect(db_path)
+    session_id = conn.execute('SELECT MIN(id) FROM sessions WHERE user_id = 2').fetchone()[0]
+    conn.execute('''
+        INSERT INTO lifestyle_context (session_id, sleep_hours, last_meal_type, hours_since_meal, exercise_type,
+                                       mood_score, focus_score, mental_clarity, activity_type, time_of_day)
+        VALUES (?, 8.0, 'balanced', 1.0, 'yoga', 5, 5, 5, 'deep_work', '11:00')
+    ''', (session_id,))
+    rebuild_rollups(conn)
+    conn.commit()
+    conn.close()
+
+    analyzer = CognitivePatternAnalyzer(db_path)
+    df = analyzer.load_data(2)
+    assert len(df) == 30 and df['hour'].tolist().count(11) == 1  # the later row replaces the first
+    insights, hourly, activity = analyzer.generate_insights(2)
+    batch_insights, batch_hourly, batch_activity = analyzer.generate_batch_insights(df)[2]
+    assert batch_insights['peak_performance_hours'] == insights['peak_performance_hours']
+    assert batch_hourly.to_dict('list') == pytest.approx(hourly[batch_hourly.columns].to_dict('list'))
+    assert batch_activity.to_dict('list') == pytest.approx(activity[batch_activity.columns].to_dict('list'))
+    assert hourly['sessions'].sum() == 30
+
+def test_batch_run_skips_unchanged_users(db_path, tmp_path):
+    """Test that a rerun only rewrites reports of users whose data changed"""
+    output_dir = tmp_path / 'analysis'
+    written, skipped = run_batch(db_path, output_dir, jobs=2)
+    assert sorted(written) == [1, 2, 3, 4] and skipped == []
+    assert (output_dir / 'insights_user_3.json').exists()
+    assert (output_dir / 'performance_patterns_user_3.html').exists()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        UPDATE lifestyle_context SET focus_score = 5
+        WHERE session_id = (SELECT MIN(id) FROM sessions WHERE user_id = 2)
+    ''')
+    conn.commit()
+    conn.close()
+
+    written, skipped = run_batch(db_path, output_dir, jobs=1)
+    assert written == [2] and skipped == [1, 3, 4]
+    assert run_batch(db_path, output_dir, user_ids=[1, 2], jobs=1) == ([], [1, 2])
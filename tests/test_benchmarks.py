@@ -0,0 +1,22 @@
+import json
+from pathlib import Path
+import sys
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from benchmarks.suite import generate_dataset, run_suite
+
+def test_benchmark_suite_runs_on_a_tiny_dataset(tmp_path):
+    """Test that the dataset generator and every benchmark run and report throughput"""
+    db_path = str(tmp_path / 'neurotrack.db')
+    dataset = generate_dataset(db_path, users=2, sessions=4, duration=4, eeg_fraction=0.5, seed=1)
+    assert dataset['sessions'] == 8 and dataset['eeg_sessions']
+
+    results = run_suite(db_path, dataset, samples=2)
+    names = [result['name'] for result in results]
+    for name in ('log_session', 'load_eeg_data', 'analyze_eeg_data', 'database.load_session_data',
+                 'generate_insights', 'app.load_analysis_data', 'app.load_hour_rollups'):
+        assert name in names
+    assert all(result['items_per_second'] > 0 and result['peak_mb'] >= 0 for result in results)
+    json.dumps(results)
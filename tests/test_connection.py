@@ -0,0 +1,91 @@
+import pytest
+import gc
+import json
+import sqlite3
+import threading
+from pathlib import Path
+import sys
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.data import connection
+from scripts.data.connection import connect, get_connection, resolve_db_path
+from scripts.data.db_stats import db_stats
+
+def test_connections_use_wal_and_tuned_pragmas(db_path):
+    """Test that connections are opened in WAL mode with the shared pragmas"""
+    conn = get_connection(db_path)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    assert conn.execute('PRAGMA temp_store').fetchone()[0] == 2  # MEMORY
+
+def test_connections_are_reused_per_thread(db_path):
+    """Test that a thread gets the same connection back and other threads get their own"""
+    conn = get_connection(db_path)
+    assert get_connection(db_path) is conn
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(get_connection(db_path)))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+    with pytest.raises(sqlite3.ProgrammingError):
+        other[0].execute('SELECT 1')  # sqlite3 refuses use from another thread
+
+def test_reads_do_not_block_behind_writes(db_path):
+    """Test that a reader sees committed data while a writer holds an open transaction"""
+    writer = connect(db_path)
+    writer.execute("INSERT INTO users (name) VALUES ('Ada')")
+    writer.commit()
+    writer.execute("INSERT INTO users (name) VALUES ('Grace')")  # left uncommitted
+
+    reader = connect(db_path)
+    assert reader.execute('SELECT COUNT(*) FROM users').fetchone()[0] == 1
+    reader.close()
+    writer.rollback()
+    writer.close()
+
+def test_unclosed_connections_are_reported(db_path):
+    """Test that a connection that is never closed raises a ResourceWarning"""
+    with pytest.warns(ResourceWarning, match="never closed"):
+        connect(db_path)
+        gc.collect()
+
+def test_db_path_from_environment(monkeypatch, tmp_path):
+    """Test that the database path can be configured with NEUROTRACK_DB_PATH"""
+    monkeypatch.setenv('NEUROTRACK_DB_PATH', str(tmp_path / 'other.db'))
+    assert resolve_db_path() == str(tmp_path / 'other.db')
+    assert resolve_db_path('explicit.db') == 'explicit.db'
+
+@pytest.fixture
+def slow_query_log(tmp_path):
+    """Log every statement to a file for one test"""
+    log_path = tmp_path / 'slow_queries.jsonl'
+    was = connection._slow_query_ms, connection._slow_query_log
+    connection.log_slow_queries(0, str(log_path))
+    yield log_path
+    connection.log_slow_queries(*was)
+
+def test_slow_queries_are_logged_with_plans(db_path, slow_query_log):
+    """Test that timed statements are logged with their parameters and query plan and summarized by db-stats"""
+    conn = connect(db_path)
+    conn.executemany("INSERT INTO users (name) VALUES (?)", [('Ada',), ('Grace',)])
+    cursor = conn.cursor()
+    for _ in range(2):
+        cursor.execute('SELECT id FROM sessions WHERE user_id = ?', (1,))
+        assert cursor.fetchall() == []
+    assert [row[0] for row in conn.execute('SELECT name FROM users ORDER BY id')] == ['Ada', 'Grace']
+    conn.commit()
+    conn.close()
+
+    entries = [json.loads(line) for line in slow_query_log.read_text().splitlines()]
+    by_sql = {entry['sql']: entry for entry in entries}
+    assert by_sql['INSERT INTO users (name) VALUES (?)']['batches'] == 2
+    select = by_sql['SELECT id FROM sessions WHERE user_id = ?']
+    assert select['params'] == [1] and select['ms'] >= 0
+    assert any('idx_sessions_user_time' in step for step in select['plan'])
+
+    sizes, worst, _ = db_stats(db_path, str(slow_query_log), top=50)
+    assert sizes.set_index('name').loc['users', 'rows'] == 2
+    assert worst.set_index('sql').loc['SELECT id FROM sessions WHERE user_id = ?', 'calls'] == 2
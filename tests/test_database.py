@@ -9,6 +9,9 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from scripts.init_db import create_database
 from scripts.seed_data import seed_database
+from scripts.data.dashboard import get_data_version
+from scripts.data.database import load_session_data
+from scripts.data.schema import CHOICES
 
 @pytest.fixture
 def test_db():
@@ -62,4 +65,76 @@ def test_data_seeding(test_db):
     session_count = cursor.fetchone()[0]
     assert session_count > 0, "Expected sessions to be created"
     
-    conn.close() 
\ No newline at end of file
+    conn.close() 
+
+
+def test_seeding_is_reproducible(tmp_path):
+    """Test that the same seed gives the same database, whatever the number of workers"""
+    dumps = []
+    for workers in (1, 2):
+        db_path = str(tmp_path / f'seed_{workers}.db')
+        create_database(db_path)
+        summary = seed_database(db_path, users=4, sessions=20, duration=2, seed=3, workers=workers)
+        assert summary['sessions'] == 80 and len(summary['eeg_sessions']) == 80
+
+        conn = sqlite3.connect(db_path)
+        dumps.append([
+            conn.execute(query).fetchall() for query in (
+                "SELECT id, name FROM users",
+                "SELECT id, user_id, timestamp, notes FROM sessions",
+                "SELECT * FROM lifestyle_context",
+                "SELECT session_id, mood, productivity_score, tags FROM journal_entries",
+                "SELECT session_id, meal_type, calories, protein FROM diet_log",
+                "SELECT session_id, chunk_index, channel1, channel2 FROM eeg_chunks",
+                "SELECT * FROM rollup_hourly",
+            )
+        ])
+        conn.close()
+
+    assert dumps[0] == dumps[1]
+    assert len(dumps[0][0]) == 4 and dumps[0][0][0] == (1, 'John Doe')
+
+
+def test_session_frames_use_declared_types(tmp_path):
+    """Test that loaded sessions have categorical choices, narrow numbers and absolute paths"""
+    db_path = str(tmp_path / 'typed.db')
+    create_database(db_path)
+    seed_database(db_path, users=2, sessions=30, duration=1, seed=5, eeg_fraction=0)
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE sessions SET eeg_file_path = 'data/eeg/' || id || '.csv' WHERE id % 2 = 0")
+    conn.commit()
+    conn.close()
+
+    df = load_session_data(db_path)
+    assert len(df) == 60
+    assert list(df['activity_type'].cat.categories) == sorted(CHOICES['activity_type'])
+    assert list(df['last_meal_type'].cat.categories) == sorted(CHOICES['last_meal_type'])
+    assert df['exercise_type'].dtype == 'category' and df['time_of_day'].dtype == 'category'
+    assert df['focus_score'].dtype == 'int8' and df['exercise_duration_mins'].dtype == 'int16'
+    assert df['sleep_hours'].dtype == 'float32'
+
+    project_root = Path(__file__).parent.parent
+    paths = df.set_index('session_id')['eeg_file_path']
+    assert paths[2] == str(project_root / 'data/eeg/2.csv')
+    assert paths[1] is None
+
+
+def test_data_versions_count_writes(tmp_path):
+    """Test that each kind of write bumps its own version, including edits that keep counts and ids"""
+    db_path = str(tmp_path / 'versions.db')
+    create_database(db_path)
+    seed_database(db_path, users=1, sessions=2, duration=1, seed=3, eeg_fraction=0)
+    versions = {name: get_data_version(db_path, name) for name in ('data', 'features', 'eeg')}
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('INSERT INTO lifestyle_context (session_id, focus_score) VALUES (1, 5)')
+    conn.commit()
+    assert get_data_version(db_path) > versions['data']
+
+    versions['data'] = get_data_version(db_path)
+    conn.execute("INSERT INTO session_features (session_id, params_hash) VALUES (1, 'p')")
+    conn.commit()
+    conn.close()
+    assert get_data_version(db_path, 'features') > versions['features']
+    assert get_data_version(db_path) == versions['data'], "Analyzing EEG should not drop the session frames"
+    assert get_data_version(db_path, 'eeg') == versions['eeg']
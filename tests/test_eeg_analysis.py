@@ -0,0 +1,163 @@
+import pytest
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+import sys
+
+import numpy as np
+from scipy import signal
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.seed_data import generate_sample_eeg_data
+from scripts.data.eeg_store import read_eeg_array, write_eeg
+from scripts.analysis.eeg import BANDS, analyze_eeg_batch, analyze_eeg_data, band_power_array, welch_parameters
+from scripts.analysis.realtime import RealtimeBandPowerAnalyzer
+from scripts.analysis.features import get_session_features, load_psd
+from scripts.analysis.quality import load_bad_intervals, window_quality
+
+@pytest.fixture
+def db_path(db_path):
+    """Add sample EEG sessions of different lengths and rates to the database"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    for session_id, (duration, rate) in enumerate([(30, 256), (30, 256), (20, 256), (30, 128)], start=1):
+        cursor.execute('INSERT INTO sessions (id, user_id) VALUES (?, 1)', (session_id,))
+        _, channel1, channel2 = generate_sample_eeg_data(duration, rate)
+        write_eeg(cursor, session_id, channel1, channel2, datetime(2024, 1, 1, 9, 0), rate)
+    conn.commit()
+    conn.close()
+    return db_path
+
+def test_batch_matches_single_session_analysis(db_path):
+    """Test that batched analysis gives the same results as per-session analysis"""
+    session_ids = [4, 1, 3, 2]
+    batch = analyze_eeg_batch(session_ids, db_path=db_path)
+
+    assert batch['session_id'].tolist() == session_ids, "Rows should follow the requested order"
+    assert batch.loc[batch['session_id'] == 4, 'sample_rate'].iloc[0] == 128
+
+    for _, row in batch.iterrows():
+        single = analyze_eeg_data(row['session_id'], db_path=db_path)
+        for band, power in single['band_powers'].items():
+            assert row[band] == pytest.approx(power, rel=1e-5)
+        for metric, score in single['cognitive_metrics'].items():
+            assert row[metric] == pytest.approx(score)
+
+def test_batch_skips_sessions_without_eeg(db_path):
+    """Test that sessions without EEG data are left out of the batch result"""
+    batch = analyze_eeg_batch([1, 99], db_path=db_path)
+    assert batch['session_id'].tolist() == [1]
+
+def test_session_features_read_through_cache(db_path):
+    """Test that features are cached on first read and reused afterwards"""
+    features = get_session_features([1, 4], db_path, store_psd=True)
+    single = analyze_eeg_data(1, db_path=db_path)
+    assert features.loc[1, 'focus_score'] == pytest.approx(single['cognitive_metrics']['focus_score'])
+
+    conn = sqlite3.connect(db_path)
+    cached_rows = conn.execute('SELECT COUNT(*) FROM session_features').fetchone()[0]
+    conn.close()
+    assert cached_rows == 2
+
+    cached_only = get_session_features([1, 2, 4], db_path, compute=False)
+    assert cached_only.index.tolist() == [1, 4], "Uncached sessions should not be computed"
+
+    freqs, psd = load_psd(4, db_path)
+    assert psd.shape == (2, len(freqs))
+
+def test_session_features_invalidated_when_eeg_changes(db_path):
+    """Test that rewriting a session's EEG drops its cached features"""
+    get_session_features([1, 2], db_path)
+
+    conn = sqlite3.connect(db_path)
+    _, channel1, channel2 = generate_sample_eeg_data(30, 256)
+    write_eeg(conn.cursor(), 1, channel2, channel1, datetime(2024, 1, 1, 9, 0), 256)
+    conn.commit()
+    cached_ids = [row[0] for row in conn.execute('SELECT session_id FROM session_features')]
+    conn.close()
+
+    assert cached_ids == [2]
+
+def test_quality_masks_flag_artifacts_per_channel_and_window():
+    """Test that flatline, clipping and noise are flagged in the right channel and window"""
+    _, channel1, channel2 = generate_sample_eeg_data(20, 100)
+    samples = np.stack([channel1, channel2])
+    samples[0, 300:500] = 0.0                 # flatline in windows 3-4
+    samples[1, 1000:1100] *= 20               # noise burst in window 10
+    samples[1, 1500:1600] = 2000.0            # clipped in window 15
+
+    bounds, masks = window_quality(samples, 100)
+    assert len(bounds) == 20
+    assert np.flatnonzero(masks['flatline'][0]).tolist() == [3, 4]
+    assert np.flatnonzero(masks['noise'][1]).tolist() == [10]
+    assert np.flatnonzero(masks['clipping'][1]).tolist() == [15]
+    assert not masks['bad'][0, 5:].any() and masks['bad'][1].sum() == 2
+
+def test_analysis_skips_bad_intervals(db_path):
+    """Test that skip_bad leaves stored bad intervals out of the PSD"""
+    conn = sqlite3.connect(db_path)
+    _, samples = read_eeg_array(conn, 1)
+    samples = samples.copy()
+    samples[:, 256 * 10:256 * 12] = 0.0
+    write_eeg(conn.cursor(), 1, *samples, datetime(2024, 1, 1, 9, 0), 256)
+    conn.commit()
+    conn.close()
+
+    intervals = load_bad_intervals(1, db_path)
+    assert intervals == [(0, 2560, 3072, 'flatline'), (1, 2560, 3072, 'flatline')]
+
+    result = analyze_eeg_data(1, db_path=db_path, skip_bad=True)
+    assert result['bad_intervals'] == intervals
+    nperseg, noverlap = welch_parameters(samples.shape[1])
+    weights = [((end - start - nperseg) // (nperseg - noverlap) + 1) for start, end in [(0, 2560), (3072, 7680)]]
+    freqs, psds = zip(*(signal.welch(samples[:, start:end], fs=256, nperseg=nperseg, noverlap=noverlap)
+                        for start, end in [(0, 2560), (3072, 7680)]))
+    expected = band_power_array(freqs[0], np.average(psds, axis=0, weights=weights)).mean(axis=0)
+    for band, power in zip(BANDS, expected):
+        assert result['band_powers'][band] == pytest.approx(power, rel=1e-5)
+
+    # Rewriting the EEG drops the stored assessment
+    conn = sqlite3.connect(db_path)
+    write_eeg(conn.cursor(), 1, *samples[::-1], datetime(2024, 1, 1, 9, 0), 256)
+    conn.commit()
+    assert conn.execute('SELECT COUNT(*) FROM signal_quality WHERE session_id = 1').fetchone()[0] == 0
+    conn.close()
+    assert load_bad_intervals(2, db_path, compute=False) is None
+    assert load_bad_intervals(2, db_path) == []
+
+def test_realtime_analyzer_matches_offline_analysis(db_path):
+    """Test that live band powers over a whole session agree with analyze_eeg_data"""
+    conn = sqlite3.connect(db_path)
+    _, samples = read_eeg_array(conn, 1)
+    conn.close()
+
+    analyzer = RealtimeBandPowerAnalyzer(sampling_rate=256, window_seconds=30, update_ms=1000)
+    assert (analyzer.nperseg, analyzer.noverlap) == welch_parameters(samples.shape[1])
+
+    results = [analyzer.push(samples[:, offset:offset + 100]) for offset in range(0, samples.shape[1], 100)]
+    updates = [result for result in results if result]
+    assert len(updates) == 1, "The first update needs a full window"
+
+    offline = analyze_eeg_data(1, db_path=db_path)
+    for band, power in offline['band_powers'].items():
+        assert updates[0]['band_powers'][band] == pytest.approx(power, rel=1e-4)
+    assert updates[0]['cognitive_metrics'] == offline['cognitive_metrics']
+
+def test_realtime_analyzer_slides_window():
+    """Test that each update covers only the most recent window of samples"""
+    rng = np.random.default_rng(0)
+    feed = rng.normal(0, 1, (2, 256 * 20))
+    analyzer = RealtimeBandPowerAnalyzer(sampling_rate=256, window_seconds=4, update_ms=500)
+
+    updates = [result for offset in range(0, feed.shape[1], 32)
+               if (result := analyzer.push(feed[:, offset:offset + 32]))]
+    assert len(updates) == (feed.shape[1] - analyzer.window_samples) // analyzer.update_samples + 1
+
+    end = updates[-1]['n_samples']
+    freqs, psd = signal.welch(feed[:, end - analyzer.window_samples:end], fs=256,
+                              nperseg=analyzer.nperseg, noverlap=analyzer.noverlap)
+    expected = band_power_array(freqs, psd).mean(axis=0)
+    for band, power in zip(BANDS, expected):
+        assert updates[-1]['band_powers'][band] == pytest.approx(power)
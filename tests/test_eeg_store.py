@@ -0,0 +1,276 @@
+import pytest
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+import sys
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.log_session import SessionLogger
+from scripts.analysis.eeg import load_eeg_data
+from scripts.data.eeg_store import (
+    CHUNK_SIZE, chunks_to_sidecar, convert_legacy_rows, read_eeg, remove_deleted_sidecars,
+    write_eeg, write_sidecar,
+)
+from scripts.data.eeg_pyramid import read_envelope
+
+def test_write_and_read_round_trip(db_path):
+    """Test that samples written as chunks are read back unchanged"""
+    n_samples = CHUNK_SIZE * 2 + 100
+    channel1 = np.random.normal(0, 1, n_samples)
+    channel2 = np.random.normal(0, 1, n_samples)
+    start_time = datetime(2024, 1, 1, 9, 0)
+
+    conn = sqlite3.connect(db_path)
+    write_eeg(conn.cursor(), 1, channel1, channel2, start_time, 256)
+    conn.commit()
+
+    chunk_count = conn.execute('SELECT COUNT(*) FROM eeg_chunks WHERE session_id = 1').fetchone()[0]
+    assert chunk_count == 3, "Samples should be split into fixed-size chunks"
+
+    timestamps, ch1, ch2 = read_eeg(conn, 1)
+    conn.close()
+
+    assert ch1.dtype == np.float32
+    np.testing.assert_array_equal(ch1, channel1.astype(np.float32))
+    np.testing.assert_array_equal(ch2, channel2.astype(np.float32))
+    assert timestamps[0] == np.datetime64('2024-01-01T09:00:00')
+    assert timestamps[256] == np.datetime64('2024-01-01T09:00:01')
+
+def test_read_eeg_only_returns_selected_channels(db_path):
+    """Test that channels left out of a read come back as None"""
+    channel1 = np.arange(600, dtype=np.float32)
+    conn = sqlite3.connect(db_path)
+    write_eeg(conn.cursor(), 1, channel1, -channel1, datetime(2024, 1, 1, 9, 0), 256)
+    conn.commit()
+
+    timestamps, ch1, ch2 = read_eeg(conn, 1, channels=['channel2'])
+    conn.close()
+
+    assert ch1 is None
+    np.testing.assert_array_equal(ch2, -channel1)
+    assert len(timestamps) == 600
+
+def test_session_logger_writes_through_chunk_storage(db_path):
+    """Test that logged EEG readings are stored as chunks and loaded by analysis"""
+    start_time = datetime(2024, 1, 1, 9, 0)
+    eeg_data = [
+        (start_time + timedelta(seconds=i / 128), 0.1 * i, -0.1 * i)
+        for i in range(1000)
+    ]
+
+    logger = SessionLogger(db_path)
+    session_id = logger.log_session(user_id=1, eeg_data=eeg_data)
+
+    conn = sqlite3.connect(db_path)
+    legacy_rows = conn.execute('SELECT COUNT(*) FROM eeg_data').fetchone()[0]
+    sample_rate = conn.execute(
+        'SELECT sample_rate FROM eeg_recordings WHERE session_id = ?', (session_id,)
+    ).fetchone()[0]
+    conn.close()
+
+    assert legacy_rows == 0, "No per-sample rows should be written"
+    assert sample_rate == pytest.approx(128)
+
+    timestamps, channel1, channel2 = load_eeg_data(session_id, db_path)
+    assert len(timestamps) == len(eeg_data)
+    assert channel1[10] == pytest.approx(1.0)
+    assert channel2[10] == pytest.approx(-1.0)
+
+def test_convert_legacy_rows(db_path):
+    """Test that per-sample rows are converted into chunk storage"""
+    start_time = datetime(2024, 1, 1, 9, 0)
+    rows = [
+        (7, start_time + timedelta(microseconds=i * 3906.25), float(i), float(-i))
+        for i in range(512)
+    ]
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany('''
+        INSERT INTO eeg_data (session_id, timestamp, channel1, channel2)
+        VALUES (?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+
+    assert convert_legacy_rows(conn) == 1
+    remaining = conn.execute('SELECT COUNT(*) FROM eeg_data').fetchone()[0]
+    timestamps, channel1, channel2 = read_eeg(conn, 7)
+    conn.close()
+
+    assert remaining == 0, "Converted rows should be removed"
+    assert len(channel1) == 512
+    np.testing.assert_array_equal(channel1, np.arange(512, dtype=np.float32))
+    assert timestamps[0] == np.datetime64('2024-01-01T09:00:00')
+
+def test_sidecar_storage_returns_memmap_views(db_path, tmp_path):
+    """Test that sidecar sessions are loaded as zero-copy memmap views"""
+    start_time = datetime(2024, 1, 1, 9, 0)
+    eeg_data = [
+        (start_time + timedelta(seconds=i / 256), float(i), float(-i))
+        for i in range(2048)
+    ]
+
+    logger = SessionLogger(db_path, eeg_storage='sidecar')
+    session_id = logger.log_session(user_id=1, eeg_data=eeg_data, sampling_rate=256)
+
+    sidecar = tmp_path / 'eeg' / f'session_{session_id}.npy'
+    assert sidecar.exists(), "Samples should be written to a sidecar file"
+
+    conn = sqlite3.connect(db_path)
+    eeg_file_path = conn.execute(
+        'SELECT eeg_file_path FROM sessions WHERE id = ?', (session_id,)
+    ).fetchone()[0]
+    chunk_count = conn.execute('SELECT COUNT(*) FROM eeg_chunks').fetchone()[0]
+    conn.close()
+    assert Path(eeg_file_path) == sidecar
+    assert chunk_count == 0
+
+    timestamps, channel1, channel2 = load_eeg_data(session_id, db_path)
+    assert isinstance(channel1, np.memmap)
+    assert len(channel1) == 2048
+    assert channel2[100] == -100
+
+def test_sidecar_files_are_removed_only_after_commit(db_path, tmp_path):
+    """Test that replacing a sidecar session keeps the old file until the replacement commits"""
+    samples = np.arange(2000, dtype=np.float32).reshape(2, -1)
+    start_time = datetime(2024, 1, 1, 9, 0)
+    conn = sqlite3.connect(db_path)
+    conn.execute('INSERT INTO sessions (id, user_id, timestamp) VALUES (1, 1, 0)')
+    first = write_sidecar(conn.cursor(), 1, *samples, start_time, 256, tmp_path / 'eeg')
+    conn.commit()
+    assert Path(first).is_absolute()
+
+    # A rolled-back replacement leaves the committed file in place
+    second = write_sidecar(conn.cursor(), 1, *samples[::-1], start_time, 256, tmp_path / 'eeg')
+    assert second != first
+    conn.rollback()
+    Path(second).unlink()
+    assert remove_deleted_sidecars(conn) == 0
+    np.testing.assert_array_equal(read_eeg(conn, 1)[1], samples[0])
+
+    write_eeg(conn.cursor(), 1, *samples[::-1], start_time, 256)
+    assert Path(first).exists(), "The file should outlive the uncommitted deletion"
+    conn.commit()
+    assert remove_deleted_sidecars(conn) == 1
+    assert not Path(first).exists()
+    np.testing.assert_array_equal(read_eeg(conn, 1)[1], samples[1])
+    conn.close()
+
+def test_chunks_to_sidecar_needs_a_chunk_recording(db_path, tmp_path):
+    """Test that moving a session without chunk storage fails without touching disk"""
+    conn = sqlite3.connect(db_path)
+    with pytest.raises(ValueError, match='no EEG recording'):
+        chunks_to_sidecar(conn, 1, tmp_path / 'eeg')
+
+    samples = np.arange(2000, dtype=np.float32).reshape(2, -1)
+    write_sidecar(conn.cursor(), 1, *samples, datetime(2024, 1, 1, 9, 0), 256, tmp_path / 'eeg')
+    conn.commit()
+    with pytest.raises(ValueError, match='not stored in chunks'):
+        chunks_to_sidecar(conn, 1, tmp_path / 'eeg')
+    conn.close()
+
+    assert len(list((tmp_path / 'eeg').iterdir())) == 1
+
+def test_time_slice_and_channel_selection(db_path):
+    """Test loading a time slice of selected channels from both storage modes"""
+    start_time = datetime(2024, 1, 1, 9, 0)
+    n_samples = CHUNK_SIZE * 3
+    eeg_data = [
+        (start_time + timedelta(seconds=i / 256), float(i), float(-i))
+        for i in range(n_samples)
+    ]
+    slice_start = start_time + timedelta(seconds=20)
+    slice_end = start_time + timedelta(seconds=30)
+
+    for storage in ('chunks', 'sidecar'):
+        logger = SessionLogger(db_path, eeg_storage=storage)
+        session_id = logger.log_session(user_id=1, eeg_data=eeg_data, sampling_rate=256)
+
+        timestamps, channel1, channel2 = load_eeg_data(
+            session_id, db_path, start=slice_start, end=slice_end, channels=['channel1']
+        )
+        assert channel2 is None, "Unselected channels should not be loaded"
+        assert len(channel1) == 2560
+        assert channel1[0] == 20 * 256
+        assert timestamps[0] == np.datetime64('2024-01-01T09:00:20')
+        assert timestamps[-1] < np.datetime64('2024-01-01T09:00:30')
+
+def test_streaming_writer_appends_in_batches(db_path):
+    """Test that streamed samples are committed in chunk batches and completed on close"""
+    start_time = datetime(2024, 1, 1, 9, 0)
+    n_samples = CHUNK_SIZE * 5 + 123
+    readings = (
+        (start_time + timedelta(seconds=i / 256), float(i), float(-i))
+        for i in range(n_samples)
+    )
+
+    logger = SessionLogger(db_path)
+    writer = logger.open_session(user_id=1, sampling_rate=256, batch_chunks=2)
+    writer.extend(readings)
+    assert writer.n_samples == CHUNK_SIZE * 4, "Only full batches should be committed before close"
+    session_id = writer.close(journal_entry={'mood': 'focused'})
+
+    assert logger.incomplete_sessions() == []
+    timestamps, channel1, channel2 = load_eeg_data(session_id, db_path)
+    np.testing.assert_array_equal(channel1, np.arange(n_samples, dtype=np.float32))
+    assert timestamps[0] == np.datetime64('2024-01-01T09:00:00')
+    assert logger.get_session_data(session_id)['journal'][3] == 'focused'
+
+def test_streaming_writer_resumes_after_crash(db_path, tmp_path):
+    """Test that an interrupted session keeps its committed samples and can be resumed"""
+    channel1 = np.arange(CHUNK_SIZE * 3, dtype=np.float32)
+
+    logger = SessionLogger(db_path, eeg_storage='sidecar')
+    with pytest.raises(RuntimeError):
+        with logger.open_session(user_id=1, sampling_rate=256, batch_chunks=1) as writer:
+            writer.append(channel1[:CHUNK_SIZE + 10], -channel1[:CHUNK_SIZE + 10])
+            raise RuntimeError("acquisition failed")
+
+    session_id = writer.session_id
+    assert logger.incomplete_sessions() == [session_id]
+
+    writer = logger.resume_session(session_id)
+    assert writer.n_samples == CHUNK_SIZE
+    writer.append(channel1[writer.n_samples:], -channel1[writer.n_samples:])
+    writer.close()
+
+    assert logger.incomplete_sessions() == []
+    assert (tmp_path / 'eeg' / f'session_{session_id}.npy').exists()
+    timestamps, loaded1, loaded2 = load_eeg_data(session_id, db_path)
+    np.testing.assert_array_equal(loaded1, channel1)
+    np.testing.assert_array_equal(loaded2, -channel1)
+
+def test_envelope_reads_the_pyramid_level_fitting_the_width(db_path):
+    """Test that envelopes hold the min and max of each bin at the coarsest level needed"""
+    rng = np.random.default_rng(0)
+    samples = rng.normal(0, 1, (2, 256 * 300)).astype(np.float32)
+    start_time = datetime(2024, 1, 1, 9, 0)
+    conn = sqlite3.connect(db_path)
+    write_eeg(conn.cursor(), 1, *samples, start_time, 256)
+    conn.commit()
+
+    whole = read_envelope(conn, 1, width=1000)
+    assert whole['factor'] == 256 and whole['lows'].shape == (2, 300)
+    np.testing.assert_array_equal(whole['lows'], samples.reshape(2, 300, 256).min(axis=-1))
+    np.testing.assert_array_equal(whole['highs'], samples.reshape(2, 300, 256).max(axis=-1))
+
+    # Ten seconds at 16 samples per bin; bins cover the whole range
+    zoomed = read_envelope(conn, 1, start_time + timedelta(seconds=100), start_time + timedelta(seconds=110), 1000)
+    assert zoomed['factor'] == 16 and zoomed['highs'].shape == (2, 160)
+    assert zoomed['timestamps'][0] == np.datetime64('2024-01-01T09:01:40')
+    np.testing.assert_array_equal(zoomed['highs'], samples[:, 25600:28160].reshape(2, 160, 16).max(axis=-1))
+
+    # Short ranges are the raw samples
+    raw = read_envelope(conn, 1, start_time, start_time + timedelta(seconds=2), 1000)
+    assert raw['factor'] == 1
+    np.testing.assert_array_equal(raw['lows'], samples[:, :512])
+
+    # Rewriting the EEG drops the stored pyramid
+    write_eeg(conn.cursor(), 1, *samples[:, :1000], start_time, 256)
+    conn.commit()
+    assert conn.execute('SELECT COUNT(*) FROM eeg_pyramid').fetchone()[0] == 0
+    assert read_envelope(conn, 1)['n_samples'] == 1000
+    conn.close()
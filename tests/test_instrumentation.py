@@ -0,0 +1,60 @@
+import pytest
+import json
+from pathlib import Path
+import sys
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.data import instrumentation
+from scripts.data.instrumentation import Histogram, span, timed
+
+@pytest.fixture
+def tracing():
+    """Record timings for one test, starting from an empty registry"""
+    was_enabled = instrumentation.enabled()
+    instrumentation.reset()
+    instrumentation.enable()
+    yield instrumentation
+    instrumentation.enable(was_enabled)
+    instrumentation.reset()
+
+def test_histogram_percentiles_are_within_a_bucket():
+    """Test that percentiles read from the log-scaled buckets are close to the exact ones"""
+    histogram = Histogram()
+    durations = [i / 1000 for i in range(1, 1001)]  # 1ms .. 1s
+    for seconds in durations:
+        histogram.add(seconds)
+    summary = histogram.summary()
+    assert summary['count'] == 1000 and summary['max'] == 1.0
+    for q in (50, 90, 99):
+        assert summary[f'p{q}'] == pytest.approx(durations[int(q * 10) - 1], rel=0.07)
+
+def test_timers_and_counters_are_recorded_only_while_enabled(tracing):
+    """Test that decorated calls and spans are timed when tracing is on, and exported as JSON lines"""
+    @timed('test.double')
+    def double(x):
+        return 2 * x
+
+    assert double(2) == 4
+    with span('test.block'):
+        instrumentation.count('test.rows', 5)
+
+    tracing.disable()
+    assert double(3) == 6
+    with span('test.block'):
+        instrumentation.count('test.rows', 5)
+
+    snapshot = tracing.snapshot()
+    assert snapshot['timers']['test.double']['count'] == 1
+    assert snapshot['timers']['test.block']['count'] == 1
+    assert snapshot['counters'] == {'test.rows': 5}
+
+    lines = [json.loads(line) for line in tracing.export_jsonl().splitlines()]
+    assert [(line['kind'], line['name']) for line in lines] == [
+        ('timer', 'test.block'), ('timer', 'test.double'), ('counter', 'test.rows')
+    ]
+    assert sum(lines[1]['buckets'].values()) == 1
+
+    frame = tracing.timings_frame()
+    assert list(frame['stage']) == ['test', 'test'] and (frame['p50_ms'] >= 0).all()
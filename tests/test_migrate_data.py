@@ -0,0 +1,84 @@
+import pytest
+import json
+import os
+import sqlite3
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.init_db import create_database
+from scripts.migrate_data import migrate_data
+from scripts.data.connection import PROJECT_ROOT
+from scripts.data.eeg_store import read_eeg_array
+
+@pytest.fixture
+def archive(tmp_path):
+    """Create sessions pointing at archived EEG CSVs and context JSONs, with session 3's CSV missing"""
+    db_path = str(tmp_path / 'neurotrack.db')
+    create_database(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO users (id, name) VALUES (1, 'User 1')")
+    rng = np.random.default_rng(2)
+    for session_id in range(1, 6):
+        eeg_path, context_path = tmp_path / f'eeg_{session_id}.csv', tmp_path / f'context_{session_id}.json'
+        eeg = pd.DataFrame({'channel1': rng.normal(size=500), 'channel2': rng.normal(size=500)})
+        if session_id % 2:
+            eeg.insert(0, 'timestamp', pd.date_range('2024-03-01 09:00', periods=500, freq='4ms').astype(str))
+        if session_id != 3:
+            eeg.to_csv(eeg_path, index=False)
+        context_path.write_text(json.dumps({'sleep_hours': 7.5, 'focus_score': 4, 'activity_type': 'deep_work'}))
+        conn.execute('''
+            INSERT INTO sessions (id, user_id, timestamp, eeg_file_path, context_file_path)
+            VALUES (?, 1, '2024-03-01 09:00:00', ?, ?)
+        ''', (session_id, str(eeg_path), str(context_path)))
+    conn.commit()
+    conn.close()
+    return db_path, tmp_path, rng
+
+def test_migration_checkpoints_sessions_and_resumes(archive):
+    """Test that chunked parsing stores every sample, failures are checkpointed and a rerun retries only them"""
+    db_path, tmp_path, rng = archive
+    summary = migrate_data(db_path, workers=1, batch_size=2, chunk_rows=64, quiet=True)
+    assert (summary['migrated'], summary['failed'], summary['samples']) == (4, 1, 2000)
+
+    conn = sqlite3.connect(db_path)
+    statuses = dict(conn.execute('SELECT session_id, status FROM migration_checkpoints'))
+    assert statuses == {1: 'done', 2: 'done', 3: 'failed', 4: 'done', 5: 'done'}
+    assert conn.execute('SELECT COUNT(*) FROM lifestyle_context').fetchone()[0] == 4
+    start_time, sample_rate = conn.execute(
+        'SELECT start_time, sample_rate FROM eeg_recordings WHERE session_id = 1'
+    ).fetchone()
+    assert sample_rate == pytest.approx(250) and start_time == pd.Timestamp('2024-03-01 09:00').value // 1000
+
+    _, samples = read_eeg_array(conn, 1)
+    expected = pd.read_csv(tmp_path / 'eeg_1.csv')[['channel1', 'channel2']].to_numpy(np.float32).T
+    np.testing.assert_array_equal(samples, expected)
+
+    eeg = pd.DataFrame({'channel1': rng.normal(size=300), 'channel2': rng.normal(size=300)})
+    eeg.to_csv(tmp_path / 'eeg_3.csv', index=False)
+    summary = migrate_data(db_path, workers=2, quiet=True)
+    assert (summary['sessions'], summary['migrated'], summary['failed']) == (1, 1, 0)
+    assert conn.execute("SELECT COUNT(*) FROM migration_checkpoints WHERE status = 'done'").fetchone()[0] == 5
+    assert conn.execute('SELECT COUNT(*) FROM lifestyle_context').fetchone()[0] == 5
+    conn.close()
+
+def test_relative_archive_paths_resolve_against_the_project_root(archive, monkeypatch):
+    """Test that archive paths stored relative to the project root do not depend on the cwd"""
+    db_path, tmp_path, _ = archive
+    conn = sqlite3.connect(db_path)
+    for column in ('eeg_file_path', 'context_file_path'):
+        paths = conn.execute(f'SELECT id, {column} FROM sessions').fetchall()
+        conn.executemany(f'UPDATE sessions SET {column} = ? WHERE id = ?', [
+            (os.path.relpath(path, PROJECT_ROOT), session_id) for session_id, path in paths
+        ])
+    conn.commit()
+    conn.close()
+
+    monkeypatch.chdir(tmp_path)
+    summary = migrate_data(db_path, workers=1, quiet=True)
+    assert (summary['migrated'], summary['failed']) == (4, 1)
@@ -0,0 +1,166 @@
+import pytest
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+import sys
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.init_db import create_database
+from scripts.log_session import SessionLogger
+from scripts.data.migrations import LATEST_VERSION, MIGRATIONS, run_migrations, schema_version
+from scripts.data.timestamps import from_epoch_us, to_epoch_us
+
+# Hot queries, named by the table each one must no longer scan
+HOT_QUERIES = [
+    ('eeg_data', '''
+        SELECT timestamp, channel1, channel2 FROM eeg_data
+        WHERE session_id = ? ORDER BY timestamp
+    ''', (1,)),
+    ('sessions', '''
+        SELECT id, timestamp FROM sessions
+        WHERE user_id = ? AND timestamp >= ? AND timestamp < ?
+        ORDER BY timestamp DESC
+    ''', (1, '2024-01-01', '2024-02-01')),
+    ('lifestyle_context', '''
+        SELECT * FROM sessions s JOIN lifestyle_context lc ON s.id = lc.session_id WHERE s.id = ?
+    ''', (1,)),
+    ('journal_entries', '''
+        SELECT * FROM sessions s JOIN journal_entries je ON s.id = je.session_id WHERE s.id = ?
+    ''', (1,)),
+    ('diet_log', '''
+        SELECT * FROM sessions s JOIN diet_log dl ON s.id = dl.session_id WHERE s.id = ?
+    ''', (1,)),
+]
+
+def query_plan(conn, query, params):
+    """Return the EXPLAIN QUERY PLAN details of a query"""
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params)]
+
+def downgrade_to_unversioned(db_path):
+    """Turn a database back into one created before migrations existed"""
+    conn = sqlite3.connect(db_path)
+    for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'").fetchall():
+        conn.execute(f'DROP INDEX {name}')
+    conn.execute('PRAGMA user_version = 0')
+    conn.commit()
+    conn.close()
+
+def test_new_database_is_at_latest_version(db_path):
+    """Test that create_database applies every migration and reruns are no-ops"""
+    conn = sqlite3.connect(db_path)
+    assert schema_version(conn) == LATEST_VERSION == MIGRATIONS[-1][0]
+    conn.close()
+
+    assert run_migrations(db_path) == []
+    create_database(db_path)
+    SessionLogger(db_path)
+
+def test_migrations_replace_table_scans_with_index_searches(db_path):
+    """Test the hot query plans before and after migrating an unversioned database"""
+    downgrade_to_unversioned(db_path)
+
+    conn = sqlite3.connect(db_path)
+    for table, query, params in HOT_QUERIES:
+        plan = query_plan(conn, query, params)
+        assert any(step.startswith('SCAN') for step in plan), f"{table} should be scanned before migrating"
+    conn.close()
+
+    # SessionLogger upgrades existing databases on start
+    SessionLogger(db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert schema_version(conn) == LATEST_VERSION
+    for table, query, params in HOT_QUERIES:
+        plan = query_plan(conn, query, params)
+        assert not any(step.startswith('SCAN') for step in plan), f"{table}: {plan}"
+        assert not any('TEMP B-TREE' in step for step in plan), f"{table} should not sort: {plan}"
+    eeg_plan = query_plan(conn, *HOT_QUERIES[0][1:])
+    assert any('COVERING INDEX' in step for step in eeg_plan), "EEG rows should be read from the index alone"
+    conn.close()
+
+def test_text_timestamps_are_converted_to_epoch_microseconds(db_path):
+    """Test that text timestamps of an older database become integer epoch microseconds"""
+    conn = sqlite3.connect(db_path)
+    triggers = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%_epoch_us'"
+    ).fetchall()
+    for name, in triggers:
+        conn.execute(f'DROP TRIGGER {name}')
+    conn.execute('PRAGMA user_version = 2')
+    times = [datetime(2024, 3, 1, 9, 30), datetime(2024, 3, 1, 9, 30, 0, 123456)]
+    for session_id, time in enumerate(times, start=1):
+        conn.execute('INSERT INTO sessions (id, user_id, timestamp) VALUES (?, 1, ?)', (session_id, str(time)))
+        conn.execute('INSERT INTO eeg_data (session_id, timestamp, channel1, channel2) VALUES (?, ?, 0, 0)',
+                     (session_id, str(time)))
+    conn.commit()
+    conn.close()
+
+    assert run_migrations(db_path) == list(range(3, LATEST_VERSION + 1))
+
+    conn = sqlite3.connect(db_path)
+    expected = [to_epoch_us(time) for time in times]
+    assert [row[0] for row in conn.execute('SELECT timestamp FROM sessions ORDER BY id')] == expected
+    assert [row[0] for row in conn.execute('SELECT timestamp FROM eeg_data ORDER BY id')] == expected
+    assert list(from_epoch_us(expected)) == times
+
+    # Text written later, e.g. by the CURRENT_TIMESTAMP default, is converted on insert
+    conn.execute('INSERT INTO sessions (id, user_id) VALUES (3, 1)')
+    conn.commit()
+    stored = conn.execute('SELECT typeof(timestamp) FROM sessions WHERE id = 3').fetchone()[0]
+    conn.close()
+    assert stored == 'integer'
+
+def test_unparseable_text_timestamps_stop_the_migration(db_path):
+    """Test that text timestamps that cannot be converted are reported rather than nulled"""
+    conn = sqlite3.connect(db_path)
+    triggers = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%_epoch_us'"
+    ).fetchall()
+    for name, in triggers:
+        conn.execute(f'DROP TRIGGER {name}')
+    conn.execute('PRAGMA user_version = 2')
+    conn.execute("INSERT INTO sessions (id, user_id, timestamp) VALUES (1, 1, '2024-03-01 09:30:00')")
+    conn.execute("INSERT INTO sessions (id, user_id, timestamp) VALUES (2, 1, 'last tuesday')")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(ValueError, match=r"sessions\.id=2: 'last tuesday'"):
+        run_migrations(db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert schema_version(conn) == 2
+    assert [row[0] for row in conn.execute('SELECT timestamp FROM sessions ORDER BY id')] == [
+        '2024-03-01 09:30:00', 'last tuesday'
+    ]
+    conn.execute('DELETE FROM sessions WHERE id = 2')
+    conn.commit()
+    conn.close()
+    assert run_migrations(db_path) == list(range(3, LATEST_VERSION + 1))
+
+    # Text inserted later is rejected too
+    conn = sqlite3.connect(db_path)
+    with pytest.raises(sqlite3.DatabaseError, match='cannot convert sessions.timestamp'):
+        conn.execute("INSERT INTO sessions (id, user_id, timestamp) VALUES (3, 1, 'soon')")
+    conn.close()
+
+def test_older_databases_gain_the_feature_cache(db_path):
+    """Test that migrating a database created before session_features adds it with its triggers"""
+    conn = sqlite3.connect(db_path)
+    triggers = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%_invalidate_features'"
+    ).fetchall()
+    for name, in triggers:
+        conn.execute(f'DROP TRIGGER {name}')
+    conn.execute('DROP TABLE session_features')
+    conn.execute('PRAGMA user_version = 9')
+    conn.commit()
+    conn.close()
+
+    assert run_migrations(db_path) == list(range(10, LATEST_VERSION + 1))
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO session_features (session_id, params_hash) VALUES (1, 'p')")
+    conn.execute('INSERT INTO eeg_recordings (session_id, start_time, sample_rate, n_samples) VALUES (1, 0, 256, 0)')
+    assert conn.execute('SELECT COUNT(*) FROM session_features').fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,52 @@
+import sqlite3
+from pathlib import Path
+import sys
+
+import pandas as pd
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.init_db import create_database
+from scripts.seed_data import seed_database
+from scripts.data.parquet_io import export_parquet, import_parquet
+
+QUERIES = [
+    "SELECT id, name FROM users ORDER BY id",
+    "SELECT id, user_id, timestamp, notes FROM sessions ORDER BY id",
+    "SELECT * FROM lifestyle_context ORDER BY id",
+    "SELECT * FROM journal_entries ORDER BY id",
+    "SELECT * FROM diet_log ORDER BY id",
+    "SELECT session_id, start_time, sample_rate, n_samples FROM eeg_recordings ORDER BY session_id",
+    "SELECT session_id, chunk_index, channel1, channel2 FROM eeg_chunks ORDER BY session_id, chunk_index",
+    "SELECT * FROM rollup_daily ORDER BY user_id, day",
+]
+
+def test_parquet_export_import_round_trip(tmp_path):
+    """Test that a database exported to Parquet and imported elsewhere is unchanged"""
+    source = str(tmp_path / 'source.db')
+    create_database(source)
+    seed_database(source, users=3, sessions=12, duration=2, seed=5, eeg_fraction=0.5)
+
+    export_dir = tmp_path / 'export'
+    counts = export_parquet(export_dir, source)
+    assert counts['sessions'] == 36 and counts['eeg'] == counts['eeg_recordings'] * 512
+
+    # Partitioned by user and month, with categoricals and float32 samples
+    context = pd.read_parquet(export_dir / 'lifestyle_context')
+    assert {'user_id', 'month'} <= set(context.columns)
+    assert isinstance(context['activity_type'].dtype, pd.CategoricalDtype)
+    assert pd.read_parquet(export_dir / 'eeg')['channel1'].dtype == 'float32'
+    assert list((export_dir / 'sessions').glob('user_id=2/month=2024-*/part-0.parquet'))
+
+    target = str(tmp_path / 'target.db')
+    import_parquet(export_dir, target)
+    import_parquet(export_dir, target)  # importing twice replaces rows
+
+    dumps = []
+    for path in (source, target):
+        conn = sqlite3.connect(path)
+        dumps.append([conn.execute(query).fetchall() for query in QUERIES])
+        conn.close()
+    for query, expected, imported in zip(QUERIES, *dumps):
+        assert imported == expected, query
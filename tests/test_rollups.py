@@ -0,0 +1,122 @@
+import pytest
+import sqlite3
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+import sys
+
+import pandas as pd
+
+# Add the project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from scripts.log_session import SessionLogger
+from scripts.data.rollups import ROLLUPS, daily_stats, hourly_stats, rebuild_rollups, weekday_stats
+from scripts.data.timestamps import to_epoch_us
+
+SCORES = ['focus_score', 'mental_clarity', 'mood_score', 'productivity_score']
+
+def random_context(rng):
+    return {
+        'mood_score': rng.randint(1, 5),
+        'focus_score': rng.randint(1, 5),
+        'mental_clarity': rng.choice([1, 2, 3, 4, 5, None]),
+        'activity_type': rng.choice(['deep_work', 'creative', 'rest']),
+        'time_of_day': f'{rng.choice([8, 9, 14, 15])}:30'
+    }
+
+def rollup_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = {table: conn.execute(f'SELECT * FROM {table} ORDER BY 1, 2, 3').fetchall() for table in ROLLUPS}
+    conn.close()
+    return rows
+
+def raw_sessions(db_path):
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query('''
+        SELECT s.user_id, s.timestamp, lc.*, je.productivity_score
+        FROM sessions s
+        LEFT JOIN lifestyle_context lc ON lc.session_id = s.id
+        LEFT JOIN journal_entries je ON je.session_id = s.id
+    ''', conn)
+    conn.close()
+    return df
+
+def test_logged_sessions_update_rollups(db_path):
+    """Test that rollups kept up to date by SessionLogger equal a rebuild from raw rows"""
+    rng = random.Random(3)
+    logger = SessionLogger(db_path)
+    for _ in range(40):
+        journal = {'productivity_score': rng.randint(1, 5)} if rng.random() < 0.7 else None
+        logger.log_session(user_id=rng.randint(1, 2), context_data=random_context(rng), journal_entry=journal)
+    logger.log_session(user_id=1, journal_entry={'mood': 'tired', 'productivity_score': 2})
+    with logger.open_session(user_id=2) as writer:
+        writer.append([0.1] * 10, [0.2] * 10)
+        writer.close(context_data=random_context(rng))
+
+    incremental = rollup_rows(db_path)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        rebuild_rollups(conn)
+    conn.close()
+    assert rollup_rows(db_path) == incremental
+
+    df = raw_sessions(db_path)
+    df['hour'] = pd.to_datetime(df['time_of_day'], format='%H:%M').dt.hour
+    for user_id in (1, 2):
+        user_df = df[df['user_id'] == user_id]
+        expected = user_df.groupby('hour')[SCORES].mean().reset_index()
+        hourly = hourly_stats(user_id, db_path)
+        assert hourly[expected.columns].to_dict('list') == pytest.approx(expected.to_dict('list'))
+        assert hourly['sessions'].tolist() == user_df.groupby('hour').size().tolist()
+
+def test_daily_and_weekday_stats(db_path):
+    """Test day and weekday rollups, including date ranges, against pandas"""
+    rng = random.Random(5)
+    conn = sqlite3.connect(db_path)
+    start = datetime(2024, 3, 1, 8)
+    for i in range(60):
+        time = start + timedelta(days=i // 3, hours=rng.randint(0, 14))
+        cursor = conn.execute('INSERT INTO sessions (user_id, timestamp) VALUES (1, ?)', (to_epoch_us(time),))
+        conn.execute('''
+            INSERT INTO lifestyle_context (session_id, focus_score, mental_clarity, mood_score)
+            VALUES (?, ?, ?, ?)
+        ''', (cursor.lastrowid, rng.randint(1, 5), rng.randint(1, 5), rng.randint(1, 5)))
+    with conn:
+        rebuild_rollups(conn)
+    conn.close()
+
+    df = raw_sessions(db_path)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='us')
+    scores = ['focus_score', 'mental_clarity', 'mood_score']
+
+    daily = daily_stats(1, db_path=db_path)
+    expected = df.groupby(df['timestamp'].dt.normalize())[scores].mean()
+    assert daily['day'].tolist() == expected.index.tolist()
+    assert daily[scores].to_dict('list') == pytest.approx(expected.to_dict('list'))
+
+    in_range = df[(df['timestamp'] >= '2024-03-05') & (df['timestamp'] < '2024-03-12')]
+    weekly = weekday_stats(1, datetime(2024, 3, 5), datetime(2024, 3, 12), db_path)
+    expected = in_range.groupby(in_range['timestamp'].dt.dayofweek)[scores].mean()
+    assert weekly['weekday'].tolist() == expected.index.tolist()
+    assert weekly[scores].to_dict('list') == pytest.approx(expected.to_dict('list'))
+
+def test_sessions_count_once_in_rollups(db_path):
+    """Test that extra context rows and journal entries do not multiply a session's scores"""
+    logger = SessionLogger(db_path)
+    logger.log_session(user_id=1, context_data={'focus_score': 2, 'time_of_day': '09:30'})
+    session_id = logger.log_session(user_id=1, context_data={'focus_score': 4, 'time_of_day': '09:30'},
+                                    journal_entry={'productivity_score': 1})
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("INSERT INTO lifestyle_context (session_id, focus_score, time_of_day) VALUES (?, 5, '09:45')",
+                     (session_id,))
+        conn.executemany('INSERT INTO journal_entries (session_id, productivity_score) VALUES (?, ?)',
+                         [(session_id, 3), (session_id, 5)])
+        rebuild_rollups(conn)
+    conn.close()
+
+    hourly = hourly_stats(1, db_path).iloc[0]
+    assert hourly['sessions'] == 2
+    assert hourly['focus_score'] == pytest.approx((2 + 5) / 2)  # the session's latest context
+    assert hourly['productivity_score'] == pytest.approx(3)  # mean of its journal entries